@@ -0,0 +1,170 @@
+# agents/batch_generator_agent.py
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Set
+from config import BATCH_JOB_STORE_PATH
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class BatchGeneratorAgent:
+    """
+    Agent that generates videos for every prompt in a JSONL file.
+
+    Each input line is a JSON object with the prompt (by default under "prompt") and optional
+    "aspect_ratio", "allow_people" and "number_of_videos" fields. Items are fanned out to the
+    PromptReaderAgent under a concurrency limit and each result is appended to the output JSONL
+    as soon as it finishes. Items already recorded as successful in the output are skipped, so an
+    interrupted batch can simply be rerun.
+    """
+    def __init__(self, prompt_reader_agent=None, concurrency: int = 4, upload_to_gcs: bool = False, priority: int = 1):
+        """
+        Initializes the BatchGeneratorAgent.
+
+        Args:
+            prompt_reader_agent (PromptReaderAgent): Agent used to generate each item. Created if not given.
+            concurrency (int): Maximum number of items generating at the same time.
+            upload_to_gcs (bool): Whether to upload each generated video under `generated_videos/`.
+            priority (int): Veo scheduling priority of batch items. The default of 1 lets
+                interactive requests (priority 0) go first when quota is contended.
+        """
+        if prompt_reader_agent is None:
+            from agents.prompt_reader_agent import PromptReaderAgent
+            prompt_reader_agent = PromptReaderAgent()
+        self.prompt_reader_agent = prompt_reader_agent
+        self.concurrency = concurrency
+        self.upload_to_gcs = upload_to_gcs
+        self.priority = priority
+        logging.info(f"BatchGeneratorAgent initialized. Concurrency: {self.concurrency}, Upload to GCS: {self.upload_to_gcs}")
+
+    @staticmethod
+    def load_items(input_path: str, prompt_field: str = "prompt") -> List[Dict[str, Any]]:
+        """
+        Reads batch items from a JSONL file.
+
+        An item's id is its "id" or "request_id" field, falling back to its line number.
+        """
+        items = []
+        with open(input_path, "r") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    items.append({"id": f"line-{line_number}", "error": f"Invalid JSON: {e}"})
+                    continue
+                items.append({
+                    "id": str(data.get("id") or data.get("request_id") or f"line-{line_number}"),
+                    "prompt": data.get(prompt_field),
+                    "aspect_ratio": data.get("aspect_ratio", "16:9"),
+                    "allow_people": data.get("allow_people", "dont_allow"),
+                    "number_of_videos": data.get("number_of_videos", 1),
+                })
+        return items
+
+    @staticmethod
+    def completed_ids(output_path: str) -> Set[str]:
+        """Returns the ids of items recorded as successful in an existing output file."""
+        completed = set()
+        if not os.path.exists(output_path):
+            return completed
+        with open(output_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by an interrupted run
+                if record.get("status") == "success":
+                    completed.add(record.get("id"))
+        return completed
+
+    def process_item(self, item: Dict[str, Any], tenant: Optional[str] = None) -> Dict[str, Any]:
+        """Generates (and optionally uploads) one item and returns its result record."""
+        started_at = time.time()
+        record = {key: item.get(key) for key in ("id", "prompt", "aspect_ratio", "allow_people", "number_of_videos")}
+        if item.get("error"):
+            result = {"status": "error", "message": item["error"]}
+        elif not item.get("prompt"):
+            result = {"status": "error", "message": "Error: Item has no prompt."}
+        else:
+            try:
+                result = self.prompt_reader_agent.process_prompt(item["prompt"], item["aspect_ratio"], item["allow_people"],
+                                                                 priority=self.priority, tenant=tenant,
+                                                                 number_of_videos=item.get("number_of_videos") or 1)
+            except Exception as e:
+                result = {"status": "error", "message": f"An error occurred while processing item {item['id']}: {e}"}
+        record.update(result)
+
+        if self.upload_to_gcs and record.get("status") == "success" and record.get("video_path"):
+            gcs_uris, upload_errors = [], []
+            for video_path in record.get("video_paths") or [record["video_path"]]:
+                gcs_blob_name = f"generated_videos/{os.path.basename(video_path)}"
+                upload_status = self.prompt_reader_agent.video_generator_agent.upload_video_to_gcs(video_path, gcs_blob_name)
+                gcs_uris.append(upload_status.get("gcs_uri"))
+                if upload_status.get("status") != "success":
+                    upload_errors.append(upload_status.get("message") or f"Upload of {video_path} failed.")
+            record["gcs_uri"] = gcs_uris[0]
+            if len(gcs_uris) > 1:
+                record["gcs_uris"] = gcs_uris
+            if upload_errors:
+                # Not recorded as a success, so a rerun retries it (the video comes from the generation cache).
+                record["status"] = "error"
+                record["message"] = f"Error: Generated but not uploaded: {'; '.join(upload_errors)}"
+                record["upload_errors"] = upload_errors
+        record["elapsed_s"] = round(time.time() - started_at, 3)
+        return record
+
+    def run(self, input_path: str, output_path: str, prompt_field: str = "prompt") -> Dict[str, Any]:
+        """
+        Runs a batch, appending one result line per finished item to `output_path`.
+
+        Returns:
+            Dict[str, Any]: Counts of succeeded, failed and skipped items.
+        """
+        items = self.load_items(input_path, prompt_field)
+        completed = self.completed_ids(output_path)
+        pending = [item for item in items if item["id"] not in completed]
+        summary = {"status": "success", "total": len(items), "skipped": len(items) - len(pending), "succeeded": 0, "failed": 0}
+        logging.info(f"Batch {input_path}: {len(pending)} items to generate, {summary['skipped']} already completed.")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor, open(output_path, "a") as out:
+            tenant = f"batch:{os.path.basename(input_path)}"
+            futures = [executor.submit(self.process_item, item, tenant) for item in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                summary["succeeded" if record.get("status") == "success" else "failed"] += 1
+                logging.info(f"Batch item {record['id']} finished with status {record.get('status')} "
+                             f"({summary['succeeded'] + summary['failed']}/{len(pending)})")
+        return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate videos for every prompt in a JSONL file.")
+    parser.add_argument("input", help="JSONL file with one prompt object per line.")
+    parser.add_argument("output", help="JSONL file results are appended to; completed items are skipped on rerun.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of concurrent generations.")
+    parser.add_argument("--prompt-field", default="prompt", help="Field holding the prompt text.")
+    parser.add_argument("--upload", action="store_true", help="Upload generated videos to GCS.")
+    parser.add_argument("--job-store", default=BATCH_JOB_STORE_PATH,
+                        help="SQLite file recording this batch's Veo jobs, kept apart from the app's job store.")
+    args = parser.parse_args(argv)
+
+    from agents.prompt_reader_agent import PromptReaderAgent
+    from agents.video_generator_agent import VideoGeneratorAgent
+    prompt_reader_agent = PromptReaderAgent(video_generator_agent=VideoGeneratorAgent(job_store_path=args.job_store))
+    batch_agent = BatchGeneratorAgent(prompt_reader_agent=prompt_reader_agent, concurrency=args.concurrency,
+                                      upload_to_gcs=args.upload)
+    summary = batch_agent.run(args.input, args.output, prompt_field=args.prompt_field)
+    print(f"Batch Result: {summary}")
+
+
+if __name__ == "__main__":
+    main()
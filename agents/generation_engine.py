@@ -0,0 +1,389 @@
+# agents/generation_engine.py
+import asyncio
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field, fields, asdict
+from typing import Dict, Any, List, Optional
+from config import VEO_MODEL, VEO_POLL_INITIAL_DELAY, VEO_POLL_MAX_DELAY
+from utils.rate_limiter import VeoScheduler, is_quota_error
+from utils.metrics import incr, observe, span
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _write_once(path: str, data: bytes):
+    """Writes downloaded video bytes to `path` in one pass, without intermediate copies."""
+    if not data:
+        raise RuntimeError("Veo returned a video without content.")
+    partial_path = f"{path}.part"
+    with open(partial_path, "wb") as f:
+        f.write(memoryview(data))
+    # Readers never see a half-written video under its final name.
+    os.replace(partial_path, path)
+
+
+class PollSchedule:
+    """
+    Adaptive backoff schedule for polling long-running Veo operations.
+
+    Polls start short so that fast operations are picked up quickly, then back off
+    geometrically up to `max_delay`. Each delay is jittered so that hundreds of
+    operations submitted together do not poll the API in lockstep.
+    """
+    def __init__(self, initial_delay: float = VEO_POLL_INITIAL_DELAY, max_delay: float = VEO_POLL_MAX_DELAY,
+                 multiplier: float = 1.5, jitter: float = 0.2):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        """Returns the number of seconds to wait before poll number `attempt` (0-based)."""
+        base = min(self.max_delay, self.initial_delay * (self.multiplier ** attempt))
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+@dataclass
+class GenerationJob:
+    """State of a single video generation request tracked by the GenerationEngine."""
+    job_id: str
+    prompt: str
+    aspect_ratio: str = "16:9"
+    allow_people: str = "dont_allow"
+    number_of_videos: int = 1
+    state: str = "queued"  # queued (waiting for a key) -> running -> succeeded | failed
+    operation_name: Optional[str] = None
+    video_path: Optional[str] = None
+    video_paths: Optional[List[str]] = None  # Every variant; video_path is the first
+    error: Optional[str] = None
+    polls: int = 0
+    priority: int = 0
+    tenant: Optional[str] = None
+    api_key_id: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class GenerationEngine:
+    """
+    Asyncio-based engine that submits Veo `generate_videos` requests and tracks every
+    in-flight operation from a single event loop running on a background thread.
+
+    Callers on any thread use `submit()` to enqueue a job and either `wait()` (blocking)
+    or `await result()` (from any event loop) to get the final result dictionary.
+    `status()` returns a snapshot of the job without blocking.
+
+    Submissions go through a VeoScheduler, which rate limits them per API key and retries
+    quota errors; each operation is then polled and downloaded with the key that created it.
+    """
+    def __init__(self, scheduler: VeoScheduler, output_dir: str, model: str = VEO_MODEL,
+                 poll_schedule: Optional[PollSchedule] = None, job_store=None, media_cache=None,
+                 finished_job_ttl: float = 600.0):
+        """
+        Initializes the GenerationEngine.
+
+        Args:
+            scheduler (VeoScheduler): Scheduler owning the pool of Veo API clients.
+            output_dir (str): Directory where generated videos are saved.
+            model (str): The Veo model name.
+            poll_schedule (PollSchedule): Backoff schedule used while polling operations.
+            job_store (JobStore): Optional durable store; every state change is recorded so
+                unfinished jobs can be resumed with `recover()` after a restart, by this
+                process or any other sharing the store.
+            media_cache (MediaCache): Optional cache managing `output_dir`; each downloaded
+                video is admitted to it, which keeps the directory within its byte budget.
+            finished_job_ttl (float): Seconds a finished job stays in memory; after that its
+                status and result are read back from the job store, if there is one.
+        """
+        self.scheduler = scheduler
+        self.output_dir = output_dir
+        self.model = model
+        self.poll_schedule = poll_schedule or PollSchedule()
+        self.job_store = job_store
+        self.media_cache = media_cache
+        self.finished_job_ttl = finished_job_ttl
+        self._jobs: Dict[str, GenerationJob] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._reclaiming = False
+
+    def start(self):
+        """Starts the background event loop if it is not already running."""
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="veo-generation-engine", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+        logging.info("GenerationEngine event loop started.")
+
+    def shutdown(self):
+        """
+        Stops the background event loop. In-flight jobs are cancelled; with a job store they
+        are resumed by the next engine that claims them, once the store is closed or their
+        lease expires.
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+            self._reclaiming = False
+        if loop is not None:
+            def _cancel_and_stop():
+                for task in asyncio.all_tasks(loop):
+                    task.cancel()
+                loop.call_soon(loop.stop)
+            loop.call_soon_threadsafe(_cancel_and_stop)
+            thread.join(timeout=5)
+            loop.close()
+            logging.info("GenerationEngine event loop stopped.")
+
+    def submit(self, prompt: str, aspect_ratio: str = "16:9", allow_people: str = "dont_allow",
+               priority: int = 0, tenant: Optional[str] = None, number_of_videos: int = 1) -> str:
+        """
+        Submits a generation job and returns immediately.
+
+        Args:
+            number_of_videos (int): Variants to request from the one Veo operation.
+            priority (int): Scheduling priority; lower values are sent to Veo first.
+            tenant (str): Fairness group (e.g. a user or a batch); tenants share quota evenly.
+
+        Returns:
+            str: The job id to pass to `status()`, `wait()` or `result()`.
+        """
+        job = GenerationJob(job_id=uuid.uuid4().hex, prompt=prompt, aspect_ratio=aspect_ratio, allow_people=allow_people,
+                            number_of_videos=number_of_videos, priority=priority, tenant=tenant)
+        self._schedule(job)
+        logging.info(f"Submitted generation job {job.job_id} for prompt: '{prompt}'")
+        return job.job_id
+
+    def recover(self) -> List[str]:
+        """
+        Resumes every unfinished job in the job store that no other live engine holds.
+
+        Jobs are claimed atomically through their lease (see `JobStore.claim_unfinished`), so
+        two processes sharing a job store never resume the same job. Jobs whose Veo operation
+        was already created continue polling that operation, so nothing is paid for twice;
+        jobs that never reached the API are submitted again. After the first call the engine
+        keeps claiming jobs whose owner stopped renewing its lease (e.g. it crashed).
+
+        Returns:
+            List[str]: The ids of the resumed jobs.
+        """
+        if self.job_store is None:
+            return []
+        job_ids = self._resume(self.job_store.claim_unfinished())
+        with self._lock:
+            start_reclaim = not self._reclaiming
+            self._reclaiming = True
+        if start_reclaim:
+            self.start()
+            asyncio.run_coroutine_threadsafe(self._reclaim_loop(), self._loop)
+        return job_ids
+
+    def _resume(self, records: List[Dict[str, Any]]) -> List[str]:
+        job_fields = {f.name for f in fields(GenerationJob)}
+        jobs = [GenerationJob(**{k: v for k, v in record.items() if k in job_fields}) for record in records]
+        for job in jobs:
+            self._schedule(job)
+        if jobs:
+            logging.info(f"Resumed {len(jobs)} unfinished generation jobs from the job store.")
+        return [job.job_id for job in jobs]
+
+    async def _reclaim_loop(self):
+        while True:
+            await asyncio.sleep(self.job_store.lease_seconds)
+            try:
+                self._resume(await asyncio.to_thread(self.job_store.claim_unfinished))
+            except Exception as e:
+                logging.error(f"Error claiming orphaned generation jobs: {e}")
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """Returns a snapshot of the job's current state."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        record = self.job_store.get(job_id) if self.job_store is not None else None
+        if record is None:
+            return {"status": "error", "message": f"Unknown job id: {job_id}"}
+        return record
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Blocks the calling thread until the job finishes and returns its result."""
+        future = self._futures.get(job_id)
+        if future is None:
+            return self._stored_result(job_id)
+        return future.result(timeout)
+
+    async def result(self, job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Awaits the job's result from any event loop without blocking a thread."""
+        future = self._futures.get(job_id)
+        if future is None:
+            return self._stored_result(job_id)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def _stored_result(self, job_id: str) -> Dict[str, Any]:
+        """Rebuilds the result of a job pruned from memory from its job store record."""
+        record = self.job_store.get(job_id) if self.job_store is not None else None
+        if record is None or record["state"] not in ("succeeded", "failed"):
+            return {"status": "error", "message": f"Unknown job id: {job_id}"}
+        if record["state"] == "failed":
+            return {"status": "error", "message": record["error"], "job_id": job_id}
+        return {"status": "success", "video_path": record["video_path"],
+                "video_paths": record["video_paths"] or [record["video_path"]], "job_id": job_id}
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """
+        Returns how many queued jobs are ahead of this one for a Veo key (0 means it is next),
+        or None once it is running or finished. Ordered by priority, then submission time;
+        tenant fair sharing can reorder jobs of different tenants, so this is an estimate.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != "queued":
+                return None
+            rank = (job.priority, job.submitted_at)
+            return sum(1 for other in self._jobs.values()
+                       if other.state == "queued" and (other.priority, other.submitted_at) < rank)
+
+    def in_flight(self) -> int:
+        """Returns the number of jobs that have not finished yet."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.state in ("queued", "running"))
+
+    def _schedule(self, job: GenerationJob):
+        self.start()
+        self._save(job)
+        with self._lock:
+            self._prune_finished()
+            self._jobs[job.job_id] = job
+            self._futures[job.job_id] = asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+
+    def _prune_finished(self):
+        # Called with the lock held; the job store keeps the history of pruned jobs.
+        cutoff = time.time() - self.finished_job_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._futures.pop(job_id, None)
+
+    def _save(self, job: GenerationJob):
+        if self.job_store is not None:
+            self.job_store.record(job.to_dict())
+
+    async def _run(self, job: GenerationJob) -> Dict[str, Any]:
+        from google.genai import types  # Deferred: importing google.genai is slow
+        try:
+            if job.operation_name:
+                job.state = "running"
+                operation = types.GenerateVideosOperation(name=job.operation_name)
+            else:
+                queued_at = time.monotonic()
+
+                async def submit(client):
+                    # Time spent waiting for a key's rate limit (once, not per quota retry)
+                    nonlocal queued_at
+                    if queued_at is not None:
+                        observe("veo_queue_seconds", time.monotonic() - queued_at)
+                        queued_at = None
+                        job.state = "running"
+                    with span("veo_submit"):
+                        return await client.aio.models.generate_videos(
+                            model=self.model,
+                            prompt=job.prompt,
+                            config=types.GenerateVideosConfig(
+                                person_generation=job.allow_people,
+                                aspect_ratio=job.aspect_ratio,
+                                number_of_videos=job.number_of_videos,
+                            ),
+                        )
+
+                operation, job.api_key_id = await self.scheduler.run(submit, priority=job.priority, tenant=job.tenant)
+                job.operation_name = operation.name
+            self._save(job)
+            client = self.scheduler.client_for(job.api_key_id)
+            with span("veo_operation"):
+                operation = await self._poll(job, operation, client)
+            return await self._collect(job, operation, client)
+        except Exception as e:
+            if is_quota_error(e):
+                return self._fail(job, f"Error: Veo quota is exhausted on every configured API key, please retry later. ({e})")
+            return self._fail(job, f"An error occurred during video generation: {e}")
+
+    async def _poll(self, job: GenerationJob, operation, client):
+        delay = 0.0
+        while not operation.done:
+            delay = self.poll_schedule.delay(job.polls)
+            await asyncio.sleep(delay)
+            job.polls += 1
+            incr("veo_polls_total")
+            try:
+                with span("veo_poll"):
+                    operation = await client.aio.operations.get(operation)
+            except Exception as e:
+                if not is_quota_error(e):
+                    raise
+                logging.warning(f"Quota exhausted while polling job {job.job_id}; backing off.")
+        # The operation finished at some point during the last sleep; that sleep bounds the
+        # time it sat done before we noticed.
+        observe("veo_poll_slack_seconds", delay)
+        return operation
+
+    async def _collect(self, job: GenerationJob, operation, client) -> Dict[str, Any]:
+        if not (operation.response and operation.response.generated_videos):
+            return self._fail(job, "Error: No video was generated by the Veo model.")
+
+        generated_videos = operation.response.generated_videos
+        stem = f"veo_generated_{job.prompt[:20].replace(' ', '_')}_{time.time()}"
+        if len(generated_videos) == 1:
+            output_paths = [os.path.join(self.output_dir, f"{stem}.mp4")]
+        else:
+            output_paths = [os.path.join(self.output_dir, f"{stem}_v{i}.mp4") for i in range(len(generated_videos))]
+        # Variants are downloaded and written concurrently
+        await asyncio.gather(*(self._save_video(generated_video, output_path, client)
+                               for generated_video, output_path in zip(generated_videos, output_paths)))
+
+        job.video_path = output_paths[0]
+        job.video_paths = output_paths
+        job.state = "succeeded"
+        job.finished_at = time.time()
+        self._save(job)
+        self._record_finished(job)
+        logging.info(f"Video generation successful for job {job.job_id} after {job.polls} polls. "
+                     f"Saved {len(output_paths)} video(s) at: {', '.join(output_paths)}")
+        return {"status": "success", "video_path": output_paths[0], "video_paths": output_paths, "job_id": job.job_id}
+
+    async def _save_video(self, generated_video, output_path: str, client):
+        with span("veo_download"):
+            await client.aio.files.download(file=generated_video.video)
+        with span("video_write"):
+            await asyncio.to_thread(_write_once, output_path, generated_video.video.video_bytes)
+        generated_video.video.video_bytes = None  # The file is the only copy from here on
+        if self.media_cache is not None:
+            await asyncio.to_thread(self.media_cache.admit, output_path)
+
+    def _fail(self, job: GenerationJob, error_message: str) -> Dict[str, Any]:
+        job.error = error_message
+        job.state = "failed"
+        job.finished_at = time.time()
+        self._save(job)
+        self._record_finished(job)
+        logging.error(error_message)
+        return {"status": "error", "message": error_message, "job_id": job.job_id}
+
+    def _record_finished(self, job: GenerationJob):
+        incr("veo_jobs_total", state=job.state)
+        if job.submitted_at:
+            observe("veo_job_seconds", job.finished_at - job.submitted_at, state=job.state)
@@ -1,7 +1,11 @@
 # agents/prompt_reader_agent.py
 import logging
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 from agents.video_generator_agent import VideoGeneratorAgent  # Import the video generator agent
+from config import (GCS_BUCKET_NAME, VEO_MODEL, VEO_MAX_VIDEOS_PER_REQUEST, STORYBOARD_MAX_SHOTS,
+                    GENERATION_CACHE_DIR, GENERATION_CACHE_MAX_BYTES, GENERATION_CACHE_USE_GCS,
+                    POST_PROCESSING_WORKERS, POST_PROCESSING_QUEUE_SIZE)
+from utils.generation_cache import GenerationCache, cache_key
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,22 +15,46 @@ class PromptReaderAgent:
     Agent responsible for receiving and processing user prompts and triggering
     the video generation agent directly.
     """
-    def __init__(self):
+    def __init__(self, video_generator_agent=None, generation_cache=None):
         """
-        Initializes the PromptReaderAgent and the VideoGeneratorAgent.
+        Initializes the PromptReaderAgent, the VideoGeneratorAgent and the generation cache.
+
+        Args:
+            video_generator_agent (VideoGeneratorAgent): Agent to generate with. Created if not given.
+            generation_cache (GenerationCache): Cache to serve repeated requests from. Created
+                from the config if not given.
         """
-        self.video_generator_agent = VideoGeneratorAgent()
+        self.video_generator_agent = video_generator_agent or VideoGeneratorAgent()
+        self.generation_cache = generation_cache or GenerationCache(
+            GENERATION_CACHE_DIR,
+            GENERATION_CACHE_MAX_BYTES,
+            gcs_bucket_name=GCS_BUCKET_NAME if GENERATION_CACHE_USE_GCS else None,
+            output_dir=self.video_generator_agent.output_dir,
+            upload_workers=POST_PROCESSING_WORKERS,
+            upload_queue_size=POST_PROCESSING_QUEUE_SIZE,
+        )
         logging.info("PromptReaderAgent initialized with VideoGeneratorAgent.")
 
-    def process_prompt(self, prompt: str, aspect_ratio: str = "16:9", allow_people: str = "dont_allow") -> Dict[str, Any]:
+    def process_prompt(self, prompt: str, aspect_ratio: str = "16:9", allow_people: str = "dont_allow",
+                       priority: int = 0, tenant: Optional[str] = None,
+                       on_submitted: Optional[Callable[[str], None]] = None,
+                       number_of_videos: int = 1) -> Dict[str, Any]:
         """
         Processes the incoming user prompt and additional parameters, then triggers
-        the video generation agent directly.
+        the video generation agent directly. Identical requests are served from the
+        generation cache, and concurrent identical requests share a single Veo operation.
 
         Args:
             prompt (str): The text prompt provided by the user.
             aspect_ratio (str): The desired aspect ratio for the video ("16:9" or "9:16").
             allow_people (str): Whether to allow people in the video ("dont_allow" or "allow_adult").
+            priority (int): Scheduling priority when Veo quota is contended; lower runs first.
+            tenant (str): Fairness group sharing quota evenly with other tenants.
+            on_submitted (Callable[[str], None]): Called with the generation job id once a Veo
+                job is submitted, so callers can follow it with `get_job_status`. Not called
+                when the result comes from the cache or from an identical in-flight request.
+            number_of_videos (int): Variants to generate in one Veo operation, up to
+                VEO_MAX_VIDEOS_PER_REQUEST. All of them are listed in the result's "video_paths".
 
         Returns:
             Dict[str, Any]: The result from the video generation agent.
@@ -37,11 +65,60 @@ class PromptReaderAgent:
             error_message = "Error: Received an empty prompt."
             logging.error(error_message)
             return {"status": "error", "message": error_message}
+        if not 1 <= number_of_videos <= VEO_MAX_VIDEOS_PER_REQUEST:
+            error_message = f"Error: number_of_videos must be between 1 and {VEO_MAX_VIDEOS_PER_REQUEST}."
+            logging.error(error_message)
+            return {"status": "error", "message": error_message}
 
-        # Directly call the video generation agent
-        generation_result = self.video_generator_agent.generate_video(prompt, aspect_ratio, allow_people)
+        # Check the cache, then call the video generation agent on a miss
+        key = cache_key(VEO_MODEL, prompt, aspect_ratio, allow_people, number_of_videos)
+        def generate():
+            if on_submitted is None:
+                return self.video_generator_agent.generate_video(prompt, aspect_ratio, allow_people, priority=priority,
+                                                                 tenant=tenant, number_of_videos=number_of_videos)
+            job_id = self.video_generator_agent.submit_video(prompt, aspect_ratio, allow_people, priority=priority,
+                                                             tenant=tenant, number_of_videos=number_of_videos)
+            on_submitted(job_id)
+            return self.video_generator_agent.engine.wait(job_id)
+
+        generation_result = self.generation_cache.get_or_generate(key, generate, variants=number_of_videos)
+        if generation_result.get("cached") and self.generation_cache.output_dir == self.video_generator_agent.output_dir:
+            # Hits are linked into the output directory; keep it within its budget.
+            for video_path in generation_result["video_paths"]:
+                self.video_generator_agent.media_cache.admit(video_path)
         return generation_result
 
+    def process_storyboard(self, shots: List[str], aspect_ratio: str = "16:9", allow_people: str = "dont_allow",
+                           priority: int = 0, tenant: Optional[str] = None,
+                           on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Generates a multi-shot video: one segment per shot prompt, generated concurrently and
+        concatenated in order. Segments go through `process_prompt`, so shots that were
+        generated before are served from the generation cache.
+
+        Args:
+            shots (List[str]): Shot prompts in playback order; blank entries are ignored.
+            on_progress (Callable[[int, int], None]): Called with (segments ready in order, total).
+
+        Returns:
+            Dict[str, Any]: The result from `VideoGeneratorAgent.generate_storyboard`.
+        """
+        shots = [shot.strip() for shot in shots if shot and shot.strip()]
+        logging.info(f"Received storyboard of {len(shots)} shots, Aspect Ratio: {aspect_ratio}, Allow People: {allow_people}")
+        if not shots:
+            error_message = "Error: Received a storyboard without shots."
+            logging.error(error_message)
+            return {"status": "error", "message": error_message}
+        if len(shots) > STORYBOARD_MAX_SHOTS:
+            error_message = f"Error: A storyboard can have at most {STORYBOARD_MAX_SHOTS} shots."
+            logging.error(error_message)
+            return {"status": "error", "message": error_message}
+        return self.video_generator_agent.generate_storyboard(
+            shots, aspect_ratio, allow_people, priority=priority, tenant=tenant, on_progress=on_progress,
+            generate_segment=lambda shot: self.process_prompt(shot, aspect_ratio, allow_people,
+                                                              priority=priority, tenant=tenant),
+        )
+
     # Example of how this agent might be run or integrated
     # In a Vertex AI Agent setup, you would typically define a function that gets called
     # when the agent receives an input. The 'process_prompt' method would likely be
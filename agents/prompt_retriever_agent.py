@@ -1,22 +1,24 @@
 # agents/prompt_retriever_agent.py
-from google.cloud import storage
-from config import GCS_BUCKET_NAME
-import json
-import os
+from config import GCS_BUCKET_NAME, PROMPT_INDEX_CACHE_PATH
+from utils.gcs_utils import get_storage_client, get_bucket
+from utils.prompt_index import PromptIndex, SAVED_PROMPTS_PREFIX
+from utils.metrics import span
+from typing import Dict, Any
 import logging
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class PromptRetrieverAgent:
-    def __init__(self, bucket_name=GCS_BUCKET_NAME):
-        """Initializes the PromptRetrieverAgent with the GCS bucket name."""
+    def __init__(self, bucket_name=GCS_BUCKET_NAME, index_cache_path=PROMPT_INDEX_CACHE_PATH):
+        """Initializes the PromptRetrieverAgent with the GCS bucket name and the prompt index."""
         self.bucket_name = bucket_name
-        self.storage_client = storage.Client()
-        self.bucket = self.storage_client.bucket(self.bucket_name)
+        self.storage_client = get_storage_client()
+        self.bucket = get_bucket(self.bucket_name)
+        self.index = PromptIndex(self.bucket_name, index_cache_path)
         logging.info(f"PromptRetrieverAgent initialized for bucket: {self.bucket_name}")
 
-    def list_saved_prompt_blobs(self, prefix="saved_prompts/"):
+    def list_saved_prompt_blobs(self, prefix=SAVED_PROMPTS_PREFIX):
         """Lists all the blobs in the bucket with the given prefix."""
         try:
             blobs = self.bucket.list_blobs(prefix=prefix)
@@ -39,35 +41,30 @@ class PromptRetrieverAgent:
             return False
 
     def get_saved_prompts(self):
-        """Retrieves the content of all saved prompt files from GCS."""
-        saved_prompts = []
-        blob_names = self.list_saved_prompt_blobs()
+        """
+        Retrieves all saved prompts, syncing only new prompts from GCS into the local index.
+        """
+        try:
+            with span("prompt_index_sync"):
+                self.index.sync()
+        except Exception as e:
+            logging.error(f"Error syncing the prompt index, serving cached prompts: {e}")
+        return self.index.prompts()
 
-        for blob_name in blob_names:
-            temp_file = f"temp_prompt_{blob_name.split('/')[-1]}"
-            if self.download_blob(blob_name, temp_file):
-                try:
-                    with open(temp_file, 'r') as f:
-                        data = json.load(f)
-                        prompt = data.get("prompt")
-                        if prompt:
-                            saved_prompts.append(prompt)
-                        else:
-                            logging.warning(f"No 'prompt' key found in {blob_name}")
-                except json.JSONDecodeError as e:
-                    logging.error(f"Error decoding JSON from {blob_name}: {e}")
-                except FileNotFoundError:
-                    logging.error(f"Temporary file {temp_file} not found after download.")
-                finally:
-                    try:
-                        os.remove(temp_file)
-                        logging.info(f"Temporary file {temp_file} removed.")
-                    except OSError as e:
-                        logging.warning(f"Error removing temporary file {temp_file}: {e}")
-            else:
-                logging.warning(f"Failed to download {blob_name}, skipping.")
+    def search_prompts(self, query: str = "", page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """
+        Searches saved prompts by keyword after an incremental sync.
 
-        return saved_prompts
+        Returns:
+            Dict[str, Any]: One page of matching prompts, see `PromptIndex.search`.
+        """
+        try:
+            with span("prompt_index_sync"):
+                self.index.sync()
+        except Exception as e:
+            logging.error(f"Error syncing the prompt index, searching cached prompts: {e}")
+        with span("prompt_search"):
+            return self.index.search(query, page, page_size)
 
     # Example of how this agent might be run or integrated
     def run(self):
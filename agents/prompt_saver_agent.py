@@ -1,52 +1,53 @@
 # agents/prompt_saver_agent.py
-from google.cloud import storage
 from config import GCS_BUCKET_NAME
+from utils.gcs_utils import get_storage_client, get_bucket, upload_data
+from utils.prompt_index import new_saved_prompt_blob_name
+from utils.metrics import span
 import json
-from datetime import datetime
-import os
 import logging
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class PromptSaverAgent:
-    def __init__(self, bucket_name=GCS_BUCKET_NAME):
-        """Initializes the PromptSaverAgent with the GCS bucket name."""
+    def __init__(self, bucket_name=GCS_BUCKET_NAME, prompt_index=None):
+        """
+        Initializes the PromptSaverAgent with the GCS bucket name.
+
+        If a PromptIndex is given, saved prompts are added to it immediately instead of
+        appearing only after its next sync.
+        """
         self.bucket_name = bucket_name
-        self.storage_client = storage.Client()
-        self.bucket = self.storage_client.bucket(self.bucket_name)
+        self.prompt_index = prompt_index
+        self.storage_client = get_storage_client()
+        self.bucket = get_bucket(self.bucket_name)
         logging.info(f"PromptSaverAgent initialized for bucket: {self.bucket_name}")
 
-    def upload_blob(self, source_file_path, destination_blob_name):
-        """Uploads a file to Google Cloud Storage."""
+    def upload_blob(self, data, destination_blob_name, content_type="application/json"):
+        """Uploads in-memory data (str/bytes/memoryview) or a file-like stream to Google Cloud Storage."""
         try:
-            blob = self.bucket.blob(destination_blob_name)
-            blob.upload_from_filename(source_file_path)
-            logging.info(f"File {source_file_path} uploaded to {destination_blob_name} in {self.bucket_name}.")
+            upload_data(self.bucket_name, data, destination_blob_name, content_type=content_type)
+            logging.info(f"Data uploaded to {destination_blob_name} in {self.bucket_name}.")
             return True
         except Exception as e:
-            logging.error(f"Error uploading {source_file_path} to {destination_blob_name}: {e}")
+            logging.error(f"Error uploading to {destination_blob_name}: {e}")
             return False
 
+    @span("prompt_save")
     def save_prompt(self, prompt: str):
         """Saves the given prompt to Google Cloud Storage."""
         if not prompt:
             logging.warning("Received an empty prompt, nothing to save.")
             return "No prompt to save."
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        blob_name = f"saved_prompts/prompt_{timestamp}.json"
+        blob_name, timestamp = new_saved_prompt_blob_name("json")
         prompt_data = {"prompt": prompt, "saved_at": timestamp}
-        temp_file_path = f"temp_prompt_{timestamp}.json"
 
         try:
-            # Save the prompt data to a temporary local file
-            with open(temp_file_path, 'w') as f:
-                json.dump(prompt_data, f)
-            logging.info(f"Prompt data written to temporary file: {temp_file_path}")
-
-            # Upload the temporary file to GCS
-            if self.upload_blob(temp_file_path, blob_name):
+            # Upload straight from memory; a prompt never needs to touch the local disk
+            if self.upload_blob(json.dumps(prompt_data), blob_name):
+                if self.prompt_index is not None:
+                    self.prompt_index.add(blob_name, prompt, timestamp)
                 logging.info(f"Prompt '{prompt}' saved to GCS as {blob_name}")
                 return f"Prompt '{prompt}' saved to GCS."
             else:
@@ -56,14 +57,6 @@ class PromptSaverAgent:
             logging.error(f"An error occurred while saving prompt '{prompt}': {e}")
             return f"Error saving prompt: {e}"
 
-        finally:
-            # Clean up the temporary local file
-            try:
-                os.remove(temp_file_path)
-                logging.info(f"Temporary file {temp_file_path} removed.")
-            except OSError as e:
-                logging.warning(f"Error removing temporary file {temp_file_path}: {e}")
-
     # Example of how this agent might be run or integrated
     def run(self, prompt_to_save: str):
         """Example function to demonstrate saving a prompt."""
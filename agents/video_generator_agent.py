@@ -1,26 +1,65 @@
 # agents/video_generator_agent.py
 import logging
 import os
+import threading
 import time
-from typing import Dict, Any
-from utils.video_utils import concatenate_videos  # Assuming you might concatenate later
-from config import GCS_BUCKET_NAME, VEO_API_KEY  # Assuming you'll use the API key this way
-from utils.gcs_utils import upload_to_gcs  # If you want to save generated videos to GCS
-from google import genai
-from google.genai import types
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from typing import Callable, Dict, Any, List, Optional
+from utils.video_utils import StreamingConcatenator
+from config import (GCS_BUCKET_NAME, VEO_API_KEY, VEO_API_KEYS, VEO_REQUESTS_PER_MINUTE, VEO_MAX_QUOTA_RETRIES,
+                    JOB_STORE_PATH, POST_PROCESSING_WORKERS, POST_PROCESSING_QUEUE_SIZE, MEDIA_CACHE_MAX_BYTES,
+                    MEDIA_CACHE_POLICY, DERIVED_ASSETS_DIR, DERIVED_ASSET_WORKERS, PREVIEW_HEIGHT, PREVIEW_BITRATE,
+                    CONCAT_CACHE_DIR, CONCAT_CACHE_MAX_BYTES)
+from utils.concat_cache import ConcatCache
+from utils.derived_assets import DerivedAssets
+from utils.content_store import store_file
+from utils.gcs_upload import UploadError
+from utils.job_store import JobStore
+from utils.media_cache import MediaCache
+from utils.pipeline import StagePipeline
+from utils.metrics import incr, observe, span
+from utils.rate_limiter import VeoScheduler, key_fingerprint
+from agents.generation_engine import GenerationEngine
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Directory to save temporary generated videos
 OUTPUT_VIDEO_DIR = "temp_generated_videos"
-os.makedirs(OUTPUT_VIDEO_DIR, exist_ok=True)
+
+# Number of recent publish outcomes kept for `get_publish_status`
+PUBLISH_HISTORY_SIZE = 1000
+
+
+class _LazyGenaiClient:
+    """
+    Stands in for a `genai.Client` and creates it on first use.
+
+    Importing google.genai takes most of a second, so deferring it keeps that cost off
+    process startup and out of replicas that never generate.
+    """
+    def __init__(self, api_key: Optional[str]):
+        self._api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=self._api_key)
+        return getattr(self._client, name)
+
 
 class VideoGeneratorAgent:
     """
     Agent responsible for receiving text prompts and generating videos using the Veo model.
     """
-    def __init__(self, output_dir=OUTPUT_VIDEO_DIR, gcs_bucket_name=GCS_BUCKET_NAME, veo_api_key=VEO_API_KEY):
+    def __init__(self, output_dir=OUTPUT_VIDEO_DIR, gcs_bucket_name=GCS_BUCKET_NAME, veo_api_key=VEO_API_KEY,
+                 job_store_path=JOB_STORE_PATH, veo_api_keys=None, clients=None):
         """
         Initializes the VideoGeneratorAgent.
 
@@ -28,66 +67,305 @@ class VideoGeneratorAgent:
             output_dir (str): Directory to save temporary generated videos.
             gcs_bucket_name (str): Name of the GCS bucket to save videos (optional).
             veo_api_key (str): The API key for accessing the Google GenAI API.
+            job_store_path (str): SQLite file recording in-flight jobs. Unfinished jobs found
+                there are resumed on startup. Pass None to disable persistence.
+            veo_api_keys (list): Optional pool of API keys to spread requests across. Defaults to
+                VEO_API_KEYS from the config when `veo_api_key` is the configured key.
+            clients (dict): Ready-made GenAI clients keyed by an id, used instead of creating
+                clients from API keys (e.g. the offline stand-ins in `benchmarks.fake_genai`).
         """
         self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
         self.gcs_bucket_name = gcs_bucket_name
         self.veo_api_key = veo_api_key
         # genai.configure(api_key=self.veo_api_key)
-        self.client = genai.Client(api_key=self.veo_api_key)
-        logging.info(f"VideoGeneratorAgent initialized. Output Directory: {self.output_dir}, GCS Bucket: {self.gcs_bucket_name}")
+        if veo_api_keys is None:
+            veo_api_keys = VEO_API_KEYS if veo_api_key == VEO_API_KEY else [veo_api_key]
+        self.clients = clients or {key_fingerprint(key): _LazyGenaiClient(key) for key in veo_api_keys}
+        self.client = next(iter(self.clients.values()))
+        self.scheduler = VeoScheduler(self.clients, VEO_REQUESTS_PER_MINUTE, max_retries=VEO_MAX_QUOTA_RETRIES)
+        self.job_store = JobStore(job_store_path) if job_store_path else None
+        self.media_cache = MediaCache(self.output_dir, MEDIA_CACHE_MAX_BYTES, self.gcs_bucket_name, policy=MEDIA_CACHE_POLICY)
+        self.derived_assets = DerivedAssets(DERIVED_ASSETS_DIR, self.gcs_bucket_name, workers=DERIVED_ASSET_WORKERS,
+                                            preview_height=PREVIEW_HEIGHT, preview_bitrate=PREVIEW_BITRATE)
+        self.concat_cache = ConcatCache(CONCAT_CACHE_DIR, CONCAT_CACHE_MAX_BYTES,
+                                        content_hash=self.derived_assets.content_hash)
+        self.engine = GenerationEngine(self.scheduler, self.output_dir, job_store=self.job_store,
+                                       media_cache=self.media_cache)
+        self.resumed_job_ids = self.engine.recover()
+        self._publish_lock = threading.Lock()
+        self._publish_status: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.publisher = StagePipeline(
+            [("upload", self._upload_stage), ("thumbnail", self._thumbnail_stage)],
+            workers_per_stage=POST_PROCESSING_WORKERS, queue_size=POST_PROCESSING_QUEUE_SIZE,
+            on_complete=self._record_published, name="publish",
+        )
+        logging.info(f"VideoGeneratorAgent initialized. Output Directory: {self.output_dir}, GCS Bucket: {self.gcs_bucket_name}, "
+                     f"API keys: {len(self.clients)}")
 
-    def generate_video(self, prompt: str, aspect_ratio: str = "16:9", allow_people: str = "dont_allow") -> Dict[str, Any]:
+    @span("generate_video")
+    def generate_video(self, prompt: str, aspect_ratio: str = "16:9", allow_people: str = "dont_allow",
+                       priority: int = 0, tenant: Optional[str] = None, number_of_videos: int = 1) -> Dict[str, Any]:
         """
         Generates a video based on the provided text prompt and configuration.
+
+        The request is handed to the shared GenerationEngine and this call blocks until
+        the job finishes. Use `submit_video` / `generate_video_async` to avoid blocking.
+        `priority` (lower is sooner) and `tenant` control scheduling when quota is contended.
+        With `number_of_videos` > 1, one operation returns that many variants, listed in
+        the result's "video_paths" ("video_path" is the first).
         """
-        logging.info(f"Generating video for prompt: '{prompt}', Aspect Ratio: {aspect_ratio}, Allow People: {allow_people}")
-        try:
-            operation = self.client.models.generate_videos(
-                model="veo-2.0-generate-001",
-                prompt=prompt,
-                config=types.GenerateVideosConfig(
-                    person_generation=allow_people,
-                    aspect_ratio=aspect_ratio,
-                ),
-            )
-
-            while not operation.done:
-                time.sleep(20)
-                operation = self.client.operations.get(operation)
-
-            generated_video_path = None
-            if operation.response and operation.response.generated_videos:
-                generated_video = operation.response.generated_videos[0] # Assuming only one video is generated
-                filename = f"veo_generated_{prompt[:20].replace(' ', '_')}_{time.time()}.mp4"
-                output_path = os.path.join(self.output_dir, filename)
-                self.client.files.download(file=generated_video.video)
-                generated_video.video.save(output_path)
-                generated_video_path = output_path
-                logging.info(f"Video generation successful. Saved at: {generated_video_path}")
-                return {"status": "success", "video_path": generated_video_path}
-            else:
-                error_message = "Error: No video was generated by the Veo model."
-                logging.error(error_message)
-                return {"status": "error", "message": error_message}
+        logging.info(f"Generating {number_of_videos} video(s) for prompt: '{prompt}', Aspect Ratio: {aspect_ratio}, "
+                     f"Allow People: {allow_people}")
+        job_id = self.engine.submit(prompt, aspect_ratio, allow_people, priority=priority, tenant=tenant,
+                                    number_of_videos=number_of_videos)
+        return self.engine.wait(job_id)
+
+    def submit_video(self, prompt: str, aspect_ratio: str = "16:9", allow_people: str = "dont_allow",
+                     priority: int = 0, tenant: Optional[str] = None, number_of_videos: int = 1) -> str:
+        """
+        Submits a video generation job without waiting for it.
+
+        Returns:
+            str: The job id, usable with `get_job_status` and the engine's `wait` / `result`.
+        """
+        return self.engine.submit(prompt, aspect_ratio, allow_people, priority=priority, tenant=tenant,
+                                  number_of_videos=number_of_videos)
+
+    async def generate_video_async(self, prompt: str, aspect_ratio: str = "16:9", allow_people: str = "dont_allow",
+                                   priority: int = 0, tenant: Optional[str] = None,
+                                   number_of_videos: int = 1) -> Dict[str, Any]:
+        """
+        Async variant of `generate_video` that awaits the job without holding a thread.
+        """
+        job_id = self.engine.submit(prompt, aspect_ratio, allow_people, priority=priority, tenant=tenant,
+                                    number_of_videos=number_of_videos)
+        return await self.engine.result(job_id)
+
+    def get_job_status(self, job_id: str) -> Dict[str, Any]:
+        """
+        Returns the current state of a submitted generation job. Jobs still waiting for Veo
+        quota also report their estimated `queue_position` (0 means next).
+        """
+        status = self.engine.status(job_id)
+        status["queue_position"] = self.engine.queue_position(job_id)
+        return status
+
+    def publish_video(self, video_path: str, destination_blob_name: str, thumbnail: bool = True,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Queues a local video for GCS upload and thumbnailing on the background publisher and
+        returns immediately, so callers can hand the local file to the user right away.
+
+        If the publisher is saturated this blocks until there is room (or `timeout` expires),
+        which keeps a slow bucket from piling up unbounded work.
+
+        Returns:
+            Dict[str, Any]: {"status": "queued"} or an error if the publisher stayed full.
+        """
+        item = {"video_path": video_path, "blob_name": destination_blob_name, "thumbnail": thumbnail,
+                "queued_at": time.time()}
+        self._set_publish_status(video_path, {"status": "queued", "blob_name": destination_blob_name})
+        # Keep the file on disk until it has been uploaded and thumbnailed (a missing file
+        # fails in the upload stage).
+        if os.path.exists(video_path):
+            self.media_cache.admit(video_path, pin=True)
+        if not self.publisher.submit(item, timeout=timeout):
+            self.media_cache.unpin(video_path)
+            message = f"Publisher is saturated; {video_path} was not queued for upload."
+            logging.error(message)
+            self._set_publish_status(video_path, {"status": "error", "message": message})
+            return {"status": "error", "message": message}
+        logging.info(f"Queued {video_path} for upload to {destination_blob_name}. Publisher queues: {self.publisher.depths()}")
+        return {"status": "queued", "blob_name": destination_blob_name}
+
+    def get_publish_status(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """Returns the publish outcome of a video queued with `publish_video`, if still known."""
+        with self._publish_lock:
+            status = self._publish_status.get(video_path)
+            return dict(status) if status else None
+
+    def _set_publish_status(self, video_path: str, status: Dict[str, Any]):
+        with self._publish_lock:
+            self._publish_status[video_path] = status
+            self._publish_status.move_to_end(video_path)
+            while len(self._publish_status) > PUBLISH_HISTORY_SIZE:
+                self._publish_status.popitem(last=False)
+
+    def _upload_stage(self, item: Dict[str, Any]):
+        observe("publish_queue_wait_seconds", time.time() - item["queued_at"])
+        self._set_publish_status(item["video_path"], {"status": "uploading", "blob_name": item["blob_name"]})
+        upload_status = self.upload_video_to_gcs(item["video_path"], item["blob_name"])
+        if upload_status["status"] != "success":
+            raise RuntimeError(upload_status["message"])
+        item["gcs_uri"] = upload_status["gcs_uri"]
+
+    def _thumbnail_stage(self, item: Dict[str, Any]):
+        if item["thumbnail"]:
+            item["thumbnail_path"] = self.derived_assets.thumbnail(item["video_path"])
 
+    def _record_published(self, item: Dict[str, Any]):
+        status = {
+            "status": "error" if item.get("errors") else "success",
+            "blob_name": item["blob_name"],
+            "gcs_uri": item.get("gcs_uri"),
+            "thumbnail_path": item.get("thumbnail_path"),
+            "errors": item.get("errors"),
+            "elapsed_s": round(time.time() - item["queued_at"], 3),
+        }
+        self._set_publish_status(item["video_path"], status)
+        observe("publish_seconds", time.time() - item["queued_at"])
+        incr("published_videos_total", status=status["status"])
+        self.media_cache.unpin(item["video_path"])
+        logging.info(f"Published {item['video_path']}: {status}")
+
+    def get_local_video(self, video_path: str) -> Optional[str]:
+        """
+        Returns a local path for a previously generated video, downloading it again from GCS
+        if it was evicted from the local cache. Returns None if it cannot be found.
+        """
+        return self.media_cache.get(video_path)
+
+    def get_thumbnail(self, video_path: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Returns a local poster thumbnail of the video, built on first request, or None."""
+        return self._derived_asset(video_path, "thumbnail", timeout)
+
+    def get_preview(self, video_path: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Returns a local low-bitrate preview proxy of the video, built on first request, or None.
+        With a `timeout`, returns None if the build takes longer; it still finishes in the background.
+        """
+        return self._derived_asset(video_path, "preview", timeout)
+
+    def _derived_asset(self, video_path: str, kind: str, timeout: Optional[float]) -> Optional[str]:
+        cached_path = self.derived_assets.cached(video_path, kind)
+        if cached_path:
+            return cached_path
+        local_path = self.get_local_video(video_path) or (video_path if os.path.exists(video_path) else None)
+        if local_path is None:
+            return None
+        try:
+            return self.derived_assets.request(local_path, kind).result(timeout)
+        except TimeoutError:
+            logging.info(f"The {kind} of {video_path} is not ready after {timeout}s; it is still being built.")
+            return None
         except Exception as e:
-            error_message = f"An error occurred during video generation: {e}"
-            logging.error(error_message)
-            return {"status": "error", "message": error_message}
+            logging.error(f"Could not get the {kind} of {video_path}: {e}")
+            return None
 
     # Optional: Function to handle concatenation if triggered by another agent
-    def concatenate_videos_agent(self, video_paths: list) -> Dict[str, Any]:
-        # ... (your concatenation logic) ...
-        pass
+    def concatenate_videos_agent(self, video_paths: list, output_path: Optional[str] = None,
+                                 progress=None) -> Dict[str, Any]:
+        """
+        Concatenates local videos, in order, into one video in the output directory.
+
+        Segments and merged prefixes of earlier concatenations are reused, so re-running after
+        changing one clip only re-processes that clip.
+
+        Returns:
+            Dict[str, Any]: {"status": "success", "video_path": ...} or an error.
+        """
+        if not video_paths or len(video_paths) < 2:
+            return {"status": "error", "message": "Error: At least two videos are needed to concatenate."}
+        output_path = output_path or os.path.join(self.output_dir, f"concatenated_{uuid.uuid4().hex}.mp4")
+        try:
+            self.concat_cache.concatenate(video_paths, output_path, progress=progress)
+        except Exception as e:
+            logging.error(f"Error concatenating {len(video_paths)} videos: {e}")
+            return {"status": "error", "message": f"Error during video concatenation: {e}"}
+        self.media_cache.admit(output_path)
+        return {"status": "success", "video_path": output_path}
+
+    def generate_storyboard(self, shots: List[str], aspect_ratio: str = "16:9", allow_people: str = "dont_allow",
+                            priority: int = 0, tenant: Optional[str] = None, output_path: Optional[str] = None,
+                            generate_segment: Optional[Callable[[str], Dict[str, Any]]] = None,
+                            on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Generates one segment per shot prompt and concatenates them, in shot order, into one video.
+
+        All segments are submitted at once and generate concurrently under the scheduler's rate
+        limits, so the wall time is close to that of a single generation when quota allows.
+        Each segment is prepared for concatenation as soon as it and every earlier segment are
+        done, leaving only a stream copy after the last one finishes. Segment files in the output
+        directory are deleted afterwards (a generation cache keeps its own copy), so they never
+        accumulate outside the media cache's budget.
+
+        Args:
+            shots (List[str]): Shot prompts in playback order.
+            generate_segment (Callable[[str], Dict[str, Any]]): Produces one segment from a shot
+                prompt (e.g. through a cache). Defaults to `generate_video` with the arguments above.
+            on_progress (Callable[[int, int], None]): Called with (segments ready in order, total).
+
+        Returns:
+            Dict[str, Any]: {"status": "success", "video_path": ...} or an error naming the shot
+            that failed.
+        """
+        if not shots:
+            return {"status": "error", "message": "Error: A storyboard needs at least one shot."}
+        generate_segment = generate_segment or (lambda shot: self.generate_video(
+            shot, aspect_ratio, allow_people, priority=priority, tenant=tenant))
+        output_path = output_path or os.path.join(self.output_dir, f"storyboard_{uuid.uuid4().hex}.mp4")
+        concatenator = StreamingConcatenator(len(shots), output_path)
+        segment_paths: List[Optional[str]] = [None] * len(shots)
+        logging.info(f"Generating a storyboard of {len(shots)} shots into {output_path}")
+        # The threads only wait on the engine; the generation itself runs on its event loop.
+        executor = ThreadPoolExecutor(max_workers=len(shots), thread_name_prefix="storyboard")
+        futures = {}
+        try:
+            futures = {executor.submit(generate_segment, shot): index for index, shot in enumerate(shots)}
+            for future in as_completed(futures):
+                index = futures[future]
+                result = future.result()
+                if result.get("status") != "success" or not result.get("video_path"):
+                    message = f"Error: Shot {index + 1} failed: {result.get('message', 'no video was generated')}"
+                    logging.error(message)
+                    return {"status": "error", "message": message, "shot": index}
+                segment_paths[index] = result["video_path"]
+                # Keep finished segments on disk until the final join.
+                self.media_cache.pin(segment_paths[index])
+                concatenator.add(index, segment_paths[index])
+                if on_progress is not None:
+                    on_progress(concatenator.ready, len(shots))
+            concatenator.finish()
+        except Exception as e:
+            logging.error(f"Error generating storyboard: {e}")
+            return {"status": "error", "message": f"Error generating storyboard: {e}"}
+        finally:
+            # On failure, don't wait for the other shots; their jobs finish in the background.
+            executor.shutdown(wait=False)
+            concatenator.close()
+            for path in segment_paths:
+                if path:
+                    self.media_cache.unpin(path)
+            # Segments still in use by another request stay pinned, and so are kept.
+            for path in set(filter(None, segment_paths)):
+                self.media_cache.discard(path)
+            # After a failure, shots that were not added are discarded once they finish.
+            for future, index in futures.items():
+                if segment_paths[index] is None:
+                    future.add_done_callback(self._discard_segment)
+        self.media_cache.admit(output_path)
+        logging.info(f"Storyboard of {len(shots)} shots saved at: {output_path}")
+        return {"status": "success", "video_path": output_path}
+
+    def _discard_segment(self, future):
+        if not future.cancelled() and future.exception() is None:
+            for path in future.result().get("video_paths") or [future.result().get("video_path")]:
+                if path:
+                    self.media_cache.discard(path)
 
     # Optional: Function to upload the generated video to GCS
     def upload_video_to_gcs(self, video_path: str, destination_blob_name: str) -> Dict[str, Any]:
         """
         Internal function to upload the generated video to Google Cloud Storage.
         """
+    @span("video_upload")
     def upload_video_to_gcs(self, video_path: str, destination_blob_name: str) -> Dict[str, Any]:
         """
         Internal function to upload the generated video to Google Cloud Storage.
+
+        The bytes are stored once per content hash (see utils.content_store); uploading a video
+        that is already in the bucket only writes the reference `refs/<destination_blob_name>`.
         """
         if not self.gcs_bucket_name:
             logging.error("GCS bucket name not configured, upload failed.")
@@ -96,13 +374,16 @@ class VideoGeneratorAgent:
             logging.error(f"Video file not found at: {video_path}, upload failed.")
             return {"status": "error", "message": f"Video file not found at: {video_path}"}
         try:
-            if upload_to_gcs(self.gcs_bucket_name, video_path, destination_blob_name):
-                gcs_uri = f"gs://{self.gcs_bucket_name}/{destination_blob_name}"
-                logging.info(f"Video uploaded to GCS successfully: {gcs_uri}")
-                return {"status": "success", "gcs_uri": gcs_uri}
-            else:
-                logging.error(f"Error occurred during upload of {video_path} to GCS.")
-                return {"status": "error", "message": f"Error occurred during upload of {video_path} to GCS."}
+            # Large files (e.g. concatenations) go up in parallel parts or resumable chunks.
+            upload_result = store_file(self.gcs_bucket_name, video_path, destination_blob_name, content_type="video/mp4")
+            # Lets the media cache evict the local copy and refill it from GCS later.
+            self.media_cache.set_blob_name(video_path, upload_result["blob_name"])
+            logging.info(f"Video stored in GCS as {upload_result['gcs_uri']} "
+                         f"({'deduplicated' if upload_result['deduplicated'] else 'uploaded'}), ref {upload_result['ref']}")
+            return upload_result
+        except UploadError as e:
+            logging.error(f"Error occurred during upload of {video_path} to GCS: {e}")
+            return {"status": "error", "message": f"Error occurred during upload of {video_path} to GCS: {e}"}
         except Exception as e:
             logging.error(f"Exception during GCS upload: {e}")
             return {"status": "error", "message": f"Exception during GCS upload: {e}"}
@@ -0,0 +1,90 @@
+# benchmarks/bench_concat.py
+"""
+Wall time and peak RSS of the previous MoviePy decode/re-encode concatenation versus
+utils.video_utils.concatenate_videos, on clips generated locally with ffmpeg.
+
+Each run happens in a fresh subprocess; peak RSS is the largest of that process and the
+ffmpeg processes it spawned.
+
+Usage:
+    python -m benchmarks.bench_concat --clips 6 --seconds 8 --size 1280x720
+    python -m benchmarks.bench_concat --mismatched   # one clip at a different size/rate
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _moviepy_concatenate(video_paths, output_path):
+    # The implementation concatenate_videos used before the ffmpeg engine.
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+    clips = [VideoFileClip(path) for path in video_paths]
+    final_clip = concatenate_videoclips(clips)
+    final_clip.write_videofile(output_path, codec="libx264", audio_codec="aac", logger=None)
+    for clip in clips:
+        clip.close()
+    return output_path
+
+
+def make_test_clip(path, seconds, size, rate, pattern="testsrc2"):
+    """Writes an H.264/AAC test clip similar in shape to a Veo output."""
+    from utils.video_utils import _run_ffmpeg
+    _run_ffmpeg(["-y", "-f", "lavfi", "-i", f"{pattern}=size={size}:rate={rate}",
+                 "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+                 "-t", str(seconds), "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+                 "-c:a", "aac", "-shortest", path])
+    return path
+
+
+def _child(method, output_path, inputs):
+    if method == "moviepy":
+        _moviepy_concatenate(inputs, output_path)
+    else:
+        from utils.video_utils import concatenate_videos
+        concatenate_videos(inputs, output_path)
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({"peak_rss_mb": peak_kb / 1024}))
+
+
+def _measure(method, output_path, inputs):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_concat", "--child", method, output_path, *inputs],
+                            capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, json.loads(result.stdout.strip().splitlines()[-1])["peak_rss_mb"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=6)
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--rate", type=int, default=24)
+    parser.add_argument("--mismatched", action="store_true", help="Make the last clip a different size and rate.")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return _child(args.child[0], args.child[1], args.child[2:])
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        inputs = []
+        for i in range(args.clips):
+            mismatched = args.mismatched and i == args.clips - 1
+            inputs.append(make_test_clip(os.path.join(work_dir, f"clip_{i}.mp4"), args.seconds,
+                                         "640x480" if mismatched else args.size, 30 if mismatched else args.rate))
+        print(f"{args.clips} clips x {args.seconds:g} s at {args.size}, {args.rate} fps"
+              f"{' (last clip mismatched)' if args.mismatched else ''}")
+        for method in ("moviepy", "ffmpeg"):
+            elapsed, peak_rss = _measure(method, os.path.join(work_dir, f"out_{method}.mp4"), inputs)
+            print(f"  {method:<8} {elapsed:8.2f} s   peak RSS {peak_rss:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
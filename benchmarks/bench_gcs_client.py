@@ -0,0 +1,105 @@
+# benchmarks/bench_gcs_client.py
+"""
+Per-operation latency of the GCS helpers with a new `storage.Client()` per call (the
+previous behaviour of utils.gcs_utils) versus the shared, pooled client.
+
+Runs against the in-memory fake GCS server, so no credentials or network are needed.
+
+Usage:
+    python -m benchmarks.bench_gcs_client --iterations 200 --latency 0.002 --connect-latency 0.01
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_gcs_server import start_fake_gcs_server
+
+BUCKET = "bench-bucket"
+
+
+def _per_call_upload(source_file_path, destination_blob_name):
+    from google.cloud import storage
+    storage.Client().bucket(BUCKET).blob(destination_blob_name).upload_from_filename(source_file_path)
+
+
+def _per_call_download(blob_name, destination_file_path):
+    from google.cloud import storage
+    storage.Client().bucket(BUCKET).blob(blob_name).download_to_filename(destination_file_path)
+
+
+def _per_call_list(prefix):
+    from google.cloud import storage
+    return [blob.name for blob in storage.Client().bucket(BUCKET).list_blobs(prefix=prefix)]
+
+
+def _shared_upload(source_file_path, destination_blob_name):
+    from utils.gcs_utils import get_bucket
+    get_bucket(BUCKET).blob(destination_blob_name).upload_from_filename(source_file_path)
+
+
+def _shared_download(blob_name, destination_file_path):
+    from utils.gcs_utils import get_bucket
+    get_bucket(BUCKET).blob(blob_name).download_to_filename(destination_file_path)
+
+
+def _shared_list(prefix):
+    from utils.gcs_utils import list_blobs
+    return list_blobs(BUCKET, prefix=prefix)
+
+
+def _measure(fn, iterations, *args_for):
+    samples = []
+    for i in range(iterations):
+        args = [a(i) if callable(a) else a for a in args_for]
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"mean {statistics.mean(samples):7.2f} ms  p50 {statistics.median(samples):7.2f} ms  p95 {p95:7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--payload-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake server delay per request (s).")
+    parser.add_argument("--connect-latency", type=float, default=0.005, help="Fake server delay per new connection (s).")
+    args = parser.parse_args()
+
+    server = start_fake_gcs_server(latency=args.latency, connect_latency=args.connect_latency)
+    os.environ["STORAGE_EMULATOR_HOST"] = server.url
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, "payload.bin")
+        with open(source, "wb") as f:
+            f.write(os.urandom(args.payload_bytes))
+        target = os.path.join(work_dir, "download.bin")
+
+        print(f"{args.iterations} iterations, {args.payload_bytes} byte objects, "
+              f"request latency {args.latency * 1000:.1f} ms, connect latency {args.connect_latency * 1000:.1f} ms")
+        for label, upload, download, listing in (
+            ("per-call client", _per_call_upload, _per_call_download, _per_call_list),
+            ("shared client", _shared_upload, _shared_download, _shared_list),
+        ):
+            connections_before = server.state.connections
+            results = {
+                "upload": _measure(upload, args.iterations, source, lambda i: f"bench/{label}/{i}.bin"),
+                "download": _measure(download, args.iterations, lambda i: f"bench/{label}/{i}.bin", target),
+                "list": _measure(listing, args.iterations, f"bench/{label}/"),
+            }
+            print(f"\n{label} ({server.state.connections - connections_before} TCP connections)")
+            for operation, samples in results.items():
+                print(f"  {operation:<9} {_summary(samples)}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_prompt_loading.py
+"""
+Wall time of loading every saved prompt: the previous serial download-to-temp-file loop
+versus a cold PromptRetrieverAgent.get_saved_prompts, which fans `download_as_bytes` out
+over a bounded thread pool while building its prompt index.
+
+Runs against the in-memory fake GCS server, so no credentials or network are needed.
+
+Usage:
+    GCS_DOWNLOAD_WORKERS=16 python -m benchmarks.bench_prompt_loading --prompts 2000 --latency 0.005
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.fake_gcs_server import start_fake_gcs_server
+
+BUCKET = "bench-bucket"
+
+
+def _serial_temp_file_load(bucket, blob_names):
+    # The loop get_saved_prompts used before bulk loading: one blocking download per blob,
+    # written to a temp file, read back and deleted.
+    prompts = []
+    for blob_name in blob_names:
+        temp_file = f"temp_prompt_{blob_name.split('/')[-1]}"
+        bucket.blob(blob_name).download_to_filename(temp_file)
+        try:
+            with open(temp_file, "r") as f:
+                prompts.append(json.load(f)["prompt"])
+        finally:
+            os.remove(temp_file)
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.005, help="Fake server delay per request (s).")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    server = start_fake_gcs_server(latency=args.latency)
+    os.environ["STORAGE_EMULATOR_HOST"] = server.url
+    for i in range(args.prompts):
+        payload = json.dumps({"prompt": f"Prompt number {i}", "saved_at": "20250101_000000"}).encode()
+        server.state.put(BUCKET, f"saved_prompts/prompt_{i:06d}.json", payload, "application/json")
+
+    from agents.prompt_retriever_agent import PromptRetrieverAgent
+    from config import GCS_DOWNLOAD_WORKERS
+    index_dir = tempfile.TemporaryDirectory()
+    retriever = PromptRetrieverAgent(bucket_name=BUCKET, index_cache_path=os.path.join(index_dir.name, "index.jsonl"))
+    blob_names = retriever.list_saved_prompt_blobs()
+
+    start = time.perf_counter()
+    serial = _serial_temp_file_load(retriever.bucket, blob_names)
+    serial_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk = retriever.get_saved_prompts()
+    bulk_seconds = time.perf_counter() - start
+
+    assert serial == bulk, "bulk loading returned prompts in a different order"
+    print(f"{args.prompts} prompts, request latency {args.latency * 1000:.1f} ms, {GCS_DOWNLOAD_WORKERS} workers (GCS_DOWNLOAD_WORKERS)")
+    print(f"  serial temp-file loop  {serial_seconds:8.2f} s")
+    print(f"  bulk in-memory         {bulk_seconds:8.2f} s  ({serial_seconds / bulk_seconds:.1f}x faster)")
+    server.shutdown()
+    index_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
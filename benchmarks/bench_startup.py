@@ -0,0 +1,106 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start benchmark: how long importing each entry point takes in a fresh interpreter.
+
+Every module is imported `--runs` times, each in a new subprocess, and the median wall time
+is reported together with the slowest imports from `python -X importtime`. The run fails
+(exit status 1) if any median exceeds `--budget-ms`, so it can gate CI and container builds.
+
+The Gradio app is measured up to `demo.launch()` only if `--include-app` is given, since
+importing it builds the UI.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget-ms 300 --runs 5 --top 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = (
+    "config",
+    "utils.video_utils",
+    "utils.gcs_utils",
+    "agents.video_generator_agent",
+    "agents.prompt_reader_agent",
+    "agents.prompt_saver_agent",
+    "agents.prompt_retriever_agent",
+    "agents.batch_generator_agent",
+)
+# The app row has the cost of importing gradio itself subtracted; that is not ours to trim.
+_APP_BASELINE = "import gradio"
+
+
+def _time_import(statement, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], cwd=ROOT_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def _import_times(statement, env):
+    # (cumulative_us, module) for every import `python -X importtime` reports.
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative), name.strip()))
+    return rows
+
+
+def heaviest_imports(statement, module, baseline_statement, env, top):
+    """
+    Returns the `top` (cumulative_us, name) nested imports of `statement`, leaving out
+    `module` itself, its packages and anything `baseline_statement` already imports.
+    """
+    parts = module.split(".")
+    skip = {".".join(parts[:i]) for i in range(1, len(parts) + 1)}
+    skip.update(name for _, name in _import_times(baseline_statement, env))
+    return sorted(((us, name) for us, name in _import_times(statement, env) if name not in skip), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", default=",".join(MODULES), help="Comma-separated modules to import.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per module; the median is reported.")
+    parser.add_argument("--budget-ms", type=float, default=500, help="Fail if any module's median import exceeds this.")
+    parser.add_argument("--top", type=int, default=5, help="Slowest nested imports to list per module.")
+    parser.add_argument("--include-app", action="store_true", help="Also import interface/app_gradio.py without launching it.")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    empty = statistics.median(_time_import("pass", env) for _ in range(args.runs))
+    statements = {module.strip(): (f"import {module.strip()}", "pass", empty)
+                  for module in args.modules.split(",") if module.strip()}
+    if args.include_app:
+        # Stub out launch() so the import returns once the UI is built.
+        gradio = statistics.median(_time_import(_APP_BASELINE, env) for _ in range(args.runs))
+        statements["interface.app_gradio"] = (f"{_APP_BASELINE}; gradio.Blocks.launch = lambda self, *a, **k: None; "
+                                              "import interface.app_gradio", _APP_BASELINE, gradio)
+        print(f"gradio import: {(gradio - empty) * 1000:.0f} ms (subtracted from interface.app_gradio)")
+    print(f"Interpreter startup: {empty * 1000:.0f} ms (subtracted below); budget {args.budget_ms:.0f} ms")
+
+    over_budget = []
+    for module, (statement, baseline_statement, baseline) in statements.items():
+        samples = [_time_import(statement, env) - baseline for _ in range(args.runs)]
+        median_ms = max(0.0, statistics.median(samples) * 1000)
+        flag = "  OVER BUDGET" if median_ms > args.budget_ms else ""
+        print(f"  {module:<32} {median_ms:8.0f} ms{flag}")
+        for cumulative_us, name in heaviest_imports(statement, module, baseline_statement, env, args.top):
+            print(f"      {cumulative_us / 1000:8.1f} ms  {name}")
+        if flag:
+            over_budget.append(module)
+
+    if over_budget:
+        print(f"\n{len(over_budget)} module(s) over the {args.budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
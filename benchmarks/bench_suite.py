@@ -0,0 +1,234 @@
+# benchmarks/bench_suite.py
+"""
+End-to-end offline benchmark of the agents, with no Google services and no spend.
+
+Veo is replaced by `benchmarks.fake_genai.FakeGenaiClient` (simulated latency, canned MP4
+bytes) and GCS by the in-memory fake server. Each scenario issues `--requests` calls at
+`--concurrency` and reports throughput, p50/p95/p99 latency and the peak RSS of this process
+(and, for concat, of the ffmpeg processes it ran):
+
+    generate  PromptReaderAgent.process_prompt (generation cache, scheduler, engine, download)
+    save      PromptSaverAgent.save_prompt
+    search    PromptRetrieverAgent.get_saved_prompts + search_prompts
+    concat    utils.video_utils.concatenate_videos of `--concat-clips` canned clips
+
+Usage:
+    python -m benchmarks.bench_suite --concurrency 16 --requests 64
+    python -m benchmarks.bench_suite --scenarios generate --generation-seconds 5 --repeat-ratio 0.3 --json out.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_gcs_server import start_fake_gcs_server
+
+BUCKET = "bench-bucket"
+SCENARIOS = ("generate", "save", "search", "concat")
+_WORDS = ("sunset", "ocean", "forest", "city", "drone", "cat", "mountain", "river", "night", "rain", "desert", "snow")
+
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No procfs: fall back to the lifetime peak, which is still an upper bound.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _PeakMemory:
+    """Samples this process's RSS on a background thread while a scenario runs."""
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _current_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss_bytes())
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+
+def run_scenario(name, operation, requests, concurrency):
+    """
+    Calls `operation(i)` for i in range(requests) on `concurrency` threads.
+
+    An operation fails if it raises or returns a dict whose "status" is not "success".
+    """
+    latencies = []
+    errors = []
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            result = operation(i)
+            if isinstance(result, dict) and result.get("status") not in (None, "success"):
+                errors.append(result.get("message"))
+        except Exception as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - start)
+
+    with _PeakMemory() as memory:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(requests)))
+        wall = time.perf_counter() - start
+    report = {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(memory.peak / 1024 ** 2, 1),
+    }
+    if errors:
+        report["first_error"] = errors[0]
+    return report
+
+
+def _print_report(report):
+    line = (f"  {report['scenario']:<9} {report['requests']:5d} req  c={report['concurrency']:<3d} "
+            f"{report['throughput_per_s']:8.2f}/s  p50 {report['p50_ms']:9.1f} ms  p95 {report['p95_ms']:9.1f} ms  "
+            f"p99 {report['p99_ms']:9.1f} ms  peak RSS {report['peak_rss_mb']:7.1f} MB")
+    if "children_peak_rss_mb" in report:
+        line += f" (ffmpeg {report['children_peak_rss_mb']:.1f} MB)"
+    if report["errors"]:
+        line += f"  {report['errors']} errors, e.g. {report['first_error']}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=32, help="Calls per scenario.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--generation-seconds", type=float, default=2.0, help="Simulated Veo operation duration.")
+    parser.add_argument("--submit-latency", type=float, default=0.2)
+    parser.add_argument("--poll-latency", type=float, default=0.05)
+    parser.add_argument("--download-latency", type=float, default=0.1)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="Fraction of submissions failing with 429.")
+    parser.add_argument("--api-keys", type=int, default=1, help="Number of fake API keys in the scheduler pool.")
+    parser.add_argument("--requests-per-minute", type=float, default=6000, help="Per-key Veo rate limit.")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="Fraction of generate calls repeating an earlier prompt.")
+    parser.add_argument("--seed-prompts", type=int, default=500, help="Saved prompts present before the search scenario.")
+    parser.add_argument("--concat-clips", type=int, default=4)
+    parser.add_argument("--gcs-latency", type=float, default=0.005, help="Fake GCS delay per request (s).")
+    parser.add_argument("--json", help="Also write the reports to this file.")
+    args = parser.parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.TemporaryDirectory(prefix="bench_suite_")
+    server = start_fake_gcs_server(latency=args.gcs_latency)
+    # Must be set before the agents import config.
+    os.environ["STORAGE_EMULATOR_HOST"] = server.url
+    os.environ.setdefault("VEO_POLL_INITIAL_DELAY", str(min(0.5, args.generation_seconds / 4 or 0.05)))
+    os.environ.setdefault("VEO_POLL_MAX_DELAY", str(max(0.5, args.generation_seconds / 2)))
+    os.environ["VEO_REQUESTS_PER_MINUTE"] = str(args.requests_per_minute)
+    os.environ["GENERATION_CACHE_DIR"] = os.path.join(work_dir.name, "generation_cache")
+    logging.disable(logging.WARNING)
+
+    from benchmarks.fake_genai import FakeGenaiClient, load_canned_video
+    video_bytes = load_canned_video()
+    reports = []
+    print(f"{len(video_bytes)} byte canned clip, {args.generation_seconds}s simulated generations, "
+          f"GCS latency {args.gcs_latency * 1000:.1f} ms")
+
+    if "generate" in scenarios:
+        from agents.prompt_reader_agent import PromptReaderAgent
+        from agents.video_generator_agent import VideoGeneratorAgent
+        clients = {f"fake-key-{i}": FakeGenaiClient(args.generation_seconds, args.submit_latency, args.poll_latency,
+                                                    args.download_latency, args.quota_error_rate, video_bytes)
+                   for i in range(args.api_keys)}
+        generator = VideoGeneratorAgent(output_dir=os.path.join(work_dir.name, "videos"), gcs_bucket_name=BUCKET,
+                                        job_store_path=os.path.join(work_dir.name, "jobs.sqlite3"), clients=clients)
+        reader = PromptReaderAgent(video_generator_agent=generator)
+        rng = random.Random(0)
+
+        def generate(i):
+            prompt_id = rng.randrange(i) if i and rng.random() < args.repeat_ratio else i
+            return reader.process_prompt(f"A {_WORDS[prompt_id % len(_WORDS)]} scene, take {prompt_id}")
+
+        reports.append(run_scenario("generate", generate, args.requests, args.concurrency))
+        reports[-1]["veo_calls"] = {key: client.calls for key, client in clients.items()}
+        generator.engine.shutdown()
+
+    if "save" in scenarios:
+        from agents.prompt_saver_agent import PromptSaverAgent
+        saver = PromptSaverAgent(bucket_name=BUCKET)
+        reports.append(run_scenario(
+            "save", lambda i: saver.save_prompt(f"A {_WORDS[i % len(_WORDS)]} at dawn, saved {i}"),
+            args.requests, args.concurrency))
+
+    if "search" in scenarios:
+        from agents.prompt_retriever_agent import PromptRetrieverAgent
+        for i in range(args.seed_prompts):
+            payload = json.dumps({"prompt": f"Seed {_WORDS[i % len(_WORDS)]} prompt {i}", "saved_at": "20250101_000000"})
+            server.state.put(BUCKET, f"saved_prompts/prompt_20250101_000000_{i:06d}.json", payload.encode(), "application/json")
+        retriever = PromptRetrieverAgent(bucket_name=BUCKET, index_cache_path=os.path.join(work_dir.name, "index.jsonl"))
+
+        def search(i):
+            retriever.get_saved_prompts()
+            return retriever.search_prompts(_WORDS[i % len(_WORDS)][:3])
+
+        reports.append(run_scenario("search", search, args.requests, args.concurrency))
+
+    if "concat" in scenarios:
+        from utils.video_utils import concatenate_videos
+        clip_paths = []
+        for i in range(args.concat_clips):
+            clip_paths.append(os.path.join(work_dir.name, f"clip_{i}.mp4"))
+            with open(clip_paths[-1], "wb") as f:
+                f.write(video_bytes)
+        outputs = os.path.join(work_dir.name, "concat")
+        os.makedirs(outputs, exist_ok=True)
+        reports.append(run_scenario(
+            "concat", lambda i: concatenate_videos(clip_paths, os.path.join(outputs, f"{i}.mp4")) and None,
+            args.requests, args.concurrency))
+        reports[-1]["children_peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+    print()
+    for report in reports:
+        _print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    server.shutdown()
+    work_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# benchmarks/fake_gcs_server.py
+"""
+In-memory stand-in for the subset of the GCS JSON API used by this project.
+
+Point `google.cloud.storage` at it by setting `STORAGE_EMULATOR_HOST` to the server URL.
+`latency` adds a fixed delay to every request and `connect_latency` to every new TCP
+connection, approximating the round trip and handshake cost of the real service.
+`bandwidth` (bytes/s) caps how fast each request body is received, like the per-connection
+throughput limit that makes parallel uploads worthwhile.
+Setting `state.fail_uploads` to N makes the next N upload requests fail with a 503 (a
+resumable chunk keeps its first half), to exercise client retries.
+
+Usage:
+    python -m benchmarks.fake_gcs_server --port 9023 --latency 0.01
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+import google_crc32c
+
+_OBJECT_PATH = re.compile(r"^/storage/v1/b/([^/]+)/o/(.+?)(/compose)?$")
+_LIST_PATH = re.compile(r"^/storage/v1/b/([^/]+)/o$")
+_BUCKET_PATH = re.compile(r"^/storage/v1/b/([^/]+)$")
+_DOWNLOAD_PATH = re.compile(r"^/download/storage/v1/b/([^/]+)/o/(.+)$")
+_UPLOAD_PATH = re.compile(r"^/upload/storage/v1/b/([^/]+)/o$")
+
+
+class FakeGCSState:
+    """Objects and open resumable sessions held by one fake server."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}  # (bucket, name) -> dict(data=bytes, generation=int, ...)
+        self.sessions = {}  # upload_id -> dict(bucket, metadata, data=bytearray)
+        self.generation = int(time.time() * 1e6)
+        self.requests = 0
+        self.connections = 0
+        self.fail_uploads = 0
+
+    def take_upload_failure(self):
+        with self.lock:
+            if self.fail_uploads <= 0:
+                return False
+            self.fail_uploads -= 1
+            return True
+
+    def put(self, bucket, name, data, content_type=None, metadata=None):
+        with self.lock:
+            self.generation += 1
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            self.objects[(bucket, name)] = {
+                "data": bytes(data),
+                "generation": self.generation,
+                "content_type": content_type or "application/octet-stream",
+                "metadata": metadata or {},
+                "updated": now,
+            }
+            return self.resource(bucket, name)
+
+    def resource(self, bucket, name):
+        obj = self.objects[(bucket, name)]
+        data = obj["data"]
+        resource = {
+            "kind": "storage#object",
+            "id": f"{bucket}/{name}/{obj['generation']}",
+            "name": name,
+            "bucket": bucket,
+            "generation": str(obj["generation"]),
+            "metageneration": "1",
+            "size": str(len(data)),
+            "contentType": obj["content_type"],
+            "md5Hash": base64.b64encode(hashlib.md5(data).digest()).decode(),
+            "crc32c": base64.b64encode(google_crc32c.Checksum(data).digest()).decode(),
+            "timeCreated": obj["updated"],
+            "updated": obj["updated"],
+        }
+        if obj["metadata"]:
+            resource["metadata"] = obj["metadata"]
+        return resource
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeGCS/1.0"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.state.connections += 1
+        if self.server.connect_latency:
+            time.sleep(self.server.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- helpers -------------------------------------------------------------
+
+    def _begin(self):
+        self.server.state.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.server.bandwidth and body:
+            time.sleep(len(body) / self.server.bandwidth)
+        return url.path, parse_qs(url.query), body
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _unavailable(self):
+        self._send(503, {"error": {"code": 503, "message": "Injected failure."}})
+
+    def _not_found(self):
+        self._send(404, {"error": {"code": 404, "message": "No such object."}})
+
+    def _precondition_failed(self, bucket, name, query):
+        expected = query.get("ifGenerationMatch", [None])[0]
+        if expected is None:
+            return False
+        obj = self.server.state.objects.get((bucket, name))
+        current = str(obj["generation"]) if obj else "0"
+        if current != expected:
+            self._send(412, {"error": {"code": 412, "message": "Precondition Failed"}})
+            return True
+        return False
+
+    # -- verbs -------------------------------------------------------------------
+
+    def do_GET(self):
+        path, query, _ = self._begin()
+        state = self.server.state
+        match = _DOWNLOAD_PATH.match(path) or (_OBJECT_PATH.match(path) if query.get("alt") == ["media"] else None)
+        if match:
+            return self._download(match.group(1), unquote(match.group(2)))
+        match = _LIST_PATH.match(path)
+        if match:
+            return self._list(match.group(1), query)
+        match = _OBJECT_PATH.match(path)
+        if match:
+            bucket, name = match.group(1), unquote(match.group(2))
+            with state.lock:
+                if (bucket, name) not in state.objects:
+                    return self._not_found()
+                return self._send(200, state.resource(bucket, name))
+        match = _BUCKET_PATH.match(path)
+        if match:
+            return self._send(200, {"kind": "storage#bucket", "name": match.group(1), "id": match.group(1)})
+        self._not_found()
+
+    def do_DELETE(self):
+        path, _, _ = self._begin()
+        match = _OBJECT_PATH.match(path)
+        if match:
+            with self.server.state.lock:
+                if self.server.state.objects.pop((match.group(1), unquote(match.group(2))), None) is not None:
+                    return self._send(204)
+        self._not_found()
+
+    def do_POST(self):
+        path, query, body = self._begin()
+        state = self.server.state
+        match = _OBJECT_PATH.match(path)
+        if match and match.group(3):
+            bucket, name = match.group(1), unquote(match.group(2))
+            request = json.loads(body or b"{}")
+            with state.lock:
+                try:
+                    parts = [state.objects[(bucket, source["name"])]["data"] for source in request["sourceObjects"]]
+                except KeyError:
+                    return self._not_found()
+            content_type = request.get("destination", {}).get("contentType")
+            return self._send(200, state.put(bucket, name, b"".join(parts), content_type))
+        match = _UPLOAD_PATH.match(path)
+        if not match:
+            return self._not_found()
+        bucket = match.group(1)
+        upload_type = query.get("uploadType", ["media"])[0]
+        if upload_type != "resumable" and state.take_upload_failure():
+            return self._unavailable()
+        if upload_type == "multipart":
+            metadata, data = self._parse_multipart(body)
+            name = metadata.get("name") or query.get("name", [None])[0]
+            if self._precondition_failed(bucket, name, query):
+                return
+            return self._send(200, state.put(bucket, name, data, metadata.get("contentType"), metadata.get("metadata")))
+        if upload_type == "resumable":
+            metadata = json.loads(body or b"{}")
+            metadata.setdefault("name", query.get("name", [None])[0])
+            if self._precondition_failed(bucket, metadata["name"], query):
+                return
+            upload_id = uuid.uuid4().hex
+            with state.lock:
+                state.sessions[upload_id] = {"bucket": bucket, "metadata": metadata, "data": bytearray()}
+            host = self.headers.get("Host")
+            location = f"http://{host}/upload/storage/v1/b/{bucket}/o?uploadType=resumable&upload_id={upload_id}"
+            return self._send(200, b"", headers={"Location": location})
+        name = query.get("name", [None])[0]
+        if self._precondition_failed(bucket, name, query):
+            return
+        self._send(200, state.put(bucket, name, body, self.headers.get("Content-Type")))
+
+    def do_PUT(self):
+        path, query, body = self._begin()
+        state = self.server.state
+        upload_id = query.get("upload_id", [None])[0]
+        session = state.sessions.get(upload_id)
+        if session is None:
+            return self._not_found()
+        content_range = self.headers.get("Content-Range", "")
+        match = re.match(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", content_range)
+        total = None
+        if match:
+            if match.group(1) is not None:
+                start = int(match.group(1))
+                del session["data"][start:]
+                if body and state.take_upload_failure():
+                    session["data"].extend(body[:len(body) // 2])
+                    return self._unavailable()
+                session["data"].extend(body)
+            if match.group(3) != "*":
+                total = int(match.group(3))
+        else:
+            session["data"].extend(body)
+            total = len(session["data"])
+        if total is not None and len(session["data"]) >= total:
+            with state.lock:
+                state.sessions.pop(upload_id, None)
+            metadata = session["metadata"]
+            return self._send(200, state.put(session["bucket"], metadata["name"], session["data"],
+                                             metadata.get("contentType"), metadata.get("metadata")))
+        headers = {"Range": f"bytes=0-{len(session['data']) - 1}"} if session["data"] else {}
+        self._send(308, b"", headers=headers)
+
+    # -- request bodies ------------------------------------------------------------
+
+    def _download(self, bucket, name):
+        state = self.server.state
+        with state.lock:
+            obj = state.objects.get((bucket, name))
+            resource = state.resource(bucket, name) if obj else None
+        if obj is None:
+            return self._not_found()
+        data = obj["data"]
+        headers = {
+            "x-goog-generation": resource["generation"],
+            "x-goog-hash": f"crc32c={resource['crc32c']},md5={resource['md5Hash']}",
+        }
+        range_header = self.headers.get("Range")
+        match = re.match(r"bytes=(\d+)-(\d*)", range_header or "")
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return self._send(206, data[start:end + 1], obj["content_type"], headers)
+        self._send(200, data, obj["content_type"], headers)
+
+    def _list(self, bucket, query):
+        state = self.server.state
+        prefix = query.get("prefix", [""])[0]
+        max_results = int(query.get("maxResults", ["1000"])[0])
+        start_offset = query.get("startOffset", [""])[0]
+        offset = int(query.get("pageToken", ["0"])[0])
+        with state.lock:
+            names = sorted(name for (b, name) in state.objects
+                           if b == bucket and name.startswith(prefix) and name >= start_offset)
+            page = names[offset:offset + max_results]
+            response = {"kind": "storage#objects", "items": [state.resource(bucket, name) for name in page]}
+        if offset + max_results < len(names):
+            response["nextPageToken"] = str(offset + max_results)
+        self._send(200, response)
+
+    def _parse_multipart(self, body):
+        boundary = re.search(r'boundary="?([^";]+)"?', self.headers.get("Content-Type", "")).group(1).encode()
+        parts = [part for part in body.split(b"--" + boundary) if part.strip() not in (b"", b"--")]
+        metadata_part, data_part = parts[0], parts[1]
+        metadata = json.loads(metadata_part.split(b"\r\n\r\n", 1)[1].strip() or b"{}")
+        data = data_part.split(b"\r\n\r\n", 1)[1]
+        if data.endswith(b"\r\n"):
+            data = data[:-2]
+        return metadata, data
+
+
+class FakeGCSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, connect_latency=0.0, bandwidth=None):
+        super().__init__(address, _Handler)
+        self.state = FakeGCSState()
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.bandwidth = bandwidth
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_gcs_server(latency=0.0, connect_latency=0.0, port=0, bandwidth=None):
+    """Starts a FakeGCSServer on a background thread and returns it; stop it with `shutdown()`."""
+    server = FakeGCSServer(("127.0.0.1", port), latency=latency, connect_latency=connect_latency, bandwidth=bandwidth)
+    threading.Thread(target=server.serve_forever, name="fake-gcs", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an in-memory fake GCS server.")
+    parser.add_argument("--port", type=int, default=9023)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--connect-latency", type=float, default=0.0, help="Seconds added to every new connection.")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Bytes/s each request body is received at.")
+    args = parser.parse_args()
+    fake = FakeGCSServer(("127.0.0.1", args.port), latency=args.latency, connect_latency=args.connect_latency,
+                         bandwidth=args.bandwidth)
+    print(f"Fake GCS listening on {fake.url} (export STORAGE_EMULATOR_HOST={fake.url})")
+    fake.serve_forever()
@@ -0,0 +1,105 @@
+# benchmarks/fake_genai.py
+"""
+Offline stand-in for the parts of `google.genai.Client` used to generate videos.
+
+`client.aio.models.generate_videos` returns a pending operation after `submit_latency`;
+the operation reports done once `generation_seconds` have passed, each
+`client.aio.operations.get` taking `poll_latency`; `client.aio.files.download` fills in canned
+MP4 bytes after `download_latency`. `quota_error_rate` makes that fraction of submissions fail
+with a 429, the way an exhausted key does.
+
+Pass instances to `VideoGeneratorAgent(clients={...})`.
+"""
+import asyncio
+import glob
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+import types as pytypes
+
+from google.genai import errors, types
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_canned_video() -> bytes:
+    """Returns the bytes of a sample clip: the one checked into temp_generated_videos, else a generated test pattern."""
+    samples = sorted(glob.glob(os.path.join(ROOT_DIR, "temp_generated_videos", "*.mp4")))
+    if samples:
+        with open(samples[0], "rb") as f:
+            return f.read()
+    from benchmarks.bench_concat import make_test_clip
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "canned.mp4")
+        make_test_clip(path, 5, "1280x720", 24)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_videos(self, model, prompt, config=None, image=None):
+        client = self._client
+        await asyncio.sleep(client.submit_latency)
+        client.calls["generate_videos"] += 1
+        if random.random() < client.quota_error_rate:
+            raise errors.ClientError(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                                     "message": "Quota exceeded (fake)."}})
+        name = f"models/{model}/operations/fake-{next(client.ids)}"
+        count = getattr(config, "number_of_videos", None) or 1
+        with client.lock:
+            client.operations_started[name] = (time.monotonic(), count)
+        return types.GenerateVideosOperation(name=name, done=False)
+
+
+class _FakeOperations:
+    def __init__(self, client):
+        self._client = client
+
+    async def get(self, operation):
+        client = self._client
+        await asyncio.sleep(client.poll_latency)
+        client.calls["operations.get"] += 1
+        with client.lock:
+            started_at, count = client.operations_started.get(operation.name, (0.0, 1))
+        if time.monotonic() - started_at < client.generation_seconds:
+            return types.GenerateVideosOperation(name=operation.name, done=False)
+        videos = [types.GeneratedVideo(video=types.Video(uri=f"{operation.name}/video{i}", mime_type="video/mp4"))
+                  for i in range(count)]
+        return types.GenerateVideosOperation(name=operation.name, done=True,
+                                             response=types.GenerateVideosResponse(generated_videos=videos))
+
+
+class _FakeFiles:
+    def __init__(self, client):
+        self._client = client
+
+    async def download(self, file):
+        client = self._client
+        await asyncio.sleep(client.download_latency)
+        client.calls["files.download"] += 1
+        file.video_bytes = client.video_bytes
+        return client.video_bytes
+
+
+class FakeGenaiClient:
+    """Simulates Veo latency and returns canned video bytes; see the module docstring."""
+    def __init__(self, generation_seconds: float = 2.0, submit_latency: float = 0.2, poll_latency: float = 0.05,
+                 download_latency: float = 0.1, quota_error_rate: float = 0.0, video_bytes: bytes = None):
+        self.generation_seconds = generation_seconds
+        self.submit_latency = submit_latency
+        self.poll_latency = poll_latency
+        self.download_latency = download_latency
+        self.quota_error_rate = quota_error_rate
+        self.video_bytes = video_bytes if video_bytes is not None else load_canned_video()
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.operations_started = {}
+        self.calls = {"generate_videos": 0, "operations.get": 0, "files.download": 0}
+        self.aio = pytypes.SimpleNamespace(models=_FakeModels(self), operations=_FakeOperations(self),
+                                           files=_FakeFiles(self))
@@ -4,8 +4,96 @@ import os
 # Google Cloud Storage Settings
 GCS_BUCKET_NAME = "veo_exps"  # Replace with your bucket name
 
+# Size of the shared GCS HTTP connection pool (see utils.gcs_utils.get_storage_client)
+GCS_HTTP_POOL_SIZE = int(os.environ.get("GCS_HTTP_POOL_SIZE", "32"))
+# Concurrent downloads used when fetching many small objects (must not exceed the pool size)
+GCS_DOWNLOAD_WORKERS = int(os.environ.get("GCS_DOWNLOAD_WORKERS", "16"))
+
 # API Keys (Consider using environment variables for security)
 VEO_API_KEY = os.environ.get("VEO_API_KEY")
+# Optional comma-separated pool of keys; requests are spread across them (defaults to VEO_API_KEY)
+VEO_API_KEYS = [key.strip() for key in os.environ.get("VEO_API_KEYS", "").split(",") if key.strip()] or [VEO_API_KEY]
 # GRADIO_API_KEY = os.environ.get("GRADIO_API_KEY")
 
-# Other configurations as needed
\ No newline at end of file
+# Veo model used for all video generation requests
+VEO_MODEL = "veo-2.0-generate-001"
+# Most variants one request may ask for (Veo returns up to 4 videos per operation)
+VEO_MAX_VIDEOS_PER_REQUEST = int(os.environ.get("VEO_MAX_VIDEOS_PER_REQUEST", "4"))
+# Most shots in one storyboard; all of them are submitted to Veo at once
+STORYBOARD_MAX_SHOTS = int(os.environ.get("STORYBOARD_MAX_SHOTS", "12"))
+
+# Polling schedule for long-running Veo operations (seconds)
+VEO_POLL_INITIAL_DELAY = float(os.environ.get("VEO_POLL_INITIAL_DELAY", "5"))
+VEO_POLL_MAX_DELAY = float(os.environ.get("VEO_POLL_MAX_DELAY", "20"))
+
+# Per-key Veo request rate limit and retries after 429 / RESOURCE_EXHAUSTED errors
+VEO_REQUESTS_PER_MINUTE = float(os.environ.get("VEO_REQUESTS_PER_MINUTE", "10"))
+VEO_MAX_QUOTA_RETRIES = int(os.environ.get("VEO_MAX_QUOTA_RETRIES", "5"))
+
+# SQLite file recording in-flight Veo jobs so they survive a restart
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "veo_jobs.sqlite3")
+# Separate job store of the batch CLI (agents.batch_generator_agent), so a batch and the app
+# never resume each other's jobs
+BATCH_JOB_STORE_PATH = os.environ.get("BATCH_JOB_STORE_PATH", "veo_batch_jobs.sqlite3")
+# Seconds an unfinished job stays claimed by a process that stopped renewing it (e.g. crashed)
+# before another process sharing the job store resumes it
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+
+# Content-addressed cache of generated videos, checked before calling Veo
+GENERATION_CACHE_DIR = os.environ.get("GENERATION_CACHE_DIR", "generation_cache")
+GENERATION_CACHE_MAX_BYTES = int(os.environ.get("GENERATION_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+GENERATION_CACHE_USE_GCS = os.environ.get("GENERATION_CACHE_USE_GCS", "false").lower() == "true"
+
+# Local cache of the compacted saved-prompt index (see utils.prompt_index.PromptIndex)
+PROMPT_INDEX_CACHE_PATH = os.environ.get("PROMPT_INDEX_CACHE_PATH", "prompt_index_cache.jsonl")
+# How far before its high-water mark each index sync re-lists, to catch prompts whose upload
+# finished after a later-named prompt had already been synced (seconds)
+PROMPT_INDEX_SYNC_OVERLAP_SECONDS = float(os.environ.get("PROMPT_INDEX_SYNC_OVERLAP_SECONDS", "3600"))
+
+# Large video uploads: files above the threshold are uploaded in parallel parts and composed
+# ("composite") or as a chunked resumable session ("resumable"); chunk sizes are multiples of 256 KiB
+GCS_UPLOAD_THRESHOLD_BYTES = int(os.environ.get("GCS_UPLOAD_THRESHOLD_BYTES", str(32 * 1024 ** 2)))
+GCS_UPLOAD_CHUNK_BYTES = int(os.environ.get("GCS_UPLOAD_CHUNK_BYTES", str(8 * 1024 ** 2)))
+GCS_UPLOAD_WORKERS = int(os.environ.get("GCS_UPLOAD_WORKERS", "8"))
+GCS_UPLOAD_STRATEGY = os.environ.get("GCS_UPLOAD_STRATEGY", "composite")
+GCS_UPLOAD_MAX_RETRIES = int(os.environ.get("GCS_UPLOAD_MAX_RETRIES", "4"))
+
+# Budget and eviction policy ("lru" or "lfu") of the local generated-video directory
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+MEDIA_CACHE_POLICY = os.environ.get("MEDIA_CACHE_POLICY", "lru")
+
+# Background post-processing (GCS upload, thumbnail) of generated videos
+POST_PROCESSING_WORKERS = int(os.environ.get("POST_PROCESSING_WORKERS", "2"))
+POST_PROCESSING_QUEUE_SIZE = int(os.environ.get("POST_PROCESSING_QUEUE_SIZE", "32"))
+
+# Poster thumbnails and low-bitrate preview proxies, built on first request by a pool of
+# DERIVED_ASSET_WORKERS ffmpeg processes and shared through GCS
+DERIVED_ASSETS_DIR = os.environ.get("DERIVED_ASSETS_DIR", os.path.join("temp_generated_videos", "derived"))
+DERIVED_ASSET_WORKERS = int(os.environ.get("DERIVED_ASSET_WORKERS", "2"))
+PREVIEW_HEIGHT = int(os.environ.get("PREVIEW_HEIGHT", "360"))
+PREVIEW_BITRATE = os.environ.get("PREVIEW_BITRATE", "400k")
+
+# Normalized clips and merged prefixes reused when a concatenation is re-run with a changed
+# clip (see utils.concat_cache.ConcatCache), and the directory's size budget
+CONCAT_CACHE_DIR = os.environ.get("CONCAT_CACHE_DIR", os.path.join("temp_generated_videos", "concat_cache"))
+CONCAT_CACHE_MAX_BYTES = int(os.environ.get("CONCAT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Metrics: Prometheus text on http://<host>:METRICS_PORT/metrics (disabled when unset) and/or
+# a JSON snapshot written to METRICS_JSON_PATH every METRICS_DUMP_INTERVAL seconds
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0")) or None
+METRICS_JSON_PATH = os.environ.get("METRICS_JSON_PATH")
+METRICS_DUMP_INTERVAL = float(os.environ.get("METRICS_DUMP_INTERVAL", "60"))
+
+# Gradio request handling: concurrent generations per replica (they mostly wait on Veo, each
+# on a thread of a pool this size), concurrent concatenations (CPU bound), the request queue
+# size, Gradio's worker threads for synchronous handlers, how often a running generation
+# streams a status update (seconds), and how long the variant gallery waits for preview proxies
+# before showing the originals (seconds; the proxies keep building in the background)
+GRADIO_GENERATION_CONCURRENCY = int(os.environ.get("GRADIO_GENERATION_CONCURRENCY", "32"))
+GRADIO_CONCAT_CONCURRENCY = int(os.environ.get("GRADIO_CONCAT_CONCURRENCY", "2"))
+GRADIO_QUEUE_MAX_SIZE = int(os.environ.get("GRADIO_QUEUE_MAX_SIZE", "512"))
+GRADIO_MAX_THREADS = int(os.environ.get("GRADIO_MAX_THREADS", "64"))
+GRADIO_STATUS_INTERVAL = float(os.environ.get("GRADIO_STATUS_INTERVAL", "2"))
+GRADIO_PREVIEW_WAIT = float(os.environ.get("GRADIO_PREVIEW_WAIT", "1"))
+
+# Other configurations as needed
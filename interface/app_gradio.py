@@ -1,43 +1,155 @@
 # interface/app.py
 import gradio as gr
 import requests
+import asyncio
 import os
 import sys
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 if ROOT_DIR not in sys.path:
     sys.path.append(ROOT_DIR)
 
-from config import GCS_BUCKET_NAME
-from utils.gcs_utils import upload_to_gcs, download_from_gcs, list_blobs
-from utils.video_utils import concatenate_videos
-from agents.prompt_reader_agent import PromptReaderAgent
+from config import (GCS_BUCKET_NAME, VEO_MAX_VIDEOS_PER_REQUEST, METRICS_PORT, METRICS_JSON_PATH, METRICS_DUMP_INTERVAL,
+                    GRADIO_GENERATION_CONCURRENCY, GRADIO_CONCAT_CONCURRENCY, GRADIO_QUEUE_MAX_SIZE,
+                    GRADIO_MAX_THREADS, GRADIO_STATUS_INTERVAL, GRADIO_PREVIEW_WAIT)
+from utils.gcs_utils import upload_data
+from utils.prompt_index import new_saved_prompt_blob_name
+from utils.metrics import start_metrics_server, start_json_dump
 
-prompt_reader_agent = PromptReaderAgent()
+# The agents (job store, media cache, prompt index sync, ...) are built on first use rather than
+# at import, so the UI starts serving immediately; `_warm_up` builds them in the background.
+_agents = {}
+_agents_lock = threading.Lock()
 
-def generate_video_from_prompt(prompt, aspect_ratio, allow_people):
-    generation_result = prompt_reader_agent.process_prompt(prompt, aspect_ratio, allow_people)
-    video_path = generation_result.get("video_path")
-    if video_path:
+# Generation and storyboard handlers each park one thread waiting on their job. They get their
+# own pool, sized to the events' shared concurrency limit: the loop's default executor has only
+# min(32, cpus + 4) threads and also serves the short to_thread calls below.
+_generation_executor = ThreadPoolExecutor(max_workers=GRADIO_GENERATION_CONCURRENCY, thread_name_prefix="generation-wait")
+
+
+def _run_generation(function, *args, **kwargs):
+    return asyncio.get_running_loop().run_in_executor(_generation_executor, partial(function, *args, **kwargs))
+
+
+def get_prompt_reader_agent():
+    with _agents_lock:
+        if "reader" not in _agents:
+            from agents.prompt_reader_agent import PromptReaderAgent
+            _agents["reader"] = PromptReaderAgent()
+        return _agents["reader"]
+
+
+def get_prompt_retriever_agent():
+    with _agents_lock:
+        if "retriever" not in _agents:
+            from agents.prompt_retriever_agent import PromptRetrieverAgent
+            _agents["retriever"] = PromptRetrieverAgent()
+        return _agents["retriever"]
+
+
+def _warm_up():
+    try:
+        get_prompt_reader_agent()
+        get_prompt_retriever_agent()
+    except Exception as e:
+        print(f"Agent warm-up failed, retrying on first request: {e}")
+
+
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+if METRICS_JSON_PATH:
+    start_json_dump(METRICS_JSON_PATH, METRICS_DUMP_INTERVAL)
+
+def _generation_status(video_generator_agent, job_ids, elapsed):
+    if not job_ids:
+        # Not submitted yet, or sharing an identical request's job
+        return f"Waiting for the generation to start... ({elapsed:.0f}s)"
+    status = video_generator_agent.get_job_status(job_ids[0])
+    if status.get("queue_position") is not None:
+        return f"Queued for Veo quota, {status['queue_position']} request(s) ahead... ({elapsed:.0f}s)"
+    return f"Generating video... ({elapsed:.0f}s, {status.get('polls', 0)} status checks)"
+
+
+async def generate_video_from_prompt(prompt, aspect_ratio, allow_people, number_of_videos=1, request: gr.Request = None):
+    # Streams a status line every GRADIO_STATUS_INTERVAL seconds while the job runs. The
+    # blocking wait happens on the generation pool, so the event loop stays free for other users.
+    prompt_reader_agent = await asyncio.to_thread(get_prompt_reader_agent)
+    job_ids = []
+    started = time.monotonic()
+    generation = asyncio.ensure_future(_run_generation(
+        prompt_reader_agent.process_prompt, prompt, aspect_ratio, allow_people,
+        # One fairness group per browser session, so one user's burst cannot starve the rest
+        tenant=request.session_hash if request is not None else None, on_submitted=job_ids.append,
+        number_of_videos=int(number_of_videos or 1),
+    ))
+    while not generation.done():
+        done, _ = await asyncio.wait({generation}, timeout=GRADIO_STATUS_INTERVAL)
+        if not done:
+            yield _generation_status(prompt_reader_agent.video_generator_agent, job_ids,
+                                     time.monotonic() - started), None, None
+    generation_result = generation.result()
+    video_paths = generation_result.get("video_paths") or ([generation_result["video_path"]]
+                                                           if generation_result.get("video_path") else [])
+    for video_path in video_paths:
             # Dynamically create the blob name based on the filename
             video_filename = os.path.basename(video_path)
             gcs_blob_name = f"generated_videos/{video_filename}"
-            # Trigger GCS upload here with the dynamic blob name
-            upload_status = prompt_reader_agent.video_generator_agent.upload_video_to_gcs(video_path, gcs_blob_name)
+            # Upload and thumbnail in the background; the local file is returned to the UI right away
+            upload_status = prompt_reader_agent.video_generator_agent.publish_video(video_path, gcs_blob_name)
             print(f"GCS Upload Status (Text): {upload_status}")
 
-    return generation_result.get("message", "Video generation initiated."), generation_result.get("video_path")
+    message = generation_result.get("message", "Video generation initiated.")
+    if len(video_paths) > 1:
+        # The gallery plays low-bitrate proxies where they are ready within a short wait, and the
+        # originals otherwise; unfinished proxies keep building for the next view.
+        previews = await asyncio.gather(*(asyncio.to_thread(prompt_reader_agent.video_generator_agent.get_preview, path,
+                                                            GRADIO_PREVIEW_WAIT)
+                                          for path in video_paths))
+        video_paths = [preview or path for preview, path in zip(previews, video_paths)]
+    yield message, generation_result.get("video_path"), video_paths or None
 
 
 def download_video(video_path):
-    if video_path and os.path.exists(video_path):
+    local_path = get_prompt_reader_agent().video_generator_agent.get_local_video(video_path) if video_path else None
+    if local_path:
+        return local_path
+    elif video_path and os.path.exists(video_path):
         return video_path
     else:
         return "Video not found."
 
-def upload_videos_and_concatenate(video_files):
+async def generate_storyboard(shots_text, aspect_ratio, allow_people, request: gr.Request = None):
+    # One shot prompt per line; segments generate concurrently and are joined in order.
+    prompt_reader_agent = await asyncio.to_thread(get_prompt_reader_agent)
+    shots = [line for line in (shots_text or "").splitlines() if line.strip()]
+    progress = {"ready": 0, "total": len(shots)}
+    started = time.monotonic()
+    storyboard = asyncio.ensure_future(_run_generation(
+        prompt_reader_agent.process_storyboard, shots, aspect_ratio, allow_people,
+        tenant=request.session_hash if request is not None else None,
+        on_progress=lambda ready, total: progress.update(ready=ready, total=total),
+    ))
+    while not storyboard.done():
+        done, _ = await asyncio.wait({storyboard}, timeout=GRADIO_STATUS_INTERVAL)
+        if not done:
+            yield (f"Generating {progress['total']} shots: {progress['ready']} ready in order... "
+                   f"({time.monotonic() - started:.0f}s)"), None
+    storyboard_result = storyboard.result()
+    video_path = storyboard_result.get("video_path")
+    if storyboard_result.get("status") != "success" or not video_path:
+        yield storyboard_result.get("message", "Error generating storyboard."), None
+        return
+    gcs_blob_name = f"concatenated_videos/{os.path.basename(video_path)}"
+    upload_status = prompt_reader_agent.video_generator_agent.publish_video(video_path, gcs_blob_name)
+    print(f"GCS Upload Status (Storyboard): {upload_status}")
+    yield f"Storyboard of {len(shots)} shots ready ({time.monotonic() - started:.0f}s).", video_path
+
+def upload_videos_and_concatenate(video_files, progress=gr.Progress()):
      if not video_files or len(video_files) < 2:
         return "Please upload at least two video files."
      video_paths = []
@@ -51,14 +163,18 @@ def upload_videos_and_concatenate(video_files):
      if len(video_paths) < 2:
         return "Please upload at least two valid video files."
 
-     output_path = concatenate_videos(video_paths)
+     # Reuses clips and merged prefixes of earlier runs, so changing one clip only redoes that clip.
+     result = get_prompt_reader_agent().video_generator_agent.concatenate_videos_agent(
+         video_paths, progress=lambda fraction, desc: progress(fraction, desc=desc))
+     output_path = result.get("video_path")
      if output_path:
         # Dynamically create the blob name using the filename of the first video
         first_video_name = original_filenames[0] if original_filenames else "concatenated"
-        concatenated_filename = f"{first_video_name}_concatenated.mp4"
+        # The output name is unique, so a later concatenation never repoints an earlier one's reference.
+        concatenated_filename = f"{first_video_name}_{os.path.basename(output_path)}"
         gcs_blob_name = f"concatenated_videos/{concatenated_filename}"
-        # Trigger GCS upload after concatenation with the dynamic blob name
-        upload_status = prompt_reader_agent.video_generator_agent.upload_video_to_gcs(output_path, gcs_blob_name)
+        # Upload and thumbnail in the background; the local file is returned to the UI right away
+        upload_status = get_prompt_reader_agent().video_generator_agent.publish_video(output_path, gcs_blob_name)
         print(f"GCS Upload Status (Concatenation): {upload_status}")
         return output_path
      else:
@@ -71,31 +187,17 @@ def save_successful_prompt(prompt, save_checkbox_value):
         # or have the prompt reader agent handle saving as well.
         # For simplicity, let's assume direct call if you adapt the agent.
         # Replace with your actual saving mechanism if you have a separate agent.
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        blob_name = f"saved_prompts/prompt_{timestamp}.txt"
-        file_path = f"temp_prompt_{timestamp}.txt"
-        with open(file_path, 'w') as f:
-            f.write(prompt)
-        upload_to_gcs(GCS_BUCKET_NAME, file_path, blob_name)
-        os.remove(file_path)
+        blob_name, timestamp = new_saved_prompt_blob_name("txt")
+        upload_data(GCS_BUCKET_NAME, prompt, blob_name)
+        get_prompt_retriever_agent().index.add(blob_name, prompt, timestamp)
         return f"Prompt '{prompt}' saved to GCS."
     else:
         return "Prompt not saved."
 
-def load_saved_prompts():
-    blob_names = list_blobs(GCS_BUCKET_NAME, prefix="saved_prompts/")
-    prompts = []
-    for blob_name in blob_names:
-        temp_file = f"temp_prompt_{blob_name.split('/')[-1]}"
-        download_from_gcs(GCS_BUCKET_NAME, blob_name, temp_file)
-        try:
-            with open(temp_file, 'r') as f:
-                prompts.append(f.read())
-        except Exception as e:
-            print(f"Error reading {blob_name}: {e}")
-        finally:
-            os.remove(temp_file)
-    return prompts
+def load_saved_prompts(query="", page=1):
+    result = get_prompt_retriever_agent().search_prompts(query or "", int(page or 1))
+    status = f"{result['total']} prompts - page {result['page']} of {result['pages']}"
+    return result["prompts"], status
 
 with gr.Blocks() as demo:
     gr.Markdown("# Veo Video Generation Bot")
@@ -108,15 +210,19 @@ with gr.Blocks() as demo:
         allow_people_radio = gr.Radio(
             choices=["dont_allow", "allow_adult"], label="Allow People", value="dont_allow"
         )
+        number_of_videos_slider = gr.Slider(
+            minimum=1, maximum=VEO_MAX_VIDEOS_PER_REQUEST, step=1, value=1, label="Number of Variants"
+        )
         generate_button = gr.Button("Generate Video")
         generation_output = gr.Textbox(label="Generation Status")
         video_output = gr.Video(label="Generated Video")
+        variants_gallery = gr.Gallery(label="Variants", columns=2)
         save_prompt_checkbox = gr.Checkbox(label="Save this prompt?")
         save_prompt_button = gr.Button("Save Prompt")
         save_prompt_status = gr.Textbox(label="Save Status")
 
         def handle_generation_click(prompt, aspect_ratio, allow_people):
-            generation_result = prompt_reader_agent.process_prompt(prompt, aspect_ratio, allow_people)
+            generation_result = get_prompt_reader_agent().process_prompt(prompt, aspect_ratio, allow_people)
             status = generation_result.get("message", "Video generation initiated.")
             video_path = generation_result.get("video_path")
             if video_path:
@@ -134,17 +240,37 @@ with gr.Blocks() as demo:
 
         generate_button.click(
             fn=generate_video_from_prompt,
-            inputs=[prompt_input, aspect_ratio_dropdown, allow_people_radio],
-            outputs=[generation_output, video_output]
+            inputs=[prompt_input, aspect_ratio_dropdown, allow_people_radio, number_of_videos_slider],
+            outputs=[generation_output, video_output, variants_gallery],
+            concurrency_limit=GRADIO_GENERATION_CONCURRENCY,
+            concurrency_id="generation",
         )
         save_prompt_button.click(
             fn=save_successful_prompt,
             inputs=[prompt_input, save_prompt_checkbox],
-            outputs=save_prompt_status
+            outputs=save_prompt_status,
+            concurrency_limit=None,
         )
         # video_output.show_download_button("downloaded_video.mp4")
         # handled separately in the handle function
 
+    with gr.Tab("Storyboard"):
+        shots_input = gr.Textbox(label="Shot Prompts (one per line, in order)", lines=6)
+        storyboard_aspect_ratio = gr.Dropdown(choices=["16:9", "9:16"], label="Aspect Ratio", value="16:9")
+        storyboard_allow_people = gr.Radio(
+            choices=["dont_allow", "allow_adult"], label="Allow People", value="dont_allow"
+        )
+        storyboard_button = gr.Button("Generate Storyboard")
+        storyboard_status = gr.Textbox(label="Storyboard Status")
+        storyboard_output = gr.Video(label="Storyboard Video")
+        storyboard_button.click(
+            fn=generate_storyboard,
+            inputs=[shots_input, storyboard_aspect_ratio, storyboard_allow_people],
+            outputs=[storyboard_status, storyboard_output],
+            concurrency_limit=GRADIO_GENERATION_CONCURRENCY,
+            concurrency_id="generation",
+        )
+
     with gr.Tab("Concatenate Videos"):
         video_upload = gr.Files(label="Upload Videos to Concatenate (at least 2)")
         concatenate_button = gr.Button("Concatenate Videos")
@@ -169,14 +295,33 @@ with gr.Blocks() as demo:
         concatenate_button.click(
             fn=upload_videos_and_concatenate,
             inputs=video_upload,
-            outputs=concatenated_video_output
+            outputs=concatenated_video_output,
+            concurrency_limit=GRADIO_CONCAT_CONCURRENCY,
+            concurrency_id="concatenation",
         )
        # concatenated_video_output.show_download_button("concatenated_result.mp4")
        # Handled separately in the handle function
 
     with gr.Tab("Saved Prompts"):
-        saved_prompts_output = gr.List(label="Saved Prompts")
+        search_input = gr.Textbox(label="Search Saved Prompts")
+        page_input = gr.Number(label="Page", value=1, precision=0, minimum=1)
         load_prompts_button = gr.Button("Load Saved Prompts")
-        load_prompts_button.click(fn=load_saved_prompts, outputs=saved_prompts_output)
+        saved_prompts_status = gr.Textbox(label="Results")
+        saved_prompts_output = gr.List(label="Saved Prompts")
+        load_prompts_button.click(
+            fn=load_saved_prompts,
+            inputs=[search_input, page_input],
+            outputs=[saved_prompts_output, saved_prompts_status],
+            concurrency_limit=None,
+        )
+        search_input.submit(
+            fn=load_saved_prompts,
+            inputs=[search_input, page_input],
+            outputs=[saved_prompts_output, saved_prompts_status],
+            concurrency_limit=None,
+        )
 
-demo.launch()
\ No newline at end of file
+threading.Thread(target=_warm_up, name="agent-warm-up", daemon=True).start()
+# Events without an explicit limit run one at a time; the queue shows waiting users their position.
+demo.queue(max_size=GRADIO_QUEUE_MAX_SIZE, default_concurrency_limit=1)
+demo.launch(max_threads=GRADIO_MAX_THREADS)
\ No newline at end of file
@@ -0,0 +1,56 @@
+# tests/conftest.py
+import os
+
+import pytest
+
+from benchmarks.fake_gcs_server import start_fake_gcs_server
+from utils.gcs_utils import reset_storage_client
+
+
+@pytest.fixture(scope="session")
+def fake_gcs():
+    """An in-memory GCS server that `utils.gcs_utils` talks to for the whole session."""
+    pytest.importorskip("google.cloud.storage")
+    server = start_fake_gcs_server()
+    previous = os.environ.get("STORAGE_EMULATOR_HOST")
+    os.environ["STORAGE_EMULATOR_HOST"] = server.url
+    reset_storage_client()
+    yield server
+    reset_storage_client()
+    if previous is None:
+        os.environ.pop("STORAGE_EMULATOR_HOST", None)
+    else:
+        os.environ["STORAGE_EMULATOR_HOST"] = previous
+    server.shutdown()
+
+
+@pytest.fixture
+def make_generator_agent(tmp_path, monkeypatch):
+    """
+    Builds VideoGeneratorAgents on fake Veo clients with every directory under `tmp_path`.
+    Keyword arguments override module-level settings of agents.video_generator_agent.
+    """
+    pytest.importorskip("google.genai")
+    from agents import video_generator_agent
+    from benchmarks.fake_genai import FakeGenaiClient
+
+    monkeypatch.setattr(video_generator_agent, "DERIVED_ASSETS_DIR", str(tmp_path / "derived"))
+    monkeypatch.setattr(video_generator_agent, "CONCAT_CACHE_DIR", str(tmp_path / "concat_cache"))
+    agents = []
+
+    def make(gcs_bucket_name="test-bucket", video_bytes=b"fake mp4", **settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(video_generator_agent, name, value)
+        client = FakeGenaiClient(generation_seconds=0.02, submit_latency=0, poll_latency=0, download_latency=0,
+                                 video_bytes=video_bytes)
+        agent = video_generator_agent.VideoGeneratorAgent(
+            output_dir=str(tmp_path / "videos"), gcs_bucket_name=gcs_bucket_name,
+            job_store_path=str(tmp_path / "jobs.sqlite3"), clients={"fake-key": client})
+        agent.engine.poll_schedule.initial_delay = agent.engine.poll_schedule.max_delay = 0.01
+        agents.append(agent)
+        return agent
+
+    yield make
+    for agent in agents:
+        agent.engine.shutdown()
+        agent.job_store.close()
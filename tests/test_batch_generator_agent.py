@@ -0,0 +1,49 @@
+# tests/test_batch_generator_agent.py
+import json
+from types import SimpleNamespace
+
+from agents.batch_generator_agent import BatchGeneratorAgent
+
+
+class _Reader:
+    """Generates instantly and uploads with the given outcomes, in order."""
+    def __init__(self, upload_statuses):
+        self.upload_statuses = list(upload_statuses)
+        self.prompts = []
+        self.video_generator_agent = SimpleNamespace(upload_video_to_gcs=self._upload)
+
+    def process_prompt(self, prompt, aspect_ratio, allow_people, **kwargs):
+        self.prompts.append(prompt)
+        return {"status": "success", "video_path": f"/videos/{len(self.prompts)}.mp4"}
+
+    def _upload(self, video_path, blob_name):
+        return self.upload_statuses.pop(0)
+
+
+def _write_items(path, prompts):
+    path.write_text("".join(json.dumps({"id": str(i), "prompt": prompt}) + "\n" for i, prompt in enumerate(prompts)))
+
+
+def test_failed_uploads_are_recorded_as_errors_and_retried(tmp_path):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_items(input_path, ["a cat"])
+    failed = {"status": "error", "message": "bucket unavailable"}
+    reader = _Reader([failed])
+    summary = BatchGeneratorAgent(reader, upload_to_gcs=True).run(str(input_path), str(output_path))
+    assert (summary["succeeded"], summary["failed"]) == (0, 1)
+    record = json.loads(output_path.read_text())
+    assert record["status"] == "error" and record["upload_errors"] == ["bucket unavailable"]
+
+    reader = _Reader([{"status": "success", "gcs_uri": "gs://bucket/generated_videos/1.mp4"}])
+    summary = BatchGeneratorAgent(reader, upload_to_gcs=True).run(str(input_path), str(output_path))
+    assert (summary["succeeded"], summary["skipped"]) == (1, 0)
+    assert reader.prompts == ["a cat"]
+
+
+def test_successful_items_are_skipped_on_rerun(tmp_path):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_items(input_path, ["a cat", "a dog"])
+    BatchGeneratorAgent(_Reader([])).run(str(input_path), str(output_path))
+    reader = _Reader([])
+    summary = BatchGeneratorAgent(reader).run(str(input_path), str(output_path))
+    assert summary["skipped"] == 2 and reader.prompts == []
@@ -0,0 +1,95 @@
+# tests/test_concat_cache.py
+import os
+import time
+
+import pytest
+
+import utils.concat_cache as concat_cache
+from benchmarks.bench_concat import make_test_clip
+from utils.concat_cache import ConcatCache
+from utils.video_utils import probe_video
+
+
+@pytest.fixture(scope="module")
+def clips(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("clips")
+    try:
+        return {name: make_test_clip(str(directory / f"{name}.mp4"), 1, size, 24, pattern)
+                for name, size, pattern in (("a", "320x180", "testsrc2"), ("b", "320x180", "smptebars"),
+                                            ("small", "160x120", "testsrc2"))}
+    except Exception as e:
+        pytest.skip(f"ffmpeg is not available: {e}")
+
+
+@pytest.fixture
+def normalized(monkeypatch):
+    """Records the clips re-encoded by the cache."""
+    calls = []
+    real = concat_cache.normalize_video
+
+    def normalize_video(path, *args, **kwargs):
+        calls.append(os.path.basename(path))
+        return real(path, *args, **kwargs)
+
+    monkeypatch.setattr(concat_cache, "normalize_video", normalize_video)
+    return calls
+
+
+def test_appending_a_clip_reuses_the_merged_prefix(clips, normalized, tmp_path):
+    cache = ConcatCache(str(tmp_path / "cache"), 10 ** 9)
+    first = cache.concatenate([clips["a"], clips["small"]], str(tmp_path / "first.mp4"))
+    assert normalized == ["a.mp4", "small.mp4"]
+    prefixes = [name for name in os.listdir(cache.cache_dir) if name.startswith("prefix_")]
+    assert len(prefixes) == 1
+    assert os.path.samefile(first, os.path.join(cache.cache_dir, prefixes[0]))
+
+    normalized.clear()
+    cache.concatenate([clips["a"], clips["small"], clips["b"]], str(tmp_path / "second.mp4"))
+    assert normalized == ["b.mp4"]
+
+
+def test_reordered_clips_reuse_normalized_segments(clips, normalized, tmp_path):
+    cache = ConcatCache(str(tmp_path / "cache"), 10 ** 9)
+    cache.concatenate([clips["a"], clips["small"], clips["b"]], str(tmp_path / "first.mp4"))
+    normalized.clear()
+    output_path = cache.concatenate([clips["b"], clips["a"], clips["small"]], str(tmp_path / "second.mp4"))
+    assert normalized == []
+    assert probe_video(output_path)["duration"] == pytest.approx(3.0, abs=0.3)
+
+
+def test_stream_copies_keep_no_prefix(clips, normalized, tmp_path):
+    cache = ConcatCache(str(tmp_path / "cache"), 10 ** 9)
+    cache.concatenate([clips["a"], clips["b"]], str(tmp_path / "out.mp4"))
+    assert normalized == [] and os.listdir(cache.cache_dir) == []
+
+
+def test_progress_is_reported_while_clips_are_encoded(clips, tmp_path):
+    progress = []
+    ConcatCache(str(tmp_path / "cache"), 10 ** 9).concatenate(
+        [clips["a"], clips["small"]], str(tmp_path / "out.mp4"),
+        progress=lambda fraction, description: progress.append((fraction, description)))
+    fractions = [fraction for fraction, _ in progress]
+    assert fractions == sorted(fractions) and fractions[-1] == 1.0
+    assert any(0.1 < fraction < 0.9 and description.startswith("Re-encoding") for fraction, description in progress)
+
+
+def test_only_stale_partial_files_are_removed_on_startup(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    fresh, stale = cache_dir / "segment_x.mp4.1.2.part.mp4", cache_dir / "segment_y.mp4.3.4.part.mp4"
+    fresh.write_bytes(b"building")
+    stale.write_bytes(b"crashed")
+    old = time.time() - 2 * concat_cache._STALE_PART_SECONDS
+    os.utime(stale, (old, old))
+
+    cache = ConcatCache(str(cache_dir), 10 ** 9)
+    assert fresh.exists() and not stale.exists()
+    assert cache.total_bytes() == 0
+
+
+def test_probe_memo_is_bounded(clips, tmp_path, monkeypatch):
+    monkeypatch.setattr(concat_cache, "_PROBES_MAX", 2)
+    cache = ConcatCache(str(tmp_path / "cache"), 10 ** 9)
+    for i, name in enumerate(("a", "b", "small")):
+        cache._probe(clips[name], str(i))
+    assert list(cache._probes) == ["1", "2"]
@@ -0,0 +1,77 @@
+# tests/test_content_store.py
+import hashlib
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+import pytest
+
+from utils import content_store
+from utils.content_store import content_blob_name, resolve, store_file
+
+
+@pytest.fixture
+def bucket(fake_gcs, monkeypatch):
+    monkeypatch.setattr(content_store, "_known_objects", OrderedDict())
+    return f"content-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """Records the content objects actually uploaded."""
+    blob_names = []
+    upload_file = content_store.upload_file
+
+    def record(bucket_name, source_file_path, destination_blob_name, **kwargs):
+        blob_names.append(destination_blob_name)
+        return upload_file(bucket_name, source_file_path, destination_blob_name, **kwargs)
+
+    monkeypatch.setattr(content_store, "upload_file", record)
+    return blob_names
+
+
+def _video(tmp_path, data):
+    path = str(tmp_path / f"{uuid.uuid4().hex}.mp4")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_identical_content_is_uploaded_once(fake_gcs, bucket, uploads, tmp_path):
+    data = os.urandom(1000)
+    first = store_file(bucket, _video(tmp_path, data), "generated_videos/a.mp4", content_type="video/mp4")
+    second = store_file(bucket, _video(tmp_path, data), "generated_videos/b.mp4", content_type="video/mp4")
+    assert uploads == [first["blob_name"]]
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert second["blob_name"] == first["blob_name"] == content_blob_name(hashlib.sha256(data).hexdigest())
+
+    # Another process has no memo of the object and finds it with a metadata lookup.
+    content_store._known_objects.clear()
+    assert store_file(bucket, _video(tmp_path, data), "generated_videos/c.mp4")["deduplicated"]
+    assert len(uploads) == 1
+
+
+def test_object_of_another_size_is_uploaded_again(fake_gcs, bucket, uploads, tmp_path):
+    data = os.urandom(1000)
+    blob_name = content_blob_name(hashlib.sha256(data).hexdigest())
+    fake_gcs.state.put(bucket, blob_name, data[:500])  # e.g. a truncated earlier write
+
+    result = store_file(bucket, _video(tmp_path, data), "generated_videos/a.mp4")
+    assert not result["deduplicated"] and uploads == [blob_name]
+    assert fake_gcs.state.objects[(bucket, blob_name)]["data"] == data
+
+
+def test_ref_points_at_the_content_object(fake_gcs, bucket, tmp_path):
+    data = os.urandom(1000)
+    result = store_file(bucket, _video(tmp_path, data), "concatenated_videos/x.mp4", content_type="video/mp4")
+    assert result["ref"] == "refs/concatenated_videos/x.mp4"
+
+    stored = json.loads(fake_gcs.state.objects[(bucket, result["ref"])]["data"])
+    assert stored["sha256"] == hashlib.sha256(data).hexdigest() == result["sha256"]
+    assert (stored["blob_name"], stored["bytes"], stored["content_type"]) == (result["blob_name"], 1000, "video/mp4")
+    assert resolve(bucket, "concatenated_videos/x.mp4") == stored
+
+
+def test_resolve_of_an_unknown_name_is_none(fake_gcs, bucket):
+    assert resolve(bucket, "generated_videos/missing.mp4") is None
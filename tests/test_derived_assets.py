@@ -0,0 +1,86 @@
+# tests/test_derived_assets.py
+import os
+import threading
+import uuid
+
+import pytest
+
+from utils import derived_assets
+from utils.derived_assets import GCS_DERIVED_PREFIX, DerivedAssets
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Replaces the ffmpeg thumbnail builder with one that records its sources."""
+    sources = []
+
+    def build(video_path, output_path, **options):
+        sources.append(video_path)
+        with open(output_path, "wb") as f:
+            f.write(b"jpeg of " + os.path.basename(video_path).encode())
+
+    monkeypatch.setitem(derived_assets.ASSET_KINDS, "thumbnail", (".jpg", build))
+    return sources
+
+
+def _video(directory, name, data=None):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data or os.urandom(100))
+    return path
+
+
+def test_renamed_video_reuses_its_assets(builds, tmp_path):
+    assets = DerivedAssets(str(tmp_path / "derived"))
+    original = _video(tmp_path, "a.mp4")
+    thumbnail = assets.thumbnail(original, timeout=10)
+
+    renamed = str(tmp_path / "b.mp4")
+    os.rename(original, renamed)
+    assert assets.thumbnail(renamed, timeout=10) == thumbnail
+    assert builds == [original]
+    assert assets.cached(renamed, "thumbnail") == thumbnail
+
+
+def test_assets_are_refilled_from_gcs(fake_gcs, builds, tmp_path):
+    bucket = f"derived-{uuid.uuid4().hex[:8]}"
+    video = _video(tmp_path, "a.mp4")
+    first = DerivedAssets(str(tmp_path / "first"), bucket)
+    built = first.thumbnail(video, timeout=10)
+    first.flush_uploads()
+    digest = first.content_hash(video)
+    assert (bucket, f"{GCS_DERIVED_PREFIX}{digest}/thumbnail.jpg") in fake_gcs.state.objects
+
+    second = DerivedAssets(str(tmp_path / "second"), bucket)
+    refilled = second.thumbnail(video, timeout=10)
+    assert refilled != built
+    with open(built, "rb") as a, open(refilled, "rb") as b:
+        assert a.read() == b.read()
+    assert builds == [video]
+
+
+def test_hash_memo_is_bounded(monkeypatch, tmp_path):
+    monkeypatch.setattr(derived_assets, "_HASHES_MAX", 2)
+    assets = DerivedAssets(str(tmp_path / "derived"))
+    paths = [_video(tmp_path, f"{i}.mp4") for i in range(3)]
+    for path in paths:
+        assets.content_hash(path)
+    assert len(assets._hashes) == len(assets._last_hash) == 2
+    assert os.path.realpath(paths[0]) not in assets._last_hash
+
+
+def test_slow_preview_falls_back_and_keeps_building(make_generator_agent, monkeypatch, tmp_path):
+    release = threading.Event()
+
+    def build(video_path, output_path, **options):
+        release.wait(5)
+        with open(output_path, "wb") as f:
+            f.write(b"preview")
+
+    monkeypatch.setitem(derived_assets.ASSET_KINDS, "preview", (".mp4", build))
+    agent = make_generator_agent(gcs_bucket_name=None)
+    video = _video(agent.output_dir, "clip.mp4")
+    assert agent.get_preview(video, timeout=0.05) is None
+
+    release.set()
+    assert agent.get_preview(video, timeout=5) == agent.derived_assets.cached(video, "preview")
@@ -0,0 +1,87 @@
+# tests/test_gcs_upload.py
+import os
+import uuid
+
+import pytest
+
+from utils import gcs_upload
+from utils.gcs_upload import TEMP_PARTS_PREFIX, UploadError, file_checksums, get_upload_stats, upload_file
+
+
+@pytest.fixture
+def bucket(fake_gcs, monkeypatch):
+    monkeypatch.setattr(gcs_upload, "_backoff", lambda attempt: 0)
+    return f"uploads-{uuid.uuid4().hex[:8]}"
+
+
+def _file(tmp_path, size):
+    path = str(tmp_path / f"{uuid.uuid4().hex}.mp4")
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def _stored(server, bucket, name):
+    return server.state.objects[(bucket, name)]["data"]
+
+
+def test_composite_upload_composes_in_two_levels_and_removes_parts(fake_gcs, bucket, tmp_path):
+    path = _file(tmp_path, 40 * 1024)
+    result = upload_file(bucket, path, "videos/big.mp4", strategy="composite", threshold=0, chunk_size=1024)
+
+    assert result["parts"] == 40 > gcs_upload.MAX_COMPOSE_SOURCES
+    with open(path, "rb") as f:
+        assert _stored(fake_gcs, bucket, "videos/big.mp4") == f.read()
+    assert not [name for b, name in fake_gcs.state.objects if b == bucket and name.startswith(TEMP_PARTS_PREFIX)]
+
+
+def test_resumable_upload_resumes_from_the_persisted_offset(fake_gcs, bucket, tmp_path, monkeypatch):
+    offsets = []
+    session_offset = gcs_upload._Upload._session_offset
+
+    def record(self, transport, session_url):
+        offsets.append(session_offset(self, transport, session_url))
+        return offsets[-1]
+
+    monkeypatch.setattr(gcs_upload._Upload, "_session_offset", record)
+    chunk = gcs_upload.CHUNK_ALIGNMENT
+    path = _file(tmp_path, 3 * chunk)
+    fake_gcs.state.fail_uploads = 1
+    try:
+        result = upload_file(bucket, path, "videos/resumed.mp4", strategy="resumable", threshold=0, chunk_size=chunk)
+    finally:
+        fake_gcs.state.fail_uploads = 0
+
+    # The injected 503 keeps the first half of the first chunk.
+    assert offsets == [chunk // 2]
+    assert result["retries"] == 1
+    with open(path, "rb") as f:
+        assert _stored(fake_gcs, bucket, "videos/resumed.mp4") == f.read()
+    assert result["md5"] == file_checksums(path)["md5"]
+
+
+@pytest.mark.parametrize("strategy, field", [("single", "md5"), ("composite", "crc32c")])
+def test_checksum_mismatch_raises(fake_gcs, bucket, tmp_path, strategy, field):
+    path = _file(tmp_path, 4096)
+    checksums = file_checksums(path)
+    checksums[field] = file_checksums(_file(tmp_path, 4096))[field]
+    threshold = 10 ** 9 if strategy == "single" else 0
+    with pytest.raises(UploadError, match="mismatch"):
+        upload_file(bucket, path, "videos/corrupt.mp4", strategy="composite", threshold=threshold, chunk_size=1024,
+                    checksums=checksums)
+
+
+def test_upload_stats_accumulate_successes_and_failures(fake_gcs, bucket, tmp_path):
+    before = get_upload_stats()
+    path = _file(tmp_path, 2048)
+    upload_file(bucket, path, "videos/counted.mp4")
+    checksums = dict(file_checksums(path), md5="AAAAAAAAAAAAAAAAAAAAAA==")
+    with pytest.raises(UploadError):
+        upload_file(bucket, path, "videos/counted.mp4", checksums=checksums)
+
+    after = get_upload_stats()
+    assert after["uploads"] == before["uploads"] + 1
+    assert after["failures"] == before["failures"] + 1
+    assert after["bytes"] == before["bytes"] + 2048
+    assert after["seconds"] > before["seconds"]
+    assert after["throughput_mib_s"] > 0
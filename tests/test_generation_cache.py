@@ -0,0 +1,80 @@
+# tests/test_generation_cache.py
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.generation_cache import GCS_CACHE_PREFIX, GenerationCache
+
+
+def _video(directory, name, size=100):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def test_concurrent_misses_for_one_key_generate_once(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache"), 10_000, output_dir=str(tmp_path / "out"))
+    video_path = _video(tmp_path, "generated.mp4")
+    calls, release = [], threading.Event()
+
+    def generate():
+        calls.append(1)
+        release.wait(5)
+        return {"status": "success", "video_path": video_path}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(cache.get_or_generate, "key", generate) for _ in range(8)]
+        release.set()
+        results = [future.result(5) for future in futures]
+    assert len(calls) == 1
+    assert all(result["video_path"] == video_path for result in results)
+
+    hit = cache.get_or_generate("key", generate)
+    assert hit["cached"] and len(calls) == 1
+    assert os.path.dirname(hit["video_path"]) == str(tmp_path / "out")
+
+
+def test_failed_generations_are_not_cached(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache"), 10_000, output_dir=str(tmp_path / "out"))
+    assert cache.get_or_generate("key", lambda: {"status": "error", "message": "no"})["status"] == "error"
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entries_are_evicted_but_handed_out_files_survive(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache"), 250, output_dir=str(tmp_path / "out"))
+    for key in ("a", "b"):
+        cache.put(key, _video(tmp_path, f"{key}.mp4"))
+    handed_out = cache.get_or_generate("a", lambda: {"status": "error"})["video_path"]
+
+    cache.put("c", _video(tmp_path, "c.mp4"))  # Over budget: "b" is the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+
+    cache.put("d", _video(tmp_path, "d.mp4"))
+    assert cache.get("a") is None
+    assert os.path.getsize(handed_out) == 100
+
+
+def test_variants_hit_only_when_every_variant_is_cached(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache"), 10_000, output_dir=str(tmp_path / "out"))
+    paths = [_video(tmp_path, f"v{i}.mp4") for i in range(2)]
+    result = {"status": "success", "video_path": paths[0], "video_paths": paths}
+    cache.get_or_generate("key", lambda: result, variants=2)
+    hit = cache.get_or_generate("key", lambda: None, variants=2)
+    assert hit["cached"] and len(hit["video_paths"]) == 2
+
+    os.remove(cache._path("key_1"))
+    assert cache.get_or_generate("key", lambda: result, variants=2) is result
+
+
+def test_gcs_tier_uploads_in_the_background_and_refills(fake_gcs, tmp_path):
+    bucket = f"cache-{uuid.uuid4().hex[:8]}"
+    cache = GenerationCache(str(tmp_path / "cache"), 10_000, gcs_bucket_name=bucket, output_dir=str(tmp_path / "out"))
+    cache.put("key", _video(tmp_path, "generated.mp4"))
+    cache.flush_uploads()
+    assert (bucket, f"{GCS_CACHE_PREFIX}key.mp4") in fake_gcs.state.objects
+
+    fresh = GenerationCache(str(tmp_path / "other"), 10_000, gcs_bucket_name=bucket, output_dir=str(tmp_path / "out2"))
+    assert os.path.getsize(fresh.get("key")) == 100
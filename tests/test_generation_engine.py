@@ -0,0 +1,76 @@
+# tests/test_generation_engine.py
+import os
+
+import pytest
+
+from agents.generation_engine import GenerationEngine, PollSchedule
+from utils.generation_cache import GenerationCache
+from utils.job_store import JobStore
+from utils.rate_limiter import VeoScheduler
+
+
+@pytest.fixture
+def fake_client():
+    pytest.importorskip("google.genai")
+    from benchmarks.fake_genai import FakeGenaiClient
+    return FakeGenaiClient(generation_seconds=0.02, submit_latency=0, poll_latency=0, download_latency=0,
+                           video_bytes=b"fake mp4")
+
+
+def test_finished_jobs_are_pruned_and_answered_from_the_store(fake_client, tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    engine = GenerationEngine(VeoScheduler({"key": fake_client}, 600), str(tmp_path),
+                              poll_schedule=PollSchedule(0.01, 0.02), job_store=store, finished_job_ttl=0)
+    try:
+        first = engine.submit("a cat")
+        result = engine.wait(first, timeout=10)
+        assert result["status"] == "success"
+        store.flush()
+
+        second = engine.submit("a dog")
+        assert first not in engine._jobs and first not in engine._futures
+        assert engine.wait(first) == result
+        assert engine.status(first)["state"] == "succeeded"
+        assert engine.wait(second, timeout=10)["status"] == "success"
+        assert engine.in_flight() == 0
+    finally:
+        engine.shutdown()
+        store.close()
+
+
+def test_unfinished_jobs_are_never_pruned(fake_client, tmp_path):
+    fake_client.generation_seconds = 0.3
+    engine = GenerationEngine(VeoScheduler({"key": fake_client}, 600), str(tmp_path),
+                              poll_schedule=PollSchedule(0.01, 0.02), finished_job_ttl=0)
+    try:
+        job_ids = [engine.submit(f"shot {i}") for i in range(3)]
+        assert engine.in_flight() == 3
+        assert all(engine.wait(job_id, timeout=10)["status"] == "success" for job_id in job_ids)
+    finally:
+        engine.shutdown()
+
+
+def test_variants_are_downloaded_stored_and_cached(fake_client, tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    engine = GenerationEngine(VeoScheduler({"key": fake_client}, 600), str(tmp_path / "videos"),
+                              poll_schedule=PollSchedule(0.01, 0.02), job_store=store, finished_job_ttl=0)
+    cache = GenerationCache(str(tmp_path / "cache"), 10_000, output_dir=str(tmp_path / "videos"))
+    try:
+        job_id = engine.submit("a cat", number_of_videos=3)
+        result = cache.get_or_generate("key", lambda: engine.wait(job_id, timeout=10), variants=3)
+        paths = result["video_paths"]
+        assert len(set(paths)) == 3 and result["video_path"] == paths[0]
+        assert all(os.path.getsize(path) == len(b"fake mp4") for path in paths)
+
+        store.flush()
+        assert store.get(job_id)["video_paths"] == paths
+        engine.submit("a dog")  # Prunes the finished job, so the next wait reads the store
+        assert job_id not in engine._jobs
+        assert engine.wait(job_id)["video_paths"] == paths
+
+        hit = cache.get_or_generate("key", lambda: None, variants=3)
+        assert hit["cached"]
+        assert [os.path.basename(path) for path in hit["video_paths"]] == [f"cached_key_{i}.mp4" for i in range(3)]
+    finally:
+        engine.shutdown()
+        store.close()
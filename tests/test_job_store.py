@@ -0,0 +1,94 @@
+# tests/test_job_store.py
+import sqlite3
+import time
+
+import pytest
+
+from agents.generation_engine import GenerationEngine, PollSchedule
+from utils.job_store import JobStore
+from utils.rate_limiter import VeoScheduler
+
+
+def _queued_job(job_id="job-1", **overrides):
+    job = {"job_id": job_id, "prompt": "a cat", "aspect_ratio": "16:9", "allow_people": "dont_allow",
+           "state": "queued", "number_of_videos": 1, "polls": 0, "priority": 0, "submitted_at": time.time()}
+    job.update(overrides)
+    return job
+
+
+def _orphan(path, job):
+    """Records a job from a store that then shuts down, leaving it unowned."""
+    store = JobStore(path)
+    store.record(job)
+    store.close()
+
+
+def test_only_one_store_claims_an_unowned_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    _orphan(path, _queued_job())
+    first, second = JobStore(path), JobStore(path)
+    try:
+        claims = [first.claim_unfinished(), second.claim_unfinished()]
+        assert sorted(len(claim) for claim in claims) == [0, 1]
+        assert first.get("job-1")["owner"] == (first if claims[0] else second).owner
+    finally:
+        first.close()
+        second.close()
+
+
+def test_live_leases_are_respected_and_expired_ones_taken_over(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    live, other = JobStore(path), JobStore(path)
+    try:
+        live.record(_queued_job("live"))
+        live.flush()
+        # A process that crashed without releasing its lease.
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT INTO jobs (job_id, prompt, state, owner, lease_expires_at, submitted_at) "
+                         "VALUES ('crashed', 'a dog', 'running', 'gone:1:dead', ?, ?)", (time.time() - 1, time.time()))
+        assert [job["job_id"] for job in other.claim_unfinished()] == ["crashed"]
+        assert live.claim_unfinished() == []
+    finally:
+        live.close()
+        other.close()
+
+
+def test_a_store_that_lost_a_lease_does_not_overwrite_the_new_owner(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    stale, current = JobStore(path, lease_seconds=60), JobStore(path)
+    try:
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT INTO jobs (job_id, prompt, state, owner, lease_expires_at) "
+                         "VALUES ('job-1', 'a cat', 'queued', ?, ?)", (current.owner, time.time() + 60))
+        stale.record(_queued_job(state="failed", error="stale"))
+        stale.flush()
+        assert current.get("job-1")["state"] == "queued"
+    finally:
+        stale.close()
+        current.close()
+
+
+def test_two_engines_on_one_store_generate_a_recovered_job_once(tmp_path):
+    pytest.importorskip("google.genai")
+    from benchmarks.fake_genai import FakeGenaiClient
+
+    path = str(tmp_path / "jobs.sqlite3")
+    _orphan(path, _queued_job())
+    clients = [FakeGenaiClient(generation_seconds=0.05, submit_latency=0, poll_latency=0, download_latency=0,
+                               video_bytes=b"fake mp4") for _ in range(2)]
+    engines = []
+    for i, client in enumerate(clients):
+        output_dir = tmp_path / f"videos{i}"
+        output_dir.mkdir()
+        engines.append(GenerationEngine(VeoScheduler({"key": client}, 600), str(output_dir),
+                                        poll_schedule=PollSchedule(0.01, 0.02), job_store=JobStore(path)))
+    try:
+        resumed = [engine.recover() for engine in engines]
+        assert sorted(map(len, resumed)) == [0, 1]
+        winner = engines[0] if resumed[0] else engines[1]
+        assert winner.wait("job-1", timeout=10)["status"] == "success"
+        assert sum(client.calls["generate_videos"] for client in clients) == 1
+    finally:
+        for engine in engines:
+            engine.shutdown()
+            engine.job_store.close()
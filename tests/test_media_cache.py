@@ -0,0 +1,65 @@
+# tests/test_media_cache.py
+import os
+
+from utils.media_cache import MediaCache
+
+
+def _video(directory, name, size=100):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def test_files_without_a_gcs_copy_are_never_evicted(tmp_path):
+    cache = MediaCache(str(tmp_path), 150)
+    first = cache.admit(_video(tmp_path, "a.mp4"))
+    cache.admit(_video(tmp_path, "b.mp4"))
+    assert os.path.exists(first)
+
+    cache.set_blob_name(first, "refs/a.mp4")
+    cache.admit(_video(tmp_path, "c.mp4"))
+    assert not os.path.exists(first)
+    assert cache.total_bytes() == 200
+
+
+def test_pinned_admission_is_kept_until_released(tmp_path):
+    cache = MediaCache(str(tmp_path), 150)
+    pinned = cache.admit(_video(tmp_path, "a.mp4"), blob_name="refs/a.mp4", pin=True)
+    cache.admit(_video(tmp_path, "b.mp4"), blob_name="refs/b.mp4")
+    cache.admit(_video(tmp_path, "c.mp4"), blob_name="refs/c.mp4")
+    assert os.path.exists(pinned)
+
+    cache.unpin(pinned)
+    assert not os.path.exists(pinned)
+
+
+def test_admitting_a_file_outside_the_directory_links_it_in(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), 1000)
+    outside = _video(tmp_path / "elsewhere", "clip.mp4")
+    cached_path = cache.admit(outside)
+    assert cached_path == str(tmp_path / "cache" / "clip.mp4")
+    assert os.path.getsize(cached_path) == 100 and os.path.exists(outside)
+
+
+def test_index_survives_a_restart(tmp_path):
+    cache = MediaCache(str(tmp_path), 1000)
+    path = cache.admit(_video(tmp_path, "a.mp4"), blob_name="refs/a.mp4")
+    cache.flush()
+    os.remove(path)
+
+    reopened = MediaCache(str(tmp_path), 1000)
+    assert reopened._entries["a.mp4"]["blob_name"] == "refs/a.mp4"
+
+
+def test_discard_deletes_unpinned_files_only(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), 1000)
+    pinned = cache.admit(_video(tmp_path / "cache", "a.mp4"), pin=True)
+    loose = cache.admit(_video(tmp_path / "cache", "b.mp4"))
+    outside = _video(tmp_path, "b.mp4")
+
+    assert not cache.discard(pinned) and os.path.exists(pinned)
+    assert not cache.discard(outside) and os.path.exists(outside)
+    assert cache.discard(loose) and not os.path.exists(loose)
+    assert "b.mp4" not in cache._entries and cache.total_bytes() == 100
@@ -0,0 +1,92 @@
+# tests/test_metrics.py
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils import metrics
+from utils.metrics import MetricsRegistry, span, start_metrics_server
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry(buckets=(0.1, 1))
+    monkeypatch.setattr(metrics, "registry", registry)
+    return registry
+
+
+def test_span_times_blocks_and_counts_errors(registry):
+    with span("stage", step="a"):
+        pass
+    with pytest.raises(ValueError):
+        with span("stage", step="a"):
+            raise ValueError("boom")
+
+    snapshot = registry.snapshot()
+    assert snapshot["histograms"]["stage_seconds"][0]["labels"] == {"step": "a"}
+    assert snapshot["histograms"]["stage_seconds"][0]["count"] == 2
+    assert snapshot["counters"]["stage_errors_total"] == [{"labels": {"step": "a"}, "value": 1}]
+
+
+def test_span_decorates_functions(registry):
+    @span("task", kind="decorated")
+    def task(fail):
+        if fail:
+            raise RuntimeError("failed")
+        return "done"
+
+    assert task(False) == "done"
+    assert task.__name__ == "task"
+    with pytest.raises(RuntimeError):
+        task(True)
+
+    snapshot = registry.snapshot()
+    assert snapshot["histograms"]["task_seconds"][0]["count"] == 2
+    assert snapshot["counters"]["task_errors_total"] == [{"labels": {"kind": "decorated"}, "value": 1}]
+
+
+def test_prometheus_rendering(registry):
+    registry.incr("requests_total", 2, path='/a"b')
+    registry.observe("latency_seconds", 0.05, stage="poll")
+    registry.observe("latency_seconds", 5, stage="poll")
+
+    assert registry.render_prometheus().splitlines() == [
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b"} 2',
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="poll",le="0.1"} 1',
+        'latency_seconds_bucket{stage="poll",le="1"} 1',
+        'latency_seconds_bucket{stage="poll",le="+Inf"} 2',
+        'latency_seconds_sum{stage="poll"} 5.05',
+        'latency_seconds_count{stage="poll"} 2',
+    ]
+
+
+def test_json_snapshot_quantiles(registry):
+    for seconds in (0.05, 0.05, 0.5, 5):
+        registry.observe("latency_seconds", seconds)
+
+    histogram = registry.snapshot()["histograms"]["latency_seconds"][0]
+    assert histogram["count"] == 4 and histogram["mean"] == 1.4
+    # Quantiles are bucket upper bounds; None falls in the +Inf bucket.
+    assert (histogram["p50"], histogram["p95"], histogram["p99"]) == (0.1, None, None)
+
+
+def test_metrics_endpoints(registry):
+    registry.incr("requests_total")
+    server = start_metrics_server(0, host="127.0.0.1")
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "requests_total 1" in response.read().decode()
+        with urllib.request.urlopen(f"{base}/metrics.json?pretty=0") as response:
+            assert response.headers["Content-Type"] == "application/json"
+            assert json.load(response)["counters"]["requests_total"][0]["value"] == 1
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/other")
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
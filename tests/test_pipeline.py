@@ -0,0 +1,67 @@
+# tests/test_pipeline.py
+import os
+import threading
+
+from utils.pipeline import StagePipeline
+
+
+def test_submit_times_out_when_the_pipeline_is_saturated():
+    release = threading.Event()
+    pipeline = StagePipeline([("slow", lambda item: release.wait(5))], workers_per_stage=1, queue_size=1)
+    assert pipeline.submit({"n": 1})  # Taken by the worker
+    assert pipeline.submit({"n": 2}, timeout=1)  # Waits in the queue
+    assert not pipeline.submit({"n": 3}, timeout=0.05)
+    release.set()
+    pipeline.join()
+
+
+def test_stage_errors_are_recorded_and_the_item_continues():
+    completed = []
+
+    def fail(item):
+        raise RuntimeError("upload failed")
+
+    pipeline = StagePipeline([("upload", fail), ("thumbnail", lambda item: item.update(thumbnail=True))],
+                             on_complete=completed.append)
+    pipeline.submit({"n": 1})
+    pipeline.join()
+    assert completed == [{"n": 1, "errors": {"upload": "upload failed"}, "thumbnail": True}]
+
+
+def _video(agent, name):
+    path = os.path.join(agent.output_dir, name)
+    with open(path, "wb") as f:
+        f.write(b"fake mp4")
+    return path
+
+
+def test_failed_publish_is_reported_and_unpins_the_video(make_generator_agent):
+    agent = make_generator_agent()
+    agent.upload_video_to_gcs = lambda video_path, blob_name: {"status": "error", "message": "bucket unavailable"}
+    video_path = _video(agent, "clip.mp4")
+
+    assert agent.publish_video(video_path, "generated_videos/clip.mp4", thumbnail=False)["status"] == "queued"
+    agent.publisher.join()
+    status = agent.get_publish_status(video_path)
+    assert status["status"] == "error" and status["errors"] == {"upload": "bucket unavailable"}
+    assert agent.media_cache._pins == {}
+
+
+def test_publish_video_reports_a_saturated_publisher(make_generator_agent):
+    agent = make_generator_agent(POST_PROCESSING_WORKERS=1, POST_PROCESSING_QUEUE_SIZE=1)
+    release = threading.Event()
+
+    def upload(video_path, blob_name):
+        release.wait(5)
+        return {"status": "success", "gcs_uri": f"gs://test-bucket/{blob_name}"}
+
+    agent.upload_video_to_gcs = upload
+    paths = [_video(agent, f"clip{i}.mp4") for i in range(3)]
+    assert agent.publish_video(paths[0], "a", thumbnail=False)["status"] == "queued"
+    assert agent.publish_video(paths[1], "b", thumbnail=False)["status"] == "queued"
+    assert agent.publish_video(paths[2], "c", thumbnail=False, timeout=0.05)["status"] == "error"
+    assert agent.get_publish_status(paths[2])["status"] == "error"
+    release.set()
+    agent.publisher.join()
+    assert agent.get_publish_status(paths[0])["status"] == "success"
+    assert agent.media_cache._pins == {}
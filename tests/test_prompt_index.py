@@ -0,0 +1,66 @@
+# tests/test_prompt_index.py
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.prompt_index import PromptIndex, new_saved_prompt_blob_name
+
+
+@pytest.fixture
+def bucket(fake_gcs):
+    return f"prompts-{uuid.uuid4().hex[:8]}"
+
+
+def _save(server, bucket, name, prompt):
+    server.state.put(bucket, name, json.dumps({"prompt": prompt}).encode(), "application/json")
+
+
+def test_sync_picks_up_prompt_named_before_the_high_water_mark(fake_gcs, bucket, tmp_path):
+    index = PromptIndex(bucket, str(tmp_path / "index.jsonl"), overlap_seconds=3600)
+    _save(fake_gcs, bucket, "saved_prompts/prompt_20250101_120000_000000_aaaaaaaa.json", "later name")
+    assert index.sync() == 1
+
+    # Finished uploading after the later-named prompt was synced, e.g. a slow upload or a
+    # replica whose clock runs behind.
+    _save(fake_gcs, bucket, "saved_prompts/prompt_20250101_113000_000000_bbbbbbbb.json", "earlier name")
+    assert index.sync() == 1
+    assert index.prompts() == ["earlier name", "later name"]
+
+    assert index.sync() == 0
+
+
+def test_sync_resumes_from_the_local_cache(fake_gcs, bucket, tmp_path):
+    cache_path = str(tmp_path / "index.jsonl")
+    _save(fake_gcs, bucket, "saved_prompts/prompt_20250101_120000_000000_aaaaaaaa.json", "first")
+    PromptIndex(bucket, cache_path).sync()
+
+    _save(fake_gcs, bucket, "saved_prompts/prompt_20250101_115959_000000_bbbbbbbb.json", "second")
+    reopened = PromptIndex(bucket, cache_path)
+    assert len(reopened) == 1
+    assert reopened.sync() == 1
+    assert sorted(reopened.prompts()) == ["first", "second"]
+
+
+def test_fresh_client_reads_compacted_segments_and_late_prompts(fake_gcs, bucket, tmp_path):
+    writer = PromptIndex(bucket, str(tmp_path / "writer.jsonl"), compact_threshold=2)
+    _save(fake_gcs, bucket, "saved_prompts/prompt_20250101_120000_000000_aaaaaaaa.json", "eagle over mountains")
+    _save(fake_gcs, bucket, "saved_prompts/prompt_20250101_120100_000000_bbbbbbbb.json", "city at night")
+    writer.sync()
+    _save(fake_gcs, bucket, "saved_prompts/prompt_20250101_115900_000000_cccccccc.json", "late river")
+    writer.sync()
+    writer.compact()
+
+    reader = PromptIndex(bucket, str(tmp_path / "reader.jsonl"))
+    assert reader.sync() == 3
+    assert reader.search("eag moun")["prompts"] == ["eagle over mountains"]
+    assert reader.search("")["total"] == 3
+
+
+def test_new_blob_names_use_utc_timestamps():
+    before = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    blob_name, saved_at = new_saved_prompt_blob_name()
+    after = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    assert blob_name.startswith(f"saved_prompts/prompt_{saved_at}_")
+    assert before <= saved_at <= after
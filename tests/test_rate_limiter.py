@@ -0,0 +1,128 @@
+# tests/test_rate_limiter.py
+import asyncio
+import time
+
+import pytest
+
+from utils.rate_limiter import TokenBucket, VeoScheduler, is_quota_error
+
+
+@pytest.fixture
+def fake_genai():
+    pytest.importorskip("google.genai")
+    from benchmarks import fake_genai
+    return fake_genai
+
+
+def _client(fake_genai, quota_error_rate=0.0):
+    return fake_genai.FakeGenaiClient(generation_seconds=0, submit_latency=0, poll_latency=0, download_latency=0,
+                                      quota_error_rate=quota_error_rate, video_bytes=b"fake mp4")
+
+
+async def _generate(client):
+    return await client.aio.models.generate_videos(model="veo", prompt="a cat")
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate_per_minute=600, burst=2)
+    bucket.take()
+    bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.1, abs=0.01)
+    time.sleep(0.1)
+    assert bucket.wait_time() == 0
+
+
+def test_calls_are_paced_by_the_key_rate():
+    order = []
+
+    async def main():
+        scheduler = VeoScheduler({"key": object()}, requests_per_minute=600, burst=2)
+        started = time.monotonic()
+
+        async def call(client):
+            order.append(time.monotonic() - started)
+
+        await asyncio.gather(*(scheduler.run(call) for _ in range(4)))
+
+    asyncio.run(main())
+    assert order[1] < 0.05
+    assert order[2] == pytest.approx(0.1, abs=0.05) and order[3] == pytest.approx(0.2, abs=0.05)
+
+
+def _run_in_order(requests, **scheduler_args):
+    """Submits (label, priority, tenant) requests together and returns the labels in execution order."""
+    order = []
+
+    async def main():
+        scheduler = VeoScheduler({"key": object()}, requests_per_minute=6000, burst=1, **scheduler_args)
+
+        def call_for(label):
+            async def call(client):
+                order.append(label)
+            return call
+
+        await asyncio.gather(*(scheduler.run(call_for(label), priority=priority, tenant=tenant)
+                               for label, priority, tenant in requests))
+
+    asyncio.run(main())
+    return order
+
+
+def test_lower_priority_values_run_first():
+    assert _run_in_order([("batch", 2, None), ("interactive", 0, None), ("normal", 1, None)]) == \
+        ["interactive", "normal", "batch"]
+
+
+def test_tenants_share_quota_fairly():
+    requests = [(f"a{i}", 0, "a") for i in range(4)] + [(f"b{i}", 0, "b") for i in range(2)]
+    assert _run_in_order(requests) == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_quota_errors_cool_the_key_down_and_retry(fake_genai):
+    client = _client(fake_genai)
+    attempts = []
+
+    async def flaky(client):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise fake_genai.errors.ClientError(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}})
+        return await _generate(client)
+
+    async def main():
+        scheduler = VeoScheduler({"key": client}, requests_per_minute=6000, base_cooldown=0.1)
+        return await scheduler.run(flaky), scheduler
+
+    (operation, key_id), scheduler = asyncio.run(main())
+    assert key_id == "key" and operation.name
+    assert attempts[1] - attempts[0] >= 0.07  # The jittered cooldown, at least 80% of base
+    assert scheduler._keys["key"].strikes == 0
+
+
+def test_calls_fail_after_max_retries(fake_genai):
+    client = _client(fake_genai, quota_error_rate=1.0)
+
+    async def main():
+        scheduler = VeoScheduler({"key": client}, requests_per_minute=6000, max_retries=2, base_cooldown=0.01)
+        return await scheduler.run(_generate)
+
+    with pytest.raises(Exception) as error:
+        asyncio.run(main())
+    assert is_quota_error(error.value)
+    assert client.calls["generate_videos"] == 3
+
+
+def test_exhausted_keys_fail_over_to_another_key(fake_genai):
+    exhausted, healthy = _client(fake_genai, quota_error_rate=1.0), _client(fake_genai)
+
+    async def main():
+        scheduler = VeoScheduler({"exhausted": exhausted, "healthy": healthy}, requests_per_minute=6000,
+                                 base_cooldown=60)
+        results = await asyncio.gather(*(scheduler.run(_generate) for _ in range(3)))
+        calls_before = exhausted.calls["generate_videos"]
+        # The exhausted key is cooling down, so later calls go straight to the healthy one.
+        results.append(await scheduler.run(_generate))
+        return results, calls_before
+
+    results, calls_before = asyncio.run(main())
+    assert [key_id for _, key_id in results] == ["healthy"] * 4
+    assert exhausted.calls["generate_videos"] == calls_before
@@ -0,0 +1,33 @@
+# tests/test_video_generator_agent.py
+import os
+
+import pytest
+
+from agents.prompt_reader_agent import PromptReaderAgent
+from benchmarks.bench_concat import make_test_clip
+from utils.generation_cache import GenerationCache
+
+
+@pytest.fixture
+def clip_bytes(tmp_path):
+    try:
+        path = make_test_clip(str(tmp_path / "clip.mp4"), 1, "160x120", 24)
+    except Exception as e:
+        pytest.skip(f"ffmpeg is not available: {e}")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_storyboard_segments_do_not_outgrow_the_media_cache(make_generator_agent, clip_bytes, tmp_path):
+    budget = 7 * len(clip_bytes)
+    agent = make_generator_agent(gcs_bucket_name=None, video_bytes=clip_bytes, MEDIA_CACHE_MAX_BYTES=budget)
+    reader = PromptReaderAgent(agent, GenerationCache(str(tmp_path / "cache"), 10 ** 9, output_dir=agent.output_dir))
+    shots = ["a cat", "a dog", "a bird"]
+
+    # The second storyboard is served from the generation cache through cached_* links.
+    outputs = [reader.process_storyboard(shots)["video_path"] for _ in range(2)]
+
+    assert sorted(name for name in os.listdir(agent.output_dir) if name.endswith(".mp4")) == \
+        sorted(os.path.basename(path) for path in outputs)
+    assert agent.media_cache.total_bytes() <= budget
+    assert agent.media_cache._pins == {}
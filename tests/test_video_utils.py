@@ -0,0 +1,54 @@
+# tests/test_video_utils.py
+import pytest
+
+from benchmarks.bench_concat import make_test_clip
+from utils.video_utils import can_stream_copy, concatenate_videos, normalization_target, probe_video
+
+_VIDEO = {"codec": "h264", "profile": "High", "pix_fmt": "yuv420p", "width": "1280", "height": "720",
+          "fps": "24", "tbn": "12288"}
+_AUDIO = {"codec": "aac", "profile": "LC", "sample_rate": "48000", "layout": "stereo"}
+
+
+def _probe(video=_VIDEO, audio=_AUDIO, duration=1.0):
+    return {"video": video, "audio": audio, "duration": duration}
+
+
+def test_matching_inputs_can_be_stream_copied():
+    assert can_stream_copy([_probe(), _probe()])
+    assert not can_stream_copy([_probe(), _probe(video=dict(_VIDEO, width="720"))])
+
+
+def test_inputs_without_a_readable_video_stream_are_never_stream_copied():
+    assert not can_stream_copy([_probe(video=None), _probe(video=None)])
+    assert not can_stream_copy([_probe(), _probe(video=None)])
+
+
+def test_normalization_target_names_clips_without_video():
+    assert normalization_target([_probe(), _probe(video=dict(_VIDEO, fps=None))]) == \
+        {"width": 1280, "height": 720, "fps": "24"}
+    with pytest.raises(ValueError, match="clip 2"):
+        normalization_target([_probe(), _probe(video=None)])
+
+
+@pytest.fixture(scope="module")
+def clips(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("clips")
+    try:
+        return {name: make_test_clip(str(directory / f"{name}.mp4"), 1, size, 24)
+                for name, size in (("a", "320x180"), ("b", "320x180"), ("small", "160x120"))}
+    except Exception as e:
+        pytest.skip(f"ffmpeg is not available: {e}")
+
+
+def test_concatenate_stream_copies_matching_clips(clips, tmp_path):
+    output_path = concatenate_videos([clips["a"], clips["b"]], str(tmp_path / "out.mp4"))
+    assert probe_video(output_path)["duration"] == pytest.approx(2.0, abs=0.2)
+
+
+def test_concatenate_reencodes_mismatched_clips_to_the_first_clip(clips, tmp_path):
+    progress = []
+    output_path = concatenate_videos([clips["a"], clips["small"]], str(tmp_path / "out.mp4"),
+                                     progress=lambda fraction, description: progress.append(fraction))
+    video = probe_video(output_path)["video"]
+    assert (video["width"], video["height"]) == ("320", "180")
+    assert progress[-1] == 1.0 and progress == sorted(progress)
@@ -0,0 +1,248 @@
+# utils/concat_cache.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, List, Optional
+from utils.derived_assets import file_sha256
+from utils.metrics import incr, span
+from utils.video_utils import (can_stream_copy, concat_stream_copy, normalization_target, normalize_video,
+                               probe_video)
+
+
+# Probe results kept in memory, least recently used dropped first.
+_PROBES_MAX = 10000
+# Half-written files older than this were left by a crashed build; younger ones may belong to
+# another process sharing the directory.
+_STALE_PART_SECONDS = 6 * 3600
+
+
+def _key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def _link_or_copy(source_path: str, path: str):
+    try:
+        os.link(source_path, path)
+    except OSError:
+        shutil.copyfile(source_path, path)
+
+
+class ConcatCache:
+    """
+    Incremental concatenation: re-running a concatenation after appending, removing or
+    swapping a clip only redoes the work for what changed.
+
+    Clips are identified by the SHA-256 of their bytes, so re-uploading the same file under a
+    new name is a hit. Two kinds of intermediate results are kept in `cache_dir`:
+
+    - normalized segments: a clip re-encoded to a given target frame size, rate and audio
+      layout, keyed by (clip hash, target). Only clips not seen with that target are encoded.
+    - merged prefixes: every finished re-encoding concatenation, hard-linked to its output and
+      keyed by its ordered list of segments. A later concatenation starting with the same
+      segments stream-copies that file plus the remaining segments instead of all of them.
+      Stream-copy concatenations keep no prefix: copying one costs as much as copying the
+      original clips.
+
+    Files are evicted least recently used first once they exceed `max_bytes`; files in use
+    by a running concatenation are never evicted.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int, content_hash: Optional[Callable[[str], str]] = None):
+        """
+        Initializes ConcatCache.
+
+        Args:
+            cache_dir (str): Directory of normalized segments and merged prefixes.
+            max_bytes (int): Size budget of the directory.
+            content_hash (Callable): Returns the hex SHA-256 of a file; defaults to hashing it
+                every time. Pass a memoizing one (e.g. DerivedAssets.content_hash) to share work.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash or file_sha256
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # filename -> size, least recently used first
+        self._pins: Counter = Counter()
+        self._probes: "OrderedDict[str, dict]" = OrderedDict()  # clip hash -> probe_video result
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # Pick up results of earlier runs, oldest first; drop anything a crash left half-written
+        # long ago (recent parts may be in-progress builds of another process).
+        files = []
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if ".part" in filename:
+                try:
+                    if time.time() - os.path.getmtime(path) > _STALE_PART_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass  # Finished or removed by its owner meanwhile
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, filename, stat.st_size))
+        for _, filename, size in sorted(files):
+            self._entries[filename] = size
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._entries.values())
+
+    def _lookup(self, filename: str) -> Optional[str]:
+        """Returns the cached file's path and pins it, or None."""
+        path = os.path.join(self.cache_dir, filename)
+        with self._lock:
+            if filename not in self._entries or not os.path.exists(path):
+                self._entries.pop(filename, None)
+                return None
+            self._entries.move_to_end(filename)
+            self._pins[filename] += 1
+        return path
+
+    def _store(self, filename: str, build: Callable[[str], None]) -> str:
+        """Builds a file into the cache under a temporary name and pins it."""
+        path = os.path.join(self.cache_dir, filename)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part.mp4"
+        try:
+            build(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        with self._lock:
+            self._entries[filename] = os.path.getsize(path)
+            self._entries.move_to_end(filename)
+            self._pins[filename] += 1
+        return path
+
+    def _unpin(self, filenames: List[str]):
+        with self._lock:
+            for filename in filenames:
+                self._pins[filename] -= 1
+                if self._pins[filename] <= 0:
+                    del self._pins[filename]
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._entries.values())
+        for filename in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if self._pins[filename]:
+                continue
+            total -= self._entries.pop(filename)
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except OSError as e:
+                logging.warning(f"Error evicting {filename} from the concatenation cache: {e}")
+            incr("concat_cache_evictions_total")
+
+    def _probe(self, path: str, digest: str) -> dict:
+        with self._lock:
+            probe = self._probes.get(digest)
+            if probe is not None:
+                self._probes.move_to_end(digest)
+        if probe is None:
+            probe = probe_video(path)
+            with self._lock:
+                self._probes[digest] = probe
+                while len(self._probes) > _PROBES_MAX:
+                    self._probes.popitem(last=False)
+        return probe
+
+    @span("concat_cache_concatenate")
+    def concatenate(self, video_paths: List[str], output_path: str, progress=None) -> str:
+        """
+        Concatenates the videos like `utils.video_utils.concatenate_videos`, reusing cached
+        segments and the longest cached prefix. If given, `progress(fraction, description)` is
+        called as the work advances.
+
+        Returns:
+            str: `output_path`.
+        """
+        def report(fraction, description):
+            if progress is not None:
+                progress(fraction, description)
+
+        def stage(start, end, description):
+            if progress is None:
+                return None
+            return lambda fraction: progress(start + (end - start) * fraction, description)
+
+        count = len(video_paths)
+        digests, probes = [], []
+        for i, path in enumerate(video_paths):
+            report(0.1 * i / count, f"Inspecting clip {i + 1} of {count}")
+            digests.append(self.content_hash(path))
+            probes.append(self._probe(path, digests[-1]))
+        total_duration = sum(p["duration"] or 0 for p in probes)
+
+        if can_stream_copy(probes):
+            incr("video_concatenations_total", mode="stream_copy")
+            report(0.1, "Joining clips")
+            concat_stream_copy(video_paths, output_path, stage(0.1, 1.0, "Joining clips"), total_duration)
+            logging.info(f"Concatenated {count} clips with a stream copy into {output_path}")
+            report(1.0, "Done")
+            return output_path
+
+        target = normalization_target(probes)
+        mode = {"mode": "reencode", "target": target, "with_audio": any(p["audio"] for p in probes)}
+        segment_keys = [_key(digest, mode) for digest in digests]
+        incr("video_concatenations_total", mode=mode["mode"])
+
+        pinned = []
+        try:
+            # Longest already-merged prefix; a prefix of one segment is the segment itself.
+            prefix_path, prefix_length = None, 0
+            for length in range(count, 1, -1):
+                filename = f"prefix_{_key(segment_keys[:length])}.mp4"
+                prefix_path = self._lookup(filename)
+                if prefix_path:
+                    pinned.append(filename)
+                    prefix_length = length
+                    break
+            incr("concat_cache_prefix_segments_total", prefix_length)
+
+            segments = []
+            remaining_duration = sum(p["duration"] or 0 for p in probes[prefix_length:])
+            start = 0.1
+            for i in range(prefix_length, count):
+                duration = probes[i]["duration"]
+                share = (0.8 * duration / remaining_duration if remaining_duration and duration
+                         else 0.8 / (count - prefix_length))
+                filename = f"segment_{segment_keys[i]}.mp4"
+                path = self._lookup(filename)
+                incr("concat_cache_segments_total", result="hit" if path else "miss")
+                if path is None:
+                    description = f"Re-encoding clip {i + 1} of {count}"
+                    report(start, description)
+                    clip_target = dict(mode["target"], source_has_audio=probes[i]["audio"] is not None)
+                    on_progress = stage(start, start + share, description)
+                    path = self._store(filename, lambda temp_path, i=i, clip_target=clip_target, on_progress=on_progress:
+                                       normalize_video(video_paths[i], temp_path, clip_target, mode["with_audio"],
+                                                       on_progress, probes[i]["duration"]))
+                pinned.append(filename)
+                segments.append(path)
+                start += share
+
+            report(0.9, "Joining clips")
+            inputs = ([prefix_path] if prefix_path else []) + segments
+            if len(inputs) == 1:
+                _link_or_copy(inputs[0], output_path)
+            else:
+                concat_stream_copy(inputs, output_path, stage(0.9, 1.0, "Joining clips"), total_duration)
+            if prefix_length < count:
+                # A hard link: the prefix costs no extra writes or disk while the output exists.
+                filename = f"prefix_{_key(segment_keys)}.mp4"
+                self._store(filename, lambda temp_path: _link_or_copy(output_path, temp_path))
+                pinned.append(filename)
+        finally:
+            self._unpin(pinned)
+        logging.info(f"Concatenated {count} clips reusing a prefix of {prefix_length} into {output_path}")
+        report(1.0, "Done")
+        return output_path
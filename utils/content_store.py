@@ -0,0 +1,92 @@
+# utils/content_store.py
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from utils.gcs_upload import file_checksums, upload_file
+from utils.gcs_utils import get_bucket, upload_data
+from utils.metrics import incr, span
+
+CONTENT_PREFIX = "content/sha256/"
+REFS_PREFIX = "refs/"
+
+# Hashes whose content object is known to exist, so repeats skip the metadata lookup too.
+_KNOWN_OBJECTS_MAX = 10000
+_known_objects: "OrderedDict[str, int]" = OrderedDict()  # blob name -> size
+_lock = threading.Lock()
+
+
+def content_blob_name(sha256: str, extension: str = ".mp4") -> str:
+    """Returns the object name holding the bytes with the given hex SHA-256."""
+    return f"{CONTENT_PREFIX}{sha256}{extension}"
+
+
+def ref_blob_name(name: str) -> str:
+    """Returns the object name of the reference for the logical name `name`."""
+    return f"{REFS_PREFIX}{name}"
+
+
+def _remember(blob_name: str, size: int):
+    with _lock:
+        _known_objects[blob_name] = size
+        _known_objects.move_to_end(blob_name)
+        while len(_known_objects) > _KNOWN_OBJECTS_MAX:
+            _known_objects.popitem(last=False)
+
+
+def _exists(bucket_name: str, blob_name: str, size: int) -> bool:
+    with _lock:
+        if _known_objects.get(blob_name) == size:
+            return True
+    blob = get_bucket(bucket_name).get_blob(blob_name)  # Metadata only, no bytes
+    if blob is not None and blob.size == size:
+        _remember(blob_name, size)
+        return True
+    return False
+
+
+@span("content_store")
+def store_file(bucket_name: str, source_file_path: str, name: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stores a file under the SHA-256 of its bytes and points the logical `name` at it.
+
+    The bytes go to `content/sha256/<sha256><ext>` only if no object with that hash (and size)
+    exists yet; otherwise only the small JSON reference `refs/<name>` is written. Videos that
+    are generated, published or concatenated again therefore cost one metadata lookup instead
+    of a full upload. The hash is computed in the same pass as the upload checksums.
+
+    Returns:
+        Dict[str, Any]: {"status": "success", "gcs_uri", "blob_name", "ref", "sha256", "bytes",
+        "deduplicated"}. Upload errors propagate as from `upload_file`.
+    """
+    checksums = file_checksums(source_file_path, with_sha256=True)
+    digest = checksums["sha256"]
+    size = os.path.getsize(source_file_path)
+    blob_name = content_blob_name(digest, os.path.splitext(name)[1] or ".bin")
+
+    deduplicated = _exists(bucket_name, blob_name, size)
+    if deduplicated:
+        incr("content_store_uploads_total", result="deduplicated")
+        incr("content_store_bytes_saved_total", size)
+        logging.info(f"{source_file_path} already stored as {blob_name}; skipping upload.")
+    else:
+        upload_file(bucket_name, source_file_path, blob_name, content_type=content_type, checksums=checksums)
+        incr("content_store_uploads_total", result="uploaded")
+        _remember(blob_name, size)
+
+    ref = {"sha256": digest, "blob_name": blob_name, "bytes": size, "content_type": content_type,
+           "created_at": time.time()}
+    upload_data(bucket_name, json.dumps(ref), ref_blob_name(name), content_type="application/json")
+    return {"status": "success", "gcs_uri": f"gs://{bucket_name}/{blob_name}", "blob_name": blob_name,
+            "ref": ref_blob_name(name), "sha256": digest, "bytes": size, "deduplicated": deduplicated}
+
+
+def resolve(bucket_name: str, name: str) -> Optional[Dict[str, Any]]:
+    """Returns the reference stored for the logical `name` by `store_file`, or None."""
+    blob = get_bucket(bucket_name).get_blob(ref_blob_name(name))
+    if blob is None:
+        return None
+    return json.loads(blob.download_as_bytes())
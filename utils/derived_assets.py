@@ -0,0 +1,195 @@
+# utils/derived_assets.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Optional, Set, Tuple
+from utils.gcs_utils import upload_to_gcs, download_from_gcs
+from utils.metrics import incr, observe
+from utils.video_utils import extract_thumbnail, make_preview
+
+GCS_DERIVED_PREFIX = "derived_assets/"
+
+# kind -> (file extension, builder)
+ASSET_KINDS = {
+    "thumbnail": (".jpg", extract_thumbnail),
+    "preview": (".mp4", make_preview),
+}
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+# Bound on the memoized content hashes, so a long-running process does not grow without limit.
+_HASHES_MAX = 10000
+
+
+def file_sha256(path: str) -> str:
+    """Returns the hex SHA-256 of a file, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DerivedAssets:
+    """
+    Lazily built poster thumbnails and low-bitrate preview proxies of videos.
+
+    Assets are addressed by the SHA-256 of the source video, so a video that is copied,
+    renamed or generated again maps to the assets already built for it. A request is served
+    from the local directory, then from GCS, and only then built. Builds run as ffmpeg
+    processes, at most `workers` at a time, so decoding never happens on request threads or
+    in this interpreter. Concurrent requests for the same asset share one build, and new
+    builds are uploaded to GCS in the background by at most `workers` upload threads.
+    """
+    def __init__(self, cache_dir: str, gcs_bucket_name: Optional[str] = None, workers: int = 2,
+                 preview_height: int = 360, preview_bitrate: str = "400k"):
+        """
+        Initializes DerivedAssets.
+
+        Args:
+            cache_dir (str): Local directory of built assets.
+            gcs_bucket_name (str): Bucket sharing assets across replicas, or None.
+            workers (int): Maximum number of assets fetched or built at the same time.
+            preview_height (int): Frame height of preview proxies.
+            preview_bitrate (str): Video bitrate of preview proxies, in ffmpeg syntax.
+        """
+        self.cache_dir = cache_dir
+        self.gcs_bucket_name = gcs_bucket_name
+        self.workers = workers
+        self.options = {"preview": {"height": preview_height, "video_bitrate": preview_bitrate}}
+        self._lock = threading.Lock()
+        self._hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()  # (path, size, mtime_ns) -> sha256
+        self._last_hash: "OrderedDict[str, str]" = OrderedDict()  # path -> sha256 when it was last hashed
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="derived-assets")
+        self._uploader = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="derived-assets-upload") \
+            if gcs_bucket_name else None
+        self._uploads: Set[Future] = set()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def content_hash(self, video_path: str) -> str:
+        """Returns the SHA-256 of the video, memoized until the file changes."""
+        stat = os.stat(video_path)
+        memo_key = (os.path.realpath(video_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(memo_key)
+            if digest is not None:
+                self._hashes.move_to_end(memo_key)
+        if digest is None:
+            digest = file_sha256(video_path)
+            with self._lock:
+                self._hashes[memo_key] = digest
+                self._last_hash[memo_key[0]] = digest
+                self._last_hash.move_to_end(memo_key[0])
+                while len(self._hashes) > _HASHES_MAX:
+                    self._hashes.popitem(last=False)
+                while len(self._last_hash) > _HASHES_MAX:
+                    self._last_hash.popitem(last=False)
+        return digest
+
+    def cached(self, video_path: str, kind: str) -> Optional[str]:
+        """
+        Returns the local `kind` asset of a previously seen video without reading the video,
+        which may since have been evicted, or None.
+        """
+        with self._lock:
+            digest = self._last_hash.get(os.path.realpath(video_path))
+        path = self.path_for(digest, kind) if digest else None
+        return path if path and os.path.exists(path) else None
+
+    def path_for(self, digest: str, kind: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}_{kind}{ASSET_KINDS[kind][0]}")
+
+    def thumbnail(self, video_path: str, timeout: Optional[float] = None) -> str:
+        """Returns the local path of the video's poster thumbnail, building it if needed."""
+        return self.request(video_path, "thumbnail").result(timeout)
+
+    def preview(self, video_path: str, timeout: Optional[float] = None) -> str:
+        """Returns the local path of the video's preview proxy, building it if needed."""
+        return self.request(video_path, "preview").result(timeout)
+
+    def request(self, video_path: str, kind: str) -> Future:
+        """
+        Returns a Future of the local path of the `kind` asset of `video_path`, without
+        blocking on a build. The future fails with the build's exception if ffmpeg fails.
+        """
+        if kind not in ASSET_KINDS:
+            raise ValueError(f"Unknown derived asset kind: {kind}")
+        digest = self.content_hash(video_path)
+        path = self.path_for(digest, kind)
+        if os.path.exists(path):
+            incr("derived_asset_requests_total", kind=kind, result="local")
+            future = Future()
+            future.set_result(path)
+            return future
+
+        with self._lock:
+            future = self._in_flight.get((digest, kind))
+            if future is not None:
+                incr("derived_asset_requests_total", kind=kind, result="joined")
+                return future
+            future = self._in_flight[(digest, kind)] = self._pool.submit(self._fill, video_path, digest, kind)
+        future.add_done_callback(lambda _: self._finished(digest, kind))
+        return future
+
+    def _finished(self, digest: str, kind: str):
+        with self._lock:
+            self._in_flight.pop((digest, kind), None)
+
+    def _fill(self, video_path: str, digest: str, kind: str) -> str:
+        path = self.path_for(digest, kind)
+        blob_name = f"{GCS_DERIVED_PREFIX}{digest}/{kind}{ASSET_KINDS[kind][0]}"
+        if self._fetch_from_gcs(blob_name, path):
+            incr("derived_asset_requests_total", kind=kind, result="gcs")
+            return path
+        incr("derived_asset_requests_total", kind=kind, result="built")
+        # Build under a temporary name so a failed build never leaves a partial asset behind.
+        temp_path = f"{os.path.splitext(path)[0]}.{threading.get_ident()}.part{ASSET_KINDS[kind][0]}"
+        start = time.perf_counter()
+        try:
+            ASSET_KINDS[kind][1](video_path, temp_path, **self.options.get(kind, {}))
+            os.replace(temp_path, path)
+        except Exception as e:
+            logging.error(f"Error building {kind} of {video_path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        observe("derived_asset_build_seconds", time.perf_counter() - start, kind=kind)
+        if self._uploader is not None:
+            upload = self._uploader.submit(self._upload, path, blob_name)
+            with self._lock:
+                self._uploads.add(upload)
+            upload.add_done_callback(self._upload_finished)
+        return path
+
+    def _upload_finished(self, upload: Future):
+        with self._lock:
+            self._uploads.discard(upload)
+
+    def flush_uploads(self):
+        """Blocks until every background GCS upload started so far has finished."""
+        with self._lock:
+            uploads = list(self._uploads)
+        wait(uploads)
+
+    def _fetch_from_gcs(self, blob_name: str, path: str) -> bool:
+        if not self.gcs_bucket_name:
+            return False
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            download_from_gcs(self.gcs_bucket_name, blob_name, temp_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        os.replace(temp_path, path)
+        return True
+
+    def _upload(self, path: str, blob_name: str):
+        try:
+            upload_to_gcs(self.gcs_bucket_name, path, blob_name)
+        except Exception as e:
+            logging.warning(f"Error uploading derived asset {blob_name} to GCS: {e}")
@@ -0,0 +1,339 @@
+# utils/gcs_upload.py
+import base64
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import google_crc32c
+
+from config import (GCS_UPLOAD_THRESHOLD_BYTES, GCS_UPLOAD_CHUNK_BYTES, GCS_UPLOAD_WORKERS, GCS_UPLOAD_STRATEGY,
+                    GCS_UPLOAD_MAX_RETRIES)
+from utils.gcs_utils import get_bucket, get_storage_client
+from utils.metrics import incr, observe
+
+# Resumable chunks and composite parts must be multiples of this (except the last one).
+CHUNK_ALIGNMENT = 256 * 1024
+# GCS composes at most this many source objects per request.
+MAX_COMPOSE_SOURCES = 32
+# Parts are composed in at most two levels, which bounds the number of parts.
+MAX_PARTS = MAX_COMPOSE_SOURCES * MAX_COMPOSE_SOURCES
+TEMP_PARTS_PREFIX = "tmp_upload_parts/"
+
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_stats_lock = threading.Lock()
+_stats = {"uploads": 0, "failures": 0, "bytes": 0, "seconds": 0.0, "retries": 0}
+
+
+class UploadError(Exception):
+    """Raised when an upload fails permanently or its checksum does not match."""
+
+
+def get_upload_stats() -> Dict[str, Any]:
+    """Returns cumulative upload counters for this process, including the average throughput."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["throughput_mib_s"] = round(stats["bytes"] / stats["seconds"] / 1024 ** 2, 2) if stats["seconds"] else 0.0
+    return stats
+
+
+def tune_chunk_size(size: int, workers: int = GCS_UPLOAD_WORKERS, min_chunk: int = GCS_UPLOAD_CHUNK_BYTES,
+                    max_parts: int = MAX_PARTS) -> int:
+    """
+    Picks a chunk size for a file of `size` bytes.
+
+    Aims for about two chunks per worker so a slow part does not leave the others idle,
+    never goes below `min_chunk` (per-request overhead dominates small chunks) and keeps the
+    number of parts within `max_parts`. The result is rounded up to a multiple of 256 KiB.
+    """
+    chunk = max(min_chunk, math.ceil(size / max(1, 2 * workers)), math.ceil(size / max_parts))
+    return max(CHUNK_ALIGNMENT, math.ceil(chunk / CHUNK_ALIGNMENT) * CHUNK_ALIGNMENT)
+
+
+def _b64_crc32c(data: bytes) -> str:
+    return base64.b64encode(google_crc32c.Checksum(data).digest()).decode()
+
+
+def file_checksums(path: str, with_sha256: bool = False, block_size: int = 8 * 1024 * 1024) -> Dict[str, str]:
+    """
+    Returns the base64 CRC32C and MD5 of a file (and its hex SHA-256 if `with_sha256`),
+    computed in one streaming pass. Can be passed to `upload_file` as `checksums`.
+    """
+    crc = google_crc32c.Checksum()
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256() if with_sha256 else None
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            crc.update(block)
+            md5.update(block)
+            if sha256 is not None:
+                sha256.update(block)
+    checksums = {"crc32c": base64.b64encode(crc.digest()).decode(), "md5": base64.b64encode(md5.digest()).decode()}
+    if sha256 is not None:
+        checksums["sha256"] = sha256.hexdigest()
+    return checksums
+
+
+def _read_range(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _backoff(attempt: int) -> float:
+    return min(30.0, 0.5 * (2 ** attempt)) * random.uniform(0.8, 1.2)
+
+
+def _is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    if code is None:
+        # Connection resets, timeouts and other transport errors
+        return not isinstance(error, UploadError)
+    return code in _RETRYABLE_STATUS
+
+
+class _Upload:
+    """State of one `upload_file` call, shared by its part workers."""
+    def __init__(self, bucket_name: str, path: str, blob_name: str, content_type: Optional[str], max_retries: int,
+                 checksums: Optional[Dict[str, str]] = None):
+        self.bucket = get_bucket(bucket_name)
+        self.bucket_name = bucket_name
+        self.path = path
+        self.blob_name = blob_name
+        self.content_type = content_type
+        self.max_retries = max_retries
+        self.checksums = checksums
+        self.size = os.path.getsize(path)
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def with_retries(self, description: str, function):
+        attempt = 0
+        while True:
+            try:
+                return function()
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _backoff(attempt)
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                logging.warning(f"Upload of {description} failed ({e}); retrying in {delay:.1f}s "
+                                f"(attempt {attempt} of {self.max_retries}).")
+                time.sleep(delay)
+
+    # -- single request -------------------------------------------------------------
+
+    def single(self) -> Dict[str, Any]:
+        checksums = self.checksums or file_checksums(self.path)
+        blob = self.bucket.blob(self.blob_name)
+        self.with_retries(self.blob_name, lambda: blob.upload_from_filename(
+            self.path, content_type=self.content_type, checksum=None, retry=None))
+        if blob.md5_hash and blob.md5_hash != checksums["md5"]:
+            raise UploadError(f"MD5 mismatch for gs://{self.bucket_name}/{self.blob_name}")
+        return {"parts": 1, "crc32c": checksums["crc32c"], "md5": checksums["md5"]}
+
+    # -- parallel composite ---------------------------------------------------------
+
+    def _upload_part(self, part_name: str, offset: int, length: int):
+        def attempt():
+            data = _read_range(self.path, offset, length)
+            expected = _b64_crc32c(data)
+            blob = self.bucket.blob(part_name)
+            blob.upload_from_string(data, content_type="application/octet-stream", checksum=None, retry=None)
+            if blob.crc32c and blob.crc32c != expected:
+                # A corrupted part is retried like a transport error.
+                raise IOError(f"CRC32C mismatch on part {part_name}")
+            return blob
+        return self.with_retries(part_name, attempt)
+
+    def _compose(self, destination: str, sources: List, content_type: Optional[str] = None):
+        blob = self.bucket.blob(destination)
+        if content_type:
+            blob.content_type = content_type
+        self.with_retries(destination, lambda: blob.compose(sources, retry=None))
+        return blob
+
+    def composite(self, workers: int, chunk_size: int) -> Dict[str, Any]:
+        part_prefix = f"{TEMP_PARTS_PREFIX}{uuid.uuid4().hex}/"
+        offsets = list(range(0, self.size, chunk_size))
+        created = []
+        try:
+            with ThreadPoolExecutor(max_workers=min(workers, len(offsets)) + 1) as executor:
+                checksums = executor.submit(lambda: self.checksums or file_checksums(self.path))
+                futures = [executor.submit(self._upload_part, f"{part_prefix}{i:05d}", offset,
+                                           min(chunk_size, self.size - offset))
+                           for i, offset in enumerate(offsets)]
+                wait(futures, return_when=FIRST_EXCEPTION)
+                for future in futures:
+                    future.cancel()
+            # Every part has finished or been cancelled here, so none can be orphaned.
+            created.extend(future.result() for future in futures if not future.cancelled() and future.exception() is None)
+            parts = [future.result() for future in futures]
+            checksums = checksums.result()
+
+            if len(parts) > MAX_COMPOSE_SOURCES:
+                groups = [parts[i:i + MAX_COMPOSE_SOURCES] for i in range(0, len(parts), MAX_COMPOSE_SOURCES)]
+                parts = []
+                for i, group in enumerate(groups):
+                    intermediate = self._compose(f"{part_prefix}group-{i:03d}", group)
+                    created.append(intermediate)
+                    parts.append(intermediate)
+            final = self._compose(self.blob_name, parts, self.content_type or "video/mp4")
+        finally:
+            for blob in created:
+                try:
+                    blob.delete()
+                except Exception as e:
+                    logging.warning(f"Could not delete temporary upload part {blob.name}: {e}")
+
+        # Composite objects have no MD5; the CRC32C of the whole object is checked instead.
+        if final.crc32c and final.crc32c != checksums["crc32c"]:
+            raise UploadError(f"CRC32C mismatch for composed gs://{self.bucket_name}/{self.blob_name}")
+        return {"parts": len(offsets), "crc32c": checksums["crc32c"], "md5": None}
+
+    # -- resumable session ----------------------------------------------------------
+
+    def _session_offset(self, transport, session_url: str) -> Optional[int]:
+        """Asks the server how many bytes it has; returns None if the upload already completed."""
+        response = transport.put(session_url, data=b"", headers={"Content-Range": f"bytes */{self.size}"})
+        if response.status_code in (200, 201):
+            return None
+        if response.status_code != 308:
+            error = UploadError(f"Resumable session status query failed with HTTP {response.status_code}")
+            error.code = response.status_code
+            raise error
+        range_header = response.headers.get("Range")
+        return int(range_header.rsplit("-", 1)[1]) + 1 if range_header else 0
+
+    def resumable(self, chunk_size: int) -> Dict[str, Any]:
+        blob = self.bucket.blob(self.blob_name)
+        session_url = self.with_retries(self.blob_name, lambda: blob.create_resumable_upload_session(
+            content_type=self.content_type or "video/mp4", size=self.size, checksum=None, retry=None))
+        transport = get_storage_client()._http
+        crc = google_crc32c.Checksum()
+        md5 = hashlib.md5()
+        hashed = 0  # bytes fed to the running checksums, which only move forward
+        offset = 0
+        resource = None
+        failures = 0
+        with open(self.path, "rb") as f:
+            while resource is None:
+                f.seek(offset)
+                data = f.read(chunk_size)
+                if offset + len(data) > hashed:
+                    new = data[hashed - offset:]
+                    crc.update(new)
+                    md5.update(new)
+                    hashed += len(new)
+                end = offset + len(data) - 1
+                try:
+                    response = transport.put(session_url, data=data, headers={
+                        "Content-Range": f"bytes {offset}-{end}/{self.size}" if data else f"bytes */{self.size}"})
+                    if response.status_code in (200, 201):
+                        resource = response.json()
+                    elif response.status_code == 308:
+                        range_header = response.headers.get("Range")
+                        offset = int(range_header.rsplit("-", 1)[1]) + 1 if range_header else 0
+                        failures = 0
+                    elif response.status_code in _RETRYABLE_STATUS:
+                        raise IOError(f"HTTP {response.status_code} on bytes {offset}-{end}")
+                    else:
+                        raise UploadError(f"Resumable upload failed with HTTP {response.status_code}: {response.text[:200]}")
+                except Exception as e:
+                    if not _is_retryable(e) or failures >= self.max_retries:
+                        raise
+                    failures += 1
+                    with self._lock:
+                        self.retries += 1
+                    delay = _backoff(failures - 1)
+                    logging.warning(f"Chunk {offset}-{end} of {self.blob_name} failed ({e}); resuming in {delay:.1f}s.")
+                    time.sleep(delay)
+                    # Resume from whatever the server actually persisted.
+                    offset = self.with_retries(self.blob_name, lambda: self._session_offset(transport, session_url))
+                    if offset is None:
+                        resource = blob.bucket.get_blob(self.blob_name)._properties
+        checksums = {"crc32c": base64.b64encode(crc.digest()).decode(), "md5": base64.b64encode(md5.digest()).decode()}
+        if resource.get("md5Hash") and resource["md5Hash"] != checksums["md5"]:
+            raise UploadError(f"MD5 mismatch for gs://{self.bucket_name}/{self.blob_name}")
+        if resource.get("crc32c") and resource["crc32c"] != checksums["crc32c"]:
+            raise UploadError(f"CRC32C mismatch for gs://{self.bucket_name}/{self.blob_name}")
+        return {"parts": math.ceil(self.size / chunk_size) if self.size else 1, **checksums}
+
+
+def upload_file(bucket_name: str, source_file_path: str, destination_blob_name: str, content_type: Optional[str] = None,
+                strategy: str = GCS_UPLOAD_STRATEGY, threshold: int = GCS_UPLOAD_THRESHOLD_BYTES,
+                workers: int = GCS_UPLOAD_WORKERS, chunk_size: Optional[int] = None,
+                max_retries: int = GCS_UPLOAD_MAX_RETRIES, checksums: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Uploads a file to GCS, choosing the transfer method by size.
+
+    Files below `threshold` are sent in a single request. Larger files are either split into
+    parts uploaded in parallel and composed into the destination (`strategy="composite"`), or
+    sent as a chunked resumable session (`strategy="resumable"`) that resumes from the last byte
+    the server acknowledged after a failure. Failed requests are retried individually with
+    jittered backoff, and the stored object is checked against locally computed checksums
+    (MD5 and CRC32C, or CRC32C only for composed objects, which have no MD5). Pass `checksums`
+    from `file_checksums` if they are already known, to save reading the file again.
+
+    Returns:
+        Dict[str, Any]: {"status": "success", "gcs_uri", "strategy", "bytes", "parts", "retries",
+            "elapsed_s", "throughput_mib_s", "crc32c", "md5"}
+
+    Raises:
+        UploadError: If the upload fails after retries or the checksums do not match.
+    """
+    started_at = time.monotonic()
+    upload = _Upload(bucket_name, source_file_path, destination_blob_name, content_type, max_retries, checksums)
+    if upload.size < threshold:
+        strategy = "single"
+    elif strategy not in ("composite", "resumable"):
+        raise ValueError(f"Unknown upload strategy: {strategy}")
+    chunk_size = chunk_size or tune_chunk_size(upload.size, workers)
+    try:
+        if strategy == "single":
+            details = upload.single()
+        elif strategy == "composite":
+            details = upload.composite(workers, chunk_size)
+        else:
+            details = upload.resumable(chunk_size)
+    except Exception as e:
+        with _stats_lock:
+            _stats["failures"] += 1
+            _stats["retries"] += upload.retries
+        incr("gcs_upload_file_errors_total", strategy=strategy)
+        incr("gcs_upload_retries_total", upload.retries, strategy=strategy)
+        if isinstance(e, UploadError):
+            raise
+        raise UploadError(f"Upload of {source_file_path} to gs://{bucket_name}/{destination_blob_name} failed: {e}") from e
+
+    elapsed = time.monotonic() - started_at
+    with _stats_lock:
+        _stats["uploads"] += 1
+        _stats["bytes"] += upload.size
+        _stats["seconds"] += elapsed
+        _stats["retries"] += upload.retries
+    observe("gcs_upload_file_seconds", elapsed, strategy=strategy)
+    incr("gcs_upload_bytes_total", upload.size, strategy=strategy)
+    incr("gcs_upload_retries_total", upload.retries, strategy=strategy)
+    result = {
+        "status": "success",
+        "gcs_uri": f"gs://{bucket_name}/{destination_blob_name}",
+        "strategy": strategy,
+        "bytes": upload.size,
+        "retries": upload.retries,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_mib_s": round(upload.size / elapsed / 1024 ** 2, 2) if elapsed else 0.0,
+        **details,
+    }
+    logging.info(f"Uploaded {source_file_path} to {result['gcs_uri']} ({strategy}, {result['parts']} parts, "
+                 f"{result['throughput_mib_s']} MiB/s, {upload.retries} retries)")
+    return result
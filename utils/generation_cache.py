@@ -0,0 +1,253 @@
+# utils/generation_cache.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List, Optional
+from utils.gcs_utils import upload_to_gcs, download_from_gcs
+from utils.metrics import incr
+from utils.pipeline import StagePipeline
+
+GCS_CACHE_PREFIX = "generated_videos/cache/"
+
+
+def cache_key(model: str, prompt: str, aspect_ratio: str, allow_people: str, number_of_videos: int = 1) -> str:
+    """
+    Returns the content address of a generation request.
+
+    The prompt is normalized (surrounding whitespace stripped, inner whitespace collapsed,
+    case folded) so trivially different resubmissions of the same prompt share a key.
+    """
+    normalized_prompt = " ".join(prompt.split()).casefold()
+    fields = [model, normalized_prompt, aspect_ratio, allow_people]
+    if number_of_videos != 1:
+        # Single-video requests keep the keys they had before variants were supported.
+        fields.append(number_of_videos)
+    payload = json.dumps(fields, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Content-addressed cache of generated videos, keyed by `cache_key`. A request for several
+    variants stores each one under `<key>_<index>` and is a hit only if all of them are cached.
+
+    Lookups go through a size-bounded local disk tier (least recently used entries are
+    evicted first) and then an optional GCS tier. Concurrent misses for the same key are
+    coalesced so that only one Veo operation runs per key at a time. New entries are copied to
+    the GCS tier by background workers, off the request path.
+
+    Hits are handed out as hard links in `output_dir`, so evicting the cache entry later never
+    deletes a file a caller was just given.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int, gcs_bucket_name: Optional[str] = None,
+                 output_dir: Optional[str] = None, upload_workers: int = 2, upload_queue_size: int = 32):
+        """
+        Initializes the GenerationCache.
+
+        Args:
+            cache_dir (str): Directory of the local disk tier.
+            max_bytes (int): Size budget of the local disk tier.
+            gcs_bucket_name (str): Bucket of the GCS tier, or None to disable it.
+            output_dir (str): Directory cache hits are linked into. Defaults to `cache_dir`'s
+                `hits` subdirectory.
+            upload_workers (int): Background threads uploading new entries to the GCS tier.
+            upload_queue_size (int): Uploads that may wait for a worker; further entries are
+                not uploaded (the GCS tier is best effort).
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.gcs_bucket_name = gcs_bucket_name
+        self.output_dir = output_dir or os.path.join(cache_dir, "hits")
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest access first
+        self._pins: Dict[str, int] = {}  # key -> uploads still reading the entry
+        self._in_flight: Dict[str, Future] = {}
+        self._uploader = (StagePipeline([("upload", self._upload_stage)], workers_per_stage=upload_workers,
+                                        queue_size=upload_queue_size, name="generation-cache")
+                          if gcs_bucket_name else None)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._load_entries()
+        logging.info(f"GenerationCache initialized at {self.cache_dir} with {len(self._entries)} entries "
+                     f"({self._total_bytes()} bytes), GCS tier: {self.gcs_bucket_name or 'disabled'}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def _load_entries(self):
+        # Access order survives restarts through file mtimes, which are bumped on every hit.
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".mp4"):
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+                entries.append((stat.st_mtime, filename[:-len(".mp4")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+
+    def _total_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the local path of a cached video, fetching it from GCS if needed, or None."""
+        path = self._path(key)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                try:
+                    os.utime(path)
+                    return path
+                except OSError:
+                    del self._entries[key]
+        if self.gcs_bucket_name:
+            return self._fetch_from_gcs(key)
+        return None
+
+    def put(self, key: str, video_path: str, upload: bool = True) -> str:
+        """
+        Stores a copy of `video_path` under `key` and returns the cached path. With a GCS tier
+        the entry is queued for upload and kept on disk until it has been uploaded.
+        """
+        path = self._path(key)
+        _link_or_copy(video_path, path)
+        if upload and self._uploader is not None:
+            with self._lock:
+                self._pins[key] = self._pins.get(key, 0) + 1
+            if not self._uploader.submit({"key": key, "path": path}, block=False):
+                logging.warning(f"Generation cache uploads are saturated; {key} stays local only.")
+                self._unpin(key)
+        self._add_entry(key, os.path.getsize(path))
+        return path
+
+    def _upload_stage(self, item: Dict[str, Any]):
+        try:
+            upload_to_gcs(self.gcs_bucket_name, item["path"], f"{GCS_CACHE_PREFIX}{item['key']}.mp4")
+        except Exception as e:
+            logging.warning(f"Error uploading cache entry {item['key']} to GCS: {e}")
+        finally:
+            self._unpin(item["key"])
+
+    def _unpin(self, key: str):
+        with self._lock:
+            remaining = self._pins.get(key, 0) - 1
+            if remaining > 0:
+                self._pins[key] = remaining
+            else:
+                self._pins.pop(key, None)
+        self._add_entry(None, 0)
+
+    def flush_uploads(self):
+        """Blocks until every queued GCS tier upload has finished."""
+        if self._uploader is not None:
+            self._uploader.join()
+
+    def _hand_out(self, key: str, cached_path: str) -> str:
+        """Links a cached file into `output_dir` and returns the link, which eviction never removes."""
+        path = os.path.join(self.output_dir, f"cached_{key}.mp4")
+        try:
+            if os.path.samefile(cached_path, path):
+                return path
+        except OSError:
+            pass
+        _link_or_copy(cached_path, path)
+        return path
+
+    def get_or_generate(self, key: str, generate: Callable[[], Dict[str, Any]], variants: int = 1) -> Dict[str, Any]:
+        """
+        Returns a cached result for `key`, or calls `generate` and caches a successful result.
+
+        Only one `generate` call runs per key at a time; concurrent callers for the same key
+        wait for it and share its result. With `variants` > 1 the result's "video_paths"
+        are cached and returned as a group.
+        """
+        variant_keys = [key] if variants == 1 else [f"{key}_{i}" for i in range(variants)]
+        cached_paths = self._cached_paths(variant_keys)
+        if cached_paths is not None:
+            incr("generation_cache_requests_total", result="hit")
+            logging.info(f"Generation cache hit for key {key}: {', '.join(cached_paths)}")
+            return {"status": "success", "video_path": cached_paths[0], "video_paths": cached_paths, "cached": True}
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+        incr("generation_cache_requests_total", result="miss" if owner else "joined")
+        if not owner:
+            logging.info(f"Joining in-flight generation for key {key}")
+            return future.result()
+
+        try:
+            result = generate()
+            if result.get("status") == "success" and result.get("video_path"):
+                video_paths = result.get("video_paths") or [result["video_path"]]
+                for variant_key, video_path in zip(variant_keys, video_paths):
+                    self.put(variant_key, video_path)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _cached_paths(self, variant_keys: List[str]) -> Optional[List[str]]:
+        cached_paths = []
+        for variant_key in variant_keys:
+            cached_path = self.get(variant_key)
+            if not cached_path:
+                return None
+            try:
+                cached_paths.append(self._hand_out(variant_key, cached_path))
+            except OSError:
+                # Evicted between the lookup and the link; treat it as a miss.
+                return None
+        return cached_paths
+
+    def _add_entry(self, key: Optional[str], size: int):
+        """Records an entry (if `key` is given) and evicts unpinned entries to fit the budget."""
+        with self._lock:
+            if key is not None:
+                self._entries[key] = size
+                self._entries.move_to_end(key)
+            total = self._total_bytes()
+            candidates = [k for k in self._entries if k != key and k not in self._pins]
+            for evicted_key in candidates:
+                if total <= self.max_bytes:
+                    break
+                evicted_size = self._entries.pop(evicted_key)
+                total -= evicted_size
+                try:
+                    os.remove(self._path(evicted_key))
+                    logging.info(f"Evicted generation cache entry {evicted_key} ({evicted_size} bytes)")
+                except OSError as e:
+                    logging.warning(f"Error removing evicted cache entry {evicted_key}: {e}")
+
+    def _fetch_from_gcs(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            download_from_gcs(self.gcs_bucket_name, f"{GCS_CACHE_PREFIX}{key}.mp4", temp_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        os.replace(temp_path, path)
+        self._add_entry(key, os.path.getsize(path))
+        return path
+
+
+def _link_or_copy(source_path: str, path: str):
+    """Atomically places `source_path` at `path` as a hard link, or a copy across file systems."""
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, path)
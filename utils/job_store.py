@@ -0,0 +1,241 @@
+# utils/job_store.py
+import atexit
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+from config import JOB_LEASE_SECONDS
+
+_COLUMNS = (
+    "job_id", "prompt", "aspect_ratio", "allow_people", "state", "operation_name",
+    "video_path", "error", "polls", "priority", "tenant", "api_key_id", "submitted_at", "finished_at",
+    "number_of_videos", "video_paths", "owner", "lease_expires_at",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    aspect_ratio TEXT,
+    allow_people TEXT,
+    state TEXT NOT NULL,
+    operation_name TEXT,
+    video_path TEXT,
+    error TEXT,
+    polls INTEGER DEFAULT 0,
+    priority INTEGER DEFAULT 0,
+    tenant TEXT,
+    api_key_id TEXT,
+    submitted_at REAL,
+    finished_at REAL,
+    number_of_videos INTEGER DEFAULT 1,
+    video_paths TEXT,
+    owner TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+# Columns added after the first release, created on databases written by older versions.
+_ADDED_COLUMNS = {"priority": "INTEGER DEFAULT 0", "tenant": "TEXT", "api_key_id": "TEXT",
+                  "number_of_videos": "INTEGER DEFAULT 1", "video_paths": "TEXT", "owner": "TEXT",
+                  "lease_expires_at": "REAL"}
+
+# List-valued columns, stored as JSON text.
+_JSON_COLUMNS = ("video_paths",)
+
+# A store that lost a job's lease (another process claimed it) must not overwrite that row.
+_UPSERT = (
+    f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)}) "
+    f"ON CONFLICT (job_id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in _COLUMNS[1:])} "
+    f"WHERE jobs.owner IS NULL OR jobs.owner = excluded.owner"
+)
+
+_UNFINISHED_STATES = ("queued", "running")
+
+_STOP = object()
+
+
+def _from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    record = dict(row)
+    for column in _JSON_COLUMNS:
+        if record.get(column) is not None:
+            record[column] = json.loads(record[column])
+    return record
+
+
+class JobStore:
+    """
+    Durable SQLite record of Veo generation jobs, used to resume polling after a restart.
+
+    `record()` only enqueues a snapshot of the job; a single writer thread drains the
+    queue and commits batches of upserts, so the submit path never waits on disk I/O.
+    Several updates to the same job inside one batch are coalesced into a single row write.
+
+    Several processes may share one database (e.g. the app and the batch CLI). Every
+    unfinished job is leased by the store that records it: the writer thread renews the
+    leases of its jobs, `close()` releases them, and `claim_unfinished()` only hands out jobs
+    that nobody holds, so each job is resumed by exactly one process.
+    """
+    def __init__(self, path: str, flush_interval: float = 0.05, batch_size: int = 256,
+                 lease_seconds: float = JOB_LEASE_SECONDS, owner: Optional[str] = None):
+        """
+        Initializes the JobStore and starts its writer thread.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            flush_interval (float): Maximum seconds a queued write waits before being committed.
+            batch_size (int): Maximum number of queued writes committed in one transaction.
+            lease_seconds (float): How long a job stays owned by this store without a renewal;
+                leases are renewed every third of that.
+            owner (str): Id recorded as the owner of this store's jobs. Defaults to a value
+                unique to this store instance.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: "queue.Queue" = queue.Queue()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self._writer = threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+        logging.info(f"JobStore initialized at: {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, job: Dict[str, Any]):
+        """Queues a snapshot of the job for the next batched write, leased to this store."""
+        row = {column: job.get(column) for column in _COLUMNS}
+        row["owner"] = self.owner
+        if row["state"] in _UNFINISHED_STATES:
+            row["lease_expires_at"] = time.time() + self.lease_seconds
+        for column in _JSON_COLUMNS:
+            if row[column] is not None:
+                row[column] = json.dumps(row[column])
+        self._queue.put(row)
+
+    def flush(self):
+        """Blocks until every queued write has been committed."""
+        self._queue.join()
+
+    def close(self):
+        """
+        Flushes pending writes, releases the leases of this store's unfinished jobs so another
+        process can resume them right away, and stops the writer thread.
+        """
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the last committed state of a job, or None if it is unknown."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _from_row(row) if row else None
+
+    def load_unfinished(self) -> List[Dict[str, Any]]:
+        """Returns every job that was queued or running when it was last recorded."""
+        placeholders = ", ".join("?" for _ in _UNFINISHED_STATES)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY submitted_at",
+                _UNFINISHED_STATES,
+            ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def claim_unfinished(self) -> List[Dict[str, Any]]:
+        """
+        Atomically takes over every unfinished job that no live store holds (never leased, or
+        its lease expired) and returns them, oldest first. Jobs this store already owns are
+        not returned again.
+        """
+        self.flush()
+        placeholders = ", ".join("?" for _ in _UNFINISHED_STATES)
+        now = time.time()
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so two stores cannot claim the same rows.
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({placeholders}) "
+                f"AND (owner IS NULL OR lease_expires_at IS NULL OR lease_expires_at < ?) AND owner IS NOT ? "
+                f"ORDER BY submitted_at",
+                (*_UNFINISHED_STATES, now, self.owner),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET owner = ?, lease_expires_at = ? WHERE job_id = ?",
+                [(self.owner, now + self.lease_seconds, row["job_id"]) for row in rows],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        claimed = [_from_row(row) for row in rows]
+        for record in claimed:
+            record["owner"], record["lease_expires_at"] = self.owner, now + self.lease_seconds
+        return claimed
+
+    def _renew_leases(self, conn: sqlite3.Connection, release: bool = False):
+        placeholders = ", ".join("?" for _ in _UNFINISHED_STATES)
+        try:
+            with conn:
+                conn.execute(
+                    f"UPDATE jobs SET owner = ?, lease_expires_at = ? WHERE owner = ? AND state IN ({placeholders})",
+                    (None if release else self.owner, None if release else time.time() + self.lease_seconds,
+                     self.owner, *_UNFINISHED_STATES),
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Error {'releasing' if release else 'renewing'} job leases in {self.path}: {e}")
+
+    def _write_loop(self):
+        conn = self._connect()
+        renew_interval = self.lease_seconds / 3
+        next_renewal = time.monotonic() + renew_interval
+        try:
+            while True:
+                try:
+                    first = self._queue.get(timeout=max(0.0, next_renewal - time.monotonic()))
+                except queue.Empty:
+                    self._renew_leases(conn)
+                    next_renewal = time.monotonic() + renew_interval
+                    continue
+                batch = [first]
+                try:
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    pass
+                stop = any(item is _STOP for item in batch)
+                rows = {item["job_id"]: item for item in batch if item is not _STOP}
+                try:
+                    with conn:
+                        conn.executemany(_UPSERT, [tuple(row[c] for c in _COLUMNS) for row in rows.values()])
+                except sqlite3.Error as e:
+                    logging.error(f"Error writing {len(rows)} job records to {self.path}: {e}")
+                if stop:
+                    self._renew_leases(conn, release=True)
+                elif time.monotonic() >= next_renewal:
+                    self._renew_leases(conn)
+                    next_renewal = time.monotonic() + renew_interval
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            conn.close()
@@ -0,0 +1,288 @@
+# utils/media_cache.py
+import atexit
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+from utils.gcs_utils import download_from_gcs
+
+INDEX_FILENAME = ".media_cache_index.json"
+MEDIA_EXTENSIONS = (".mp4", ".mov", ".webm", ".mkv", ".avi")
+
+
+class MediaCache:
+    """
+    Size-bounded cache of the local video files in one directory.
+
+    Every file is tracked in a persisted index with its size, last access time, hit count and,
+    once uploaded, its GCS blob name. When the directory grows past `max_bytes`, the least
+    recently used (or, with `policy="lfu"`, least frequently used) uploaded files are deleted
+    and downloaded again from GCS the next time they are requested. Files without a GCS copy
+    could not be refilled and are never evicted, and neither are pinned files, e.g. ones
+    still being published.
+
+    Access-only index updates are written at most every `persist_interval` seconds and on exit;
+    additions and evictions are written immediately.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int, gcs_bucket_name: Optional[str] = None,
+                 policy: str = "lru", persist_interval: float = 5.0):
+        """
+        Initializes the MediaCache and reconciles its index with the directory contents.
+
+        Args:
+            cache_dir (str): Directory holding the cached videos.
+            max_bytes (int): Byte budget of the directory.
+            gcs_bucket_name (str): Bucket evicted files are refilled from, or None.
+            policy (str): "lru" or "lfu".
+            persist_interval (float): Minimum seconds between index writes for access-only updates.
+        """
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown media cache policy: {policy}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.gcs_bucket_name = gcs_bucket_name
+        self.policy = policy
+        self.persist_interval = persist_interval
+        self.index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # filename -> {size, last_access, hits, blob_name}
+        self._pins: Dict[str, int] = {}
+        self._dirty = False
+        self._persisted_at = 0.0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+        with self._lock:
+            self._evict()
+            self._persist(force=True)
+        atexit.register(self.flush)
+        logging.info(f"MediaCache initialized at {self.cache_dir} with {len(self._entries)} files "
+                     f"({self.total_bytes()} of {self.max_bytes} bytes, {self.policy})")
+
+    def _filename(self, path: str) -> str:
+        return os.path.basename(path)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, filename)
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = {}
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable media cache index {self.index_path}: {e}")
+            entries = {}
+        # Files evicted or deleted while we were down keep their entry only if they can be refilled.
+        for filename, entry in entries.items():
+            exists = os.path.exists(self._path(filename))
+            if exists or entry.get("blob_name"):
+                entry["size"] = os.path.getsize(self._path(filename)) if exists else 0
+                self._entries[filename] = entry
+        # Files written by older versions or outside the cache are adopted using their mtime.
+        for filename in os.listdir(self.cache_dir):
+            if filename not in self._entries and filename.lower().endswith(MEDIA_EXTENSIONS):
+                stat = os.stat(self._path(filename))
+                self._entries[filename] = {"size": stat.st_size, "last_access": stat.st_mtime, "hits": 0, "blob_name": None}
+        self._dirty = True
+
+    def _persist(self, force: bool = False):
+        if not self._dirty or (not force and time.time() - self._persisted_at < self.persist_interval):
+            return
+        temp_path = f"{self.index_path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.index_path)
+            self._dirty = False
+            self._persisted_at = time.time()
+        except OSError as e:
+            logging.warning(f"Error writing media cache index {self.index_path}: {e}")
+
+    def flush(self):
+        """Writes any pending index updates."""
+        with self._lock:
+            self._persist(force=True)
+
+    def total_bytes(self) -> int:
+        """Returns the bytes of cached files currently on disk."""
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def admit(self, path: str, blob_name: Optional[str] = None, pin: bool = False) -> str:
+        """
+        Registers a file in the cache directory and evicts other files to fit the budget.
+
+        A file outside the directory is linked (or copied) into it first.
+
+        Args:
+            blob_name (str): Where the file is stored in GCS, if it already is.
+            pin (bool): Also pin the file, as one `pin()` call, before anything is evicted.
+
+        Returns:
+            str: The path of the file in the cache directory.
+        """
+        filename = self._filename(path)
+        cached_path = self._path(filename)
+        if not os.path.exists(cached_path) or not os.path.samefile(path, cached_path):
+            temp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+            try:
+                os.link(path, temp_path)
+            except OSError:
+                shutil.copyfile(path, temp_path)
+            os.replace(temp_path, cached_path)
+        with self._lock:
+            if pin:
+                self._pins[filename] = self._pins.get(filename, 0) + 1
+            entry = self._entries.setdefault(filename, {"hits": 0, "blob_name": None})
+            entry["size"] = os.path.getsize(cached_path)
+            entry["last_access"] = time.time()
+            entry["blob_name"] = blob_name or entry.get("blob_name")
+            self._dirty = True
+            self._evict(keep=filename)
+            self._persist(force=True)
+        return cached_path
+
+    def set_blob_name(self, path: str, blob_name: str):
+        """Records where a cached file was uploaded so it can be refilled after eviction."""
+        with self._lock:
+            entry = self._entries.get(self._filename(path))
+            if entry is not None:
+                entry["blob_name"] = blob_name
+                self._dirty = True
+                self._persist(force=True)
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        Returns the local path of a cached video, downloading it from GCS if it was evicted.
+
+        Returns:
+            Optional[str]: The local path, or None if the file is unknown or cannot be refilled.
+        """
+        filename = self._filename(path)
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return None
+            blob_name = entry.get("blob_name")
+            local_path = self._path(filename)
+            if os.path.exists(local_path):
+                self._touch(entry)
+                return local_path
+        if not (self.gcs_bucket_name and blob_name):
+            return None
+        temp_path = f"{local_path}.{threading.get_ident()}.tmp"
+        try:
+            download_from_gcs(self.gcs_bucket_name, blob_name, temp_path)
+            os.replace(temp_path, local_path)
+        except Exception as e:
+            logging.error(f"Error refilling {filename} from gs://{self.gcs_bucket_name}/{blob_name}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        logging.info(f"Refilled {filename} from gs://{self.gcs_bucket_name}/{blob_name}")
+        self.admit(local_path)
+        with self._lock:
+            self._touch(self._entries[filename])
+        return local_path
+
+    def _touch(self, entry: Dict[str, Any]):
+        entry["last_access"] = time.time()
+        entry["hits"] += 1
+        self._dirty = True
+        self._persist()
+
+    def pin(self, path: str):
+        """Protects a file from eviction until a matching `unpin`."""
+        filename = self._filename(path)
+        with self._lock:
+            self._pins[filename] = self._pins.get(filename, 0) + 1
+
+    def unpin(self, path: str):
+        """Releases a `pin` and evicts files that were only kept because of it."""
+        filename = self._filename(path)
+        with self._lock:
+            remaining = self._pins.get(filename, 0) - 1
+            if remaining > 0:
+                self._pins[filename] = remaining
+            else:
+                self._pins.pop(filename, None)
+            if self._evict():
+                self._persist(force=True)
+
+    def discard(self, path: str) -> bool:
+        """
+        Deletes a file that is no longer needed, such as an intermediate segment, and drops it
+        from the index. Pinned files and files outside the cache directory are left alone.
+
+        Returns:
+            bool: Whether the file is gone.
+        """
+        filename = self._filename(path)
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.cache_dir):
+            return False
+        with self._lock:
+            if filename in self._pins:
+                return False
+            try:
+                os.remove(self._path(filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Error discarding {filename} from the media cache: {e}")
+                return False
+            if self._entries.pop(filename, None) is not None:
+                self._dirty = True
+                self._persist(force=True)
+        return True
+
+    @contextmanager
+    def pinned(self, path: str):
+        """Context manager that pins `path` for the duration of the block."""
+        self.pin(path)
+        try:
+            yield path
+        finally:
+            self.unpin(path)
+
+    def _eviction_order(self, filename: str):
+        entry = self._entries[filename]
+        if self.policy == "lfu":
+            return entry["hits"], entry["last_access"]
+        return entry["last_access"]
+
+    def _evict(self, keep: Optional[str] = None) -> bool:
+        total = sum(entry["size"] for entry in self._entries.values())
+        if total <= self.max_bytes:
+            return False
+        # Only files with a GCS copy are evicted; the others could never be refilled.
+        candidates = sorted((filename for filename, entry in self._entries.items()
+                             if entry["size"] and entry.get("blob_name") and filename != keep
+                             and filename not in self._pins),
+                            key=self._eviction_order)
+        evicted = False
+        for filename in candidates:
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[filename]
+            try:
+                os.remove(self._path(filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Error evicting {filename} from the media cache: {e}")
+                continue
+            total -= entry["size"]
+            evicted = True
+            entry["size"] = 0  # Kept in the index so it can be refilled from GCS
+            logging.info(f"Evicted {filename} from the media cache ({total} of {self.max_bytes} bytes in use)")
+        if total > self.max_bytes:
+            logging.warning(f"Media cache is over budget ({total} of {self.max_bytes} bytes): "
+                            f"the remaining files are pinned or not uploaded yet.")
+        if evicted:
+            self._dirty = True
+        return evicted
@@ -0,0 +1,218 @@
+# utils/metrics.py
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets; stages range from sub-millisecond
+# index lookups to multi-minute Veo operations.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, bucket_count: int):
+        self.counts = [0] * (bucket_count + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """
+    In-process counters and latency histograms, labelled like Prometheus metrics.
+
+    Recording is a dict lookup and a few additions under one lock, cheap enough to leave on
+    around every request stage.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[_LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[_LabelKey, _Histogram]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Adds `value` to the counter `name` with the given labels."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Records a duration in the histogram `name` with the given labels."""
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(len(self.buckets))
+            histogram.counts[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns every series as plain data, suitable for JSON."""
+        with self._lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                        for name, series in self._counters.items()}
+            histograms = {
+                name: [{
+                    "labels": dict(key),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "mean": round(h.sum / h.count, 6) if h.count else 0.0,
+                    "p50": self._quantile(h, 0.50),
+                    "p95": self._quantile(h, 0.95),
+                    "p99": self._quantile(h, 0.99),
+                } for key, h in series.items()]
+                for name, series in self._histograms.items()
+            }
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms}
+
+    def _quantile(self, histogram: _Histogram, fraction: float) -> Optional[float]:
+        # Upper bound of the bucket holding the quantile; None if it falls in the +Inf bucket.
+        if not histogram.count:
+            return None
+        target = fraction * histogram.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, histogram.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return None
+
+    def render_prometheus(self) -> str:
+        """Returns every series in the Prometheus text exposition format."""
+        def labels_text(key, extra=()):
+            pairs = list(key) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{labels_text(key)} {value}" for key, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, h.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{labels_text(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{labels_text(key, [('le', '+Inf')])} {h.count}")
+                    lines.append(f"{name}_sum{labels_text(key)} {h.sum}")
+                    lines.append(f"{name}_count{labels_text(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def incr(name: str, value: float = 1, **labels):
+    """Adds to a counter of the process-wide registry."""
+    registry.incr(name, value, **labels)
+
+
+def observe(name: str, seconds: float, **labels):
+    """Records a duration in a histogram of the process-wide registry."""
+    registry.observe(name, seconds, **labels)
+
+
+class span:
+    """
+    Times a block into the histogram `<name>_seconds` of the process-wide registry and counts
+    exceptions in `<name>_errors_total`. Usable as a context manager or a decorator:
+
+        with span("gcs_upload", strategy="composite"):
+            ...
+    """
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        registry.observe(f"{self.name}_seconds", time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            registry.incr(f"{self.name}_errors_total", **self.labels)
+        return False
+
+    def __call__(self, function):
+        name, labels = self.name, self.labels
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves /metrics (Prometheus text) and /metrics.json on a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_json_dump(path: str, interval: float = 60.0) -> threading.Thread:
+    """Writes a JSON snapshot of the registry to `path` every `interval` seconds."""
+    def dump_loop():
+        while True:
+            time.sleep(interval)
+            temp_path = f"{path}.tmp"
+            try:
+                with open(temp_path, "w") as f:
+                    json.dump(registry.snapshot(), f)
+                os.replace(temp_path, path)
+            except OSError as e:
+                logging.warning(f"Error writing metrics snapshot to {path}: {e}")
+
+    thread = threading.Thread(target=dump_loop, name="metrics-json-dump", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,80 @@
+# utils/pipeline.py
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class StagePipeline:
+    """
+    Runs items through a fixed sequence of stages on background worker threads.
+
+    Every stage has its own bounded queue and worker pool. When a stage falls behind its
+    queue fills up and the stage before it blocks, so backpressure propagates all the way to
+    `submit()` instead of memory growing without bound. A stage that raises records the error
+    on the item under "errors" and the item continues to the next stage.
+    """
+    def __init__(self, stages: List[Tuple[str, Callable[[Dict[str, Any]], None]]], workers_per_stage: int = 2,
+                 queue_size: int = 64, on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 name: str = "pipeline"):
+        """
+        Initializes the StagePipeline and starts its workers.
+
+        Args:
+            stages: (name, function) pairs; each function receives the item dict and may update it.
+            workers_per_stage (int): Worker threads per stage.
+            queue_size (int): Capacity of each stage's queue.
+            on_complete: Called with the item after its last stage.
+            name (str): Prefix for worker thread names.
+        """
+        self.stages = stages
+        self.on_complete = on_complete
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._workers = []
+        for index, (stage_name, _) in enumerate(stages):
+            for worker in range(workers_per_stage):
+                thread = threading.Thread(target=self._work, args=(index,), name=f"{name}-{stage_name}-{worker}", daemon=True)
+                thread.start()
+                self._workers.append(thread)
+
+    def submit(self, item: Dict[str, Any], block: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Queues an item for the first stage.
+
+        Returns:
+            bool: False if the pipeline is saturated and the item was not accepted within `timeout`.
+        """
+        try:
+            self._queues[0].put(item, block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def join(self):
+        """Blocks until every submitted item has been through every stage."""
+        for stage_queue in self._queues:
+            stage_queue.join()
+
+    def depths(self) -> Dict[str, int]:
+        """Returns the number of items waiting in front of each stage."""
+        return {stage_name: stage_queue.qsize() for (stage_name, _), stage_queue in zip(self.stages, self._queues)}
+
+    def _work(self, index: int):
+        stage_name, function = self.stages[index]
+        stage_queue = self._queues[index]
+        while True:
+            item = stage_queue.get()
+            try:
+                try:
+                    function(item)
+                except Exception as e:
+                    logging.error(f"Pipeline stage '{stage_name}' failed: {e}")
+                    item.setdefault("errors", {})[stage_name] = str(e)
+                if index + 1 < len(self._queues):
+                    self._queues[index + 1].put(item)
+                elif self.on_complete is not None:
+                    self.on_complete(item)
+            except Exception as e:
+                logging.error(f"Pipeline failed to hand off item after stage '{stage_name}': {e}")
+            finally:
+                stage_queue.task_done()
@@ -0,0 +1,326 @@
+# utils/prompt_index.py
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from config import PROMPT_INDEX_SYNC_OVERLAP_SECONDS
+from utils.gcs_utils import get_bucket, download_many_as_bytes
+
+SAVED_PROMPTS_PREFIX = "saved_prompts/"
+INDEX_PREFIX = "saved_prompts_index/"
+MANIFEST_BLOB = f"{INDEX_PREFIX}manifest.json"
+
+_TOKEN = re.compile(r"\w+")
+_NAME_TIMESTAMP = re.compile(rf"^{re.escape(SAVED_PROMPTS_PREFIX)}prompt_(\d{{8}}_\d{{6}})")
+
+
+def new_saved_prompt_blob_name(extension: str = "json"):
+    """
+    Returns a (blob_name, saved_at) pair for a prompt being saved now.
+
+    Names start with the second-resolution UTC timestamp so they sort in save order on every
+    replica regardless of time zone or DST; microseconds and a random suffix keep concurrent
+    saves within the same second from colliding.
+    """
+    now = datetime.now(timezone.utc)
+    saved_at = now.strftime("%Y%m%d_%H%M%S")
+    return f"{SAVED_PROMPTS_PREFIX}prompt_{saved_at}_{now.microsecond:06d}_{uuid.uuid4().hex[:8]}.{extension}", saved_at
+
+
+def parse_saved_prompt(blob_name: str, content: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Parses a saved prompt blob into an index entry.
+
+    `PromptSaverAgent` writes JSON objects with a "prompt" key while the app's quick-save
+    writes the raw prompt as `.txt`; both are accepted.
+    """
+    try:
+        text = content.decode("utf-8")
+        if blob_name.endswith(".json"):
+            data = json.loads(text)
+            prompt, saved_at = data.get("prompt"), data.get("saved_at")
+        else:
+            prompt, saved_at = text, None
+    except (UnicodeDecodeError, json.JSONDecodeError, AttributeError) as e:
+        logging.error(f"Error decoding saved prompt {blob_name}: {e}")
+        return None
+    if not prompt:
+        logging.warning(f"No prompt found in {blob_name}")
+        return None
+    return {"blob": blob_name, "prompt": prompt, "saved_at": saved_at}
+
+
+def _overlap_start(blob_name: str, overlap_seconds: float) -> str:
+    """
+    Returns the name `overlap_seconds` before the timestamp embedded in `blob_name`, or the bare
+    prefix (list everything) when the name carries no timestamp.
+    """
+    match = _NAME_TIMESTAMP.match(blob_name)
+    if not match:
+        return SAVED_PROMPTS_PREFIX
+    start = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S") - timedelta(seconds=overlap_seconds)
+    return f"{SAVED_PROMPTS_PREFIX}prompt_{start.strftime('%Y%m%d_%H%M%S')}"
+
+
+class PromptIndex:
+    """
+    Compacted, incrementally synced index of every prompt under `saved_prompts/`.
+
+    Saved prompt names embed their timestamp, so they sort in save order. The index keeps a
+    high-water mark (the last blob name it has seen) and each sync lists from `overlap_seconds`
+    before it, so a prompt whose upload finished after a later-named one (slow upload, clock
+    skew between replicas) is still picked up; only names not yet indexed are downloaded.
+    Entries are appended to a local JSONL cache so a restart resumes from the same point.
+
+    To keep fresh clients from downloading every prompt blob, synced entries are periodically
+    compacted into immutable JSONL segments under `saved_prompts_index/`, listed in
+    `manifest.json`. A client fetches only the segments it has not seen (tracked by their
+    GCS generation numbers) and then lists past the manifest's high-water mark.
+
+    An in-memory inverted index over prompt tokens serves keyword/prefix search and
+    pagination without touching GCS.
+    """
+    def __init__(self, bucket_name: str, cache_path: str, compact_threshold: int = 500,
+                 overlap_seconds: float = PROMPT_INDEX_SYNC_OVERLAP_SECONDS):
+        """
+        Initializes the PromptIndex from its local cache.
+
+        Args:
+            bucket_name (str): Bucket holding `saved_prompts/`.
+            cache_path (str): Local JSONL cache file; a `.state.json` file is kept next to it.
+            compact_threshold (int): Number of entries past the manifest's high-water mark
+                after which `sync()` writes a new segment.
+            overlap_seconds (float): How far before the high-water mark each sync re-lists.
+        """
+        self.bucket_name = bucket_name
+        self.cache_path = cache_path
+        self.state_path = f"{cache_path}.state.json"
+        self.compact_threshold = compact_threshold
+        self.overlap_seconds = overlap_seconds
+        self._lock = threading.RLock()
+        self._entries: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}  # blob name -> position in _entries
+        self._postings: Dict[str, set] = {}  # token -> positions
+        self._vocabulary: List[str] = []  # sorted tokens, for prefix lookups
+        self._vocabulary_dirty = False
+        self._state = {"high_water_mark": "", "manifest_generation": None, "segments": {}}
+        self._load_cache()
+
+    # -- local cache ------------------------------------------------------------------
+
+    def _load_cache(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                self._state.update(json.load(f))
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+        logging.info(f"PromptIndex loaded {len(self._entries)} entries from {self.cache_path}")
+
+    def _persist(self, new_entries: List[Dict[str, Any]]):
+        if new_entries:
+            with open(self.cache_path, "a") as f:
+                for entry in new_entries:
+                    f.write(json.dumps(entry) + "\n")
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(temp_path, self.state_path)
+
+    # -- in-memory index -----------------------------------------------------------
+
+    def _add(self, entry: Dict[str, Any]) -> bool:
+        position = self._positions.get(entry["blob"])
+        if position is not None:
+            if self._entries[position] == entry:
+                return False
+            self._unindex(position)
+            self._entries[position] = entry
+        else:
+            position = len(self._entries)
+            self._entries.append(entry)
+            self._positions[entry["blob"]] = position
+        for token in set(_TOKEN.findall(entry["prompt"].casefold())):
+            if token not in self._postings:
+                self._postings[token] = set()
+                self._vocabulary_dirty = True
+            self._postings[token].add(position)
+        return True
+
+    def _unindex(self, position: int):
+        for token in set(_TOKEN.findall(self._entries[position]["prompt"].casefold())):
+            self._postings.get(token, set()).discard(position)
+
+    def add(self, blob_name: str, prompt: str, saved_at: Optional[str] = None):
+        """Adds a prompt this process just saved, without waiting for the next sync."""
+        entry = {"blob": blob_name, "prompt": prompt, "saved_at": saved_at}
+        with self._lock:
+            if self._add(entry):
+                self._persist([entry])
+
+    def _matching_positions(self, term: str) -> set:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        matches = set()
+        start = bisect.bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches |= self._postings[token]
+        return matches
+
+    def search(self, query: str = "", page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """
+        Returns one page of prompts matching every keyword in `query`, newest first.
+
+        Each keyword matches any prompt token it is a prefix of, so "eag moun" finds
+        "eagle soaring over mountains". An empty query pages through all prompts.
+
+        Returns:
+            Dict[str, Any]: {"prompts": [...], "total": int, "page": int, "pages": int}
+        """
+        terms = _TOKEN.findall(query.casefold())
+        with self._lock:
+            if terms:
+                positions = None
+                for term in sorted(terms, key=len, reverse=True):
+                    matches = self._matching_positions(term)
+                    positions = matches if positions is None else positions & matches
+                    if not positions:
+                        break
+                ordered = sorted(positions or (), key=lambda p: self._entries[p]["blob"], reverse=True)
+            else:
+                ordered = sorted(range(len(self._entries)), key=lambda p: self._entries[p]["blob"], reverse=True)
+            page_size = max(1, page_size)
+            pages = max(1, -(-len(ordered) // page_size))
+            page = min(max(1, page), pages)
+            window = ordered[(page - 1) * page_size: page * page_size]
+            prompts = [self._entries[p]["prompt"] for p in window]
+        return {"prompts": prompts, "total": len(ordered), "page": page, "pages": pages}
+
+    def prompts(self) -> List[str]:
+        """Returns every indexed prompt in save order."""
+        with self._lock:
+            return [entry["prompt"] for entry in sorted(self._entries, key=lambda e: e["blob"])]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -- sync with GCS ----------------------------------------------------------------
+
+    def sync(self) -> int:
+        """
+        Brings the index up to date with GCS.
+
+        Returns:
+            int: The number of new or changed entries.
+        """
+        with self._lock:
+            bucket = get_bucket(self.bucket_name)
+            new_entries = self._sync_segments(bucket)
+            new_entries += self._sync_blobs(bucket)
+            self._persist(new_entries)
+            if new_entries:
+                logging.info(f"PromptIndex synced {len(new_entries)} new entries ({len(self._entries)} total).")
+            self._maybe_compact(bucket)
+            return len(new_entries)
+
+    def _sync_segments(self, bucket) -> List[Dict[str, Any]]:
+        manifest_blob = bucket.get_blob(MANIFEST_BLOB)
+        if manifest_blob is None or manifest_blob.generation == self._state["manifest_generation"]:
+            return []
+        manifest = json.loads(manifest_blob.download_as_bytes())
+        unseen = [s for s in manifest["segments"] if self._state["segments"].get(s["name"]) != s["generation"]]
+        contents = download_many_as_bytes(self.bucket_name, [s["name"] for s in unseen])
+        new_entries = []
+        for segment, content in zip(unseen, contents):
+            if content is None:
+                continue
+            for line in content.decode("utf-8").splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    if self._add(entry):
+                        new_entries.append(entry)
+            self._state["segments"][segment["name"]] = segment["generation"]
+        self._state["manifest_generation"] = manifest_blob.generation
+        self._state["manifest_high_water_mark"] = manifest["high_water_mark"]
+        self._state["high_water_mark"] = max(self._state["high_water_mark"], manifest["high_water_mark"])
+        return new_entries
+
+    def _sync_blobs(self, bucket) -> List[Dict[str, Any]]:
+        high_water_mark = self._state["high_water_mark"]
+        start_offset = _overlap_start(high_water_mark, self.overlap_seconds) if high_water_mark else None
+        listed = list(bucket.list_blobs(prefix=SAVED_PROMPTS_PREFIX, start_offset=start_offset))
+        if not listed:
+            return []
+        self._state["high_water_mark"] = max(high_water_mark, listed[-1].name)
+        blobs = [blob for blob in listed if blob.name not in self._positions]
+        if not blobs:
+            return []
+        contents = download_many_as_bytes(self.bucket_name, [blob.name for blob in blobs])
+        new_entries = []
+        for blob, content in zip(blobs, contents):
+            entry = parse_saved_prompt(blob.name, content) if content is not None else None
+            if entry and self._add(entry):
+                new_entries.append(entry)
+        return new_entries
+
+    def _maybe_compact(self, bucket):
+        compacted_through = self._state.get("manifest_high_water_mark", "")
+        pending = sum(1 for entry in self._entries if entry["blob"] > compacted_through)
+        if pending < self.compact_threshold:
+            return
+        self.compact(bucket)
+
+    def compact(self, bucket=None):
+        """
+        Writes entries past the manifest's high-water mark into a new immutable segment and
+        publishes it in the manifest. Concurrent compactions are resolved with a generation
+        precondition on the manifest; the loser's segment is deleted.
+
+        The segment also repeats entries from the overlap window before the previous
+        high-water mark, so prompts that arrived late are captured before fresh clients stop
+        listing that far back; readers deduplicate by blob name.
+        """
+        from google.api_core import exceptions  # Deferred: only needed when compacting
+        bucket = bucket or get_bucket(self.bucket_name)
+        with self._lock:
+            manifest_blob = bucket.get_blob(MANIFEST_BLOB)
+            manifest = (json.loads(manifest_blob.download_as_bytes()) if manifest_blob
+                        else {"segments": [], "high_water_mark": ""})
+            compacted_through = manifest["high_water_mark"]
+            if not any(entry["blob"] > compacted_through for entry in self._entries):
+                return
+            start = _overlap_start(compacted_through, self.overlap_seconds) if compacted_through else ""
+            pending = sorted((entry for entry in self._entries if entry["blob"] > start), key=lambda e: e["blob"])
+
+            segment = bucket.blob(f"{INDEX_PREFIX}segment_{pending[-1]['blob'].split('/')[-1]}_{uuid.uuid4().hex[:8]}.jsonl")
+            segment.upload_from_string("".join(json.dumps(e) + "\n" for e in pending), content_type="application/jsonl")
+            manifest["segments"].append({"name": segment.name, "generation": segment.generation, "entries": len(pending)})
+            manifest["high_water_mark"] = pending[-1]["blob"]
+            try:
+                new_manifest = bucket.blob(MANIFEST_BLOB)
+                new_manifest.upload_from_string(
+                    json.dumps(manifest), content_type="application/json",
+                    if_generation_match=manifest_blob.generation if manifest_blob else 0,
+                )
+            except exceptions.PreconditionFailed:
+                logging.info("Another client compacted the prompt index first; discarding this segment.")
+                try:
+                    segment.delete()
+                except exceptions.NotFound:
+                    pass
+                return
+            self._state["segments"][segment.name] = segment.generation
+            self._state["manifest_generation"] = new_manifest.generation
+            self._state["manifest_high_water_mark"] = manifest["high_water_mark"]
+            self._persist([])
+            logging.info(f"Compacted {len(pending)} prompts into {segment.name}")
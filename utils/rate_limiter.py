@@ -0,0 +1,180 @@
+# utils/rate_limiter.py
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from utils.metrics import incr
+
+
+def key_fingerprint(api_key: Optional[str]) -> str:
+    """Returns a short, non-secret identifier for an API key, safe to log and persist."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+
+def is_quota_error(error: Exception) -> bool:
+    """Returns True for 429 / RESOURCE_EXHAUSTED errors from the GenAI API."""
+    return getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`, holding at most `burst` tokens."""
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(rate_per_minute)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Returns seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class _KeyState:
+    def __init__(self, key_id: str, client, bucket: TokenBucket):
+        self.key_id = key_id
+        self.client = client
+        self.bucket = bucket
+        self.cooldown_until = 0.0
+        self.strikes = 0
+
+    def wait_time(self) -> float:
+        return max(self.cooldown_until - time.monotonic(), self.bucket.wait_time())
+
+
+class VeoScheduler:
+    """
+    Schedules Veo API calls across a pool of API keys.
+
+    Every key has its own token bucket. Waiting calls are ordered by priority (lower runs
+    first) and, within a priority, fairly across tenants using start-time fair queuing, so
+    one tenant's large batch cannot starve everyone else. Each call is sent on the key with
+    the most tokens left. A 429 / RESOURCE_EXHAUSTED response puts that key into a
+    jittered exponential cooldown and requeues the call in its original position, up to
+    `max_retries` times.
+
+    The scheduler must be used from a single event loop.
+    """
+    def __init__(self, clients: Dict[str, Any], requests_per_minute: float, burst: Optional[int] = None,
+                 max_retries: int = 5, base_cooldown: float = 5.0, max_cooldown: float = 120.0):
+        """
+        Initializes the VeoScheduler.
+
+        Args:
+            clients (Dict[str, genai.Client]): Clients keyed by `key_fingerprint` of their API key.
+            requests_per_minute (float): Sustained request rate allowed per key.
+            burst (int): Requests a key may send back to back; defaults to one minute's worth.
+            max_retries (int): Times a call is retried after quota errors before it fails.
+            base_cooldown (float): First cooldown after a quota error, doubled on each further one.
+            max_cooldown (float): Upper bound of a key's cooldown.
+        """
+        if not clients:
+            raise ValueError("VeoScheduler needs at least one client.")
+        self._keys = {key_id: _KeyState(key_id, client, TokenBucket(requests_per_minute, burst))
+                      for key_id, client in clients.items()}
+        self.max_retries = max_retries
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._queue = []  # heap of (priority, virtual_start, seq, request)
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._tenant_finish: Dict[str, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: set = set()  # The loop only holds weak references to running tasks
+
+    @property
+    def key_ids(self):
+        return list(self._keys)
+
+    def client_for(self, key_id: Optional[str]):
+        """Returns the client for `key_id`, or the first client if the key is unknown."""
+        state = self._keys.get(key_id) or next(iter(self._keys.values()))
+        return state.client
+
+    def queued(self) -> int:
+        """Returns the number of calls waiting for a key."""
+        return len(self._queue)
+
+    async def run(self, call: Callable[[Any], Awaitable[Any]], priority: int = 0,
+                  tenant: Optional[str] = None) -> Tuple[Any, str]:
+        """
+        Runs `call(client)` once a key has capacity.
+
+        Returns:
+            Tuple[Any, str]: The call's result and the id of the key that served it.
+        """
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        tenant = tenant or "default"
+        start = max(self._virtual_time, self._tenant_finish.get(tenant, 0.0))
+        self._tenant_finish[tenant] = start + 1
+        request = {"call": call, "future": asyncio.get_running_loop().create_future(), "attempts": 0}
+        heapq.heappush(self._queue, (priority, start, next(self._seq), request))
+        self._wakeup.set()
+        return await request["future"]
+
+    def _pick_key(self) -> Tuple[Optional[_KeyState], float]:
+        ready = [state for state in self._keys.values() if state.wait_time() == 0]
+        if ready:
+            return max(ready, key=lambda state: state.bucket.tokens), 0.0
+        return None, min(state.wait_time() for state in self._keys.values())
+
+    async def _dispatch(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            state, wait = self._pick_key()
+            if state is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            entry = heapq.heappop(self._queue)
+            self._virtual_time = max(self._virtual_time, entry[1])
+            state.bucket.take()
+            task = asyncio.create_task(self._execute(entry, state))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, entry, state: _KeyState):
+        request = entry[3]
+        try:
+            result = await request["call"](state.client)
+        except Exception as e:
+            if is_quota_error(e):
+                incr("veo_quota_errors_total", key=state.key_id)
+            if is_quota_error(e) and request["attempts"] < self.max_retries:
+                cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** state.strikes)) * random.uniform(0.8, 1.2)
+                state.strikes += 1
+                state.cooldown_until = time.monotonic() + cooldown
+                request["attempts"] += 1
+                logging.warning(f"Quota exhausted on API key {state.key_id}; cooling it down for {cooldown:.1f}s "
+                                f"and retrying (attempt {request['attempts']} of {self.max_retries}).")
+                heapq.heappush(self._queue, entry)
+                self._wakeup.set()
+            elif not request["future"].done():
+                request["future"].set_exception(e)
+            return
+        state.strikes = 0
+        if not request["future"].done():
+            request["future"].set_result((result, state.key_id))
@@ -1,11 +1,315 @@
 # utils/video_utils.py
-from moviepy.editor import VideoFileClip, concatenate_videoclips
-
-def concatenate_videos(video_paths, output_path="concatenated_video.mp4"):
-    """Concatenates multiple video files."""
-    clips = [VideoFileClip(path) for path in video_paths]
-    final_clip = concatenate_videoclips(clips)
-    final_clip.write_videofile(output_path, codec="libx264", audio_codec="aac")
-    for clip in clips:
-        clip.close()
-    return output_path
\ No newline at end of file
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import uuid
+
+from utils.metrics import incr, span
+
+_VIDEO_STREAM = re.compile(
+    r"Stream #\d+:\d+.*?: Video: (?P<codec>\w+)(?: \((?P<profile>[^)]*)\))?.*?, (?P<pix_fmt>\w+)(?:\([^)]*\))?, "
+    r"(?P<width>\d+)x(?P<height>\d+).*?(?:, (?P<fps>[\d.]+k?) fps)?(?:, [\d.]+k? tbr)?, (?P<tbn>[\d.]+k?) tbn"
+)
+_AUDIO_STREAM = re.compile(
+    r"Stream #\d+:\d+.*?: Audio: (?P<codec>\w+)(?: \((?P<profile>[^)]*)\))?.*?, (?P<sample_rate>\d+) Hz, (?P<layout>[\w.()]+)"
+)
+_DURATION = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+
+NORMALIZED_AUDIO_RATE = 48000
+
+
+def get_ffmpeg_exe():
+    """Returns the ffmpeg binary: the one on PATH, else the one bundled with imageio-ffmpeg."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        return ffmpeg
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def _run_ffmpeg(args, on_progress=None, duration=None):
+    """
+    Runs ffmpeg and raises RuntimeError with the tail of its log on failure.
+
+    If `on_progress` and the expected output `duration` (seconds) are given, ffmpeg's
+    machine-readable progress is parsed and `on_progress(fraction)` is called as it encodes.
+    """
+    command = [get_ffmpeg_exe(), "-hide_banner", "-nostdin", *args]
+    if on_progress is None or not duration:
+        result = subprocess.run(command, capture_output=True, text=True)
+        stderr = result.stderr
+    else:
+        command[3:3] = ["-progress", "pipe:1", "-nostats"]
+        with tempfile.TemporaryFile("w+") as log:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=log, text=True)
+            for line in process.stdout:
+                if line.startswith("out_time_us=") and line.strip()[12:].isdigit():
+                    on_progress(min(1.0, int(line.strip()[12:]) / 1e6 / duration))
+            process.wait()
+            log.seek(0)
+            stderr = log.read()
+        result = subprocess.CompletedProcess(command, process.returncode, None, stderr)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {stderr.strip()[-2000:]}")
+    return result
+
+
+def _report(progress, fraction, description):
+    if progress is not None:
+        progress(fraction, description)
+
+
+@span("video_probe")
+def probe_video(path):
+    """
+    Reads the stream parameters of a video file.
+
+    Returns:
+        dict: {"video": {...} or None, "audio": {...} or None, "duration": float}
+    """
+    # `ffmpeg -i` with no output exits non-zero but prints the input's stream info.
+    stderr = subprocess.run([get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-i", path], capture_output=True, text=True).stderr
+    video = _VIDEO_STREAM.search(stderr)
+    audio = _AUDIO_STREAM.search(stderr)
+    duration = _DURATION.search(stderr)
+    if video is None and audio is None:
+        raise RuntimeError(f"Could not read video streams from {path}: {stderr.strip()[-500:]}")
+    return {
+        "video": video.groupdict() if video else None,
+        "audio": audio.groupdict() if audio else None,
+        "duration": (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)))
+        if duration else None,
+    }
+
+
+@span("video_thumbnail")
+def extract_thumbnail(video_path, output_path=None, at_seconds=1.0, width=320):
+    """
+    Writes a JPEG frame of the video, scaled to `width` pixels wide.
+
+    Returns:
+        str: The thumbnail path (defaults to the video path with a .jpg extension).
+    """
+    output_path = output_path or os.path.splitext(video_path)[0] + ".jpg"
+    # Seeking before -i is fast; fall back to the first frame for clips shorter than `at_seconds`.
+    for seek in (at_seconds, 0):
+        _run_ffmpeg(["-y", "-ss", str(seek), "-i", video_path, "-frames:v", "1",
+                     "-vf", f"scale={width}:-2", "-q:v", "4", output_path])
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            return output_path
+    raise RuntimeError(f"Could not extract a thumbnail from {video_path}")
+
+
+@span("video_preview")
+def make_preview(video_path, output_path=None, height=360, video_bitrate="400k", audio_bitrate="64k"):
+    """
+    Writes a low-bitrate H.264/AAC proxy of the video, `height` pixels tall, with the index
+    at the front of the file so browsers can start playing it before it has fully loaded.
+
+    Returns:
+        str: The proxy path (defaults to the video path with a _preview.mp4 suffix).
+    """
+    output_path = output_path or os.path.splitext(video_path)[0] + "_preview.mp4"
+    _run_ffmpeg(["-y", "-i", video_path, "-map", "0:v:0", "-map", "0:a:0?",
+                 # Never upscale clips that are already smaller than the proxy.
+                 "-vf", f"scale=-2:'min({height},ih)'", "-c:v", "libx264", "-preset", "veryfast",
+                 "-b:v", video_bitrate, "-maxrate", video_bitrate, "-bufsize", video_bitrate, "-pix_fmt", "yuv420p",
+                 "-c:a", "aac", "-b:a", audio_bitrate, "-ac", "2", "-movflags", "+faststart", output_path])
+    return output_path
+
+
+def _stream_signature(probe):
+    # Everything the concat demuxer needs to match for a lossless stream copy.
+    return (probe["video"], probe["audio"])
+
+
+def can_stream_copy(probes):
+    """
+    Returns True if the probed inputs share codec parameters and can be joined without re-encoding.
+    An input without a readable video stream is never stream-copied.
+    """
+    if any(p["video"] is None for p in probes):
+        return False
+    return all(_stream_signature(p) == _stream_signature(probes[0]) for p in probes[1:])
+
+
+def _concat_list_line(path):
+    return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n"
+
+
+@span("video_concat_copy")
+def concat_stream_copy(video_paths, output_path, on_progress=None, duration=None):
+    """
+    Joins inputs with identical codec parameters using ffmpeg's concat demuxer, without
+    re-encoding. The demuxer opens one input at a time, so memory and open file handles stay
+    constant regardless of how many inputs there are.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        list_file.writelines(_concat_list_line(path) for path in video_paths)
+    try:
+        _run_ffmpeg(["-y", "-f", "concat", "-safe", "0", "-i", list_file.name,
+                     "-c", "copy", "-movflags", "+faststart", output_path], on_progress, duration)
+    finally:
+        os.remove(list_file.name)
+    return output_path
+
+
+@span("video_normalize")
+def normalize_video(path, output_path, target, with_audio, on_progress=None, duration=None):
+    """
+    Re-encodes one clip to the target frame size and rate (letterboxed if needed) with
+    H.264/yuv420p video and, if `with_audio`, AAC stereo audio (silence when the clip has none).
+    Clips normalized to the same target can then be joined with `concat_stream_copy`.
+    `duration` (seconds) enables `on_progress` reporting.
+    """
+    width, height, fps = target["width"], target["height"], target["fps"]
+    video_filter = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p")
+    args = ["-y", "-i", path]
+    if with_audio and target.get("source_has_audio") is False:
+        args += ["-f", "lavfi", "-i", f"anullsrc=r={NORMALIZED_AUDIO_RATE}:cl=stereo", "-shortest"]
+    args += ["-map", "0:v:0"]
+    if with_audio:
+        args += ["-map", "1:a:0" if target.get("source_has_audio") is False else "0:a:0",
+                 "-c:a", "aac", "-ar", str(NORMALIZED_AUDIO_RATE), "-ac", "2"]
+    else:
+        args += ["-an"]
+    args += ["-vf", video_filter, "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+             "-video_track_timescale", "12288", output_path]
+    _run_ffmpeg(args, on_progress, duration)
+    return output_path
+
+
+def normalization_target(probes):
+    """Returns the re-encode target for mismatched inputs: the first clip's frame size and rate."""
+    missing = [str(i + 1) for i, p in enumerate(probes) if p["video"] is None]
+    if missing:
+        raise ValueError(f"No readable video stream in clip {', '.join(missing)}; it cannot be concatenated.")
+    first = probes[0]["video"]
+    return {"width": int(first["width"]), "height": int(first["height"]), "fps": first["fps"] or "24"}
+
+
+@span("video_concatenate")
+def concatenate_videos(video_paths, output_path=None, progress=None):
+    """
+    Concatenates multiple video files into `output_path` (by default a uniquely named file in
+    the working directory, so concurrent calls never share an output) and returns its path.
+
+    Inputs sharing codec parameters (the usual case for Veo outputs of one model and aspect
+    ratio) are joined losslessly with a stream copy. Otherwise each clip is first re-encoded
+    to the first clip's parameters, and the normalized clips are stream-copied together.
+
+    Clips are processed one at a time, so peak memory does not grow with the number of inputs.
+    If given, `progress(fraction, description)` is called as the work advances.
+    """
+    def stage(start, end, description):
+        if progress is None:
+            return None
+        return lambda fraction: progress(start + (end - start) * fraction, description)
+
+    output_path = output_path or f"concatenated_{uuid.uuid4().hex}.mp4"
+    probes = []
+    for i, path in enumerate(video_paths):
+        _report(progress, 0.1 * i / len(video_paths), f"Inspecting clip {i + 1} of {len(video_paths)}")
+        probes.append(probe_video(path))
+    total_duration = sum(p["duration"] or 0 for p in probes)
+
+    if can_stream_copy(probes):
+        incr("video_concatenations_total", mode="stream_copy")
+        concat_stream_copy(video_paths, output_path, stage(0.1, 1.0, "Joining clips"), total_duration)
+        _report(progress, 1.0, "Done")
+        return output_path
+
+    incr("video_concatenations_total", mode="reencode")
+    target = normalization_target(probes)
+    with_audio = any(p["audio"] for p in probes)
+    with tempfile.TemporaryDirectory(prefix="concat_normalized_") as work_dir:
+        normalized = []
+        start = 0.1
+        for i, (path, probe) in enumerate(zip(video_paths, probes)):
+            share = 0.8 * probe["duration"] / total_duration if total_duration and probe["duration"] else 0.8 / len(video_paths)
+            description = f"Re-encoding clip {i + 1} of {len(video_paths)}"
+            _report(progress, start, description)
+            clip_target = dict(target, source_has_audio=probe["audio"] is not None)
+            normalized.append(normalize_video(path, os.path.join(work_dir, f"{i:05d}.mp4"), clip_target, with_audio,
+                                              stage(start, start + share, description), probe["duration"]))
+            start += share
+        concat_stream_copy(normalized, output_path, stage(0.9, 1.0, "Joining clips"), total_duration)
+    _report(progress, 1.0, "Done")
+    return output_path
+
+
+class StreamingConcatenator:
+    """
+    Concatenates `count` clips that become available out of order, doing the per-clip work
+    while later clips are still being produced.
+
+    `add(index, path)` records a clip; every clip whose predecessors have all arrived is
+    probed right away. While all clips match the first one's codec parameters nothing else is
+    needed and `finish()` is a single stream copy. From the first mismatch on, each clip is
+    re-encoded to the first clip's frame size and rate as it arrives, like `concatenate_videos`.
+    """
+    def __init__(self, count, output_path, work_dir=None):
+        self.count = count
+        self.output_path = output_path
+        self._work_dir = tempfile.mkdtemp(prefix="concat_streaming_", dir=work_dir)
+        self._lock = threading.Lock()
+        self._arrived = {}
+        self._paths = []  # Clips processed so far, in order
+        self._probes = []
+        self._normalized = None  # Re-encoded paths once a mismatch was seen
+        self._with_audio = False
+
+    @property
+    def ready(self):
+        """Number of leading clips already processed."""
+        return len(self._paths)
+
+    def add(self, index, path):
+        """Records clip `index` and processes every clip that is now next in order."""
+        with self._lock:
+            self._arrived[index] = path
+            while len(self._paths) in self._arrived:
+                next_path = self._arrived.pop(len(self._paths))
+                probe = probe_video(next_path)
+                self._paths.append(next_path)
+                self._probes.append(probe)
+                if self._normalized is None and not can_stream_copy([self._probes[0], probe]):
+                    incr("video_concatenations_total", mode="reencode")
+                    self._normalized = []
+                    self._with_audio = any(p["audio"] for p in self._probes)
+                elif self._normalized is not None and probe["audio"] and not self._with_audio:
+                    # Clips already re-encoded without audio need a silent track to match.
+                    self._with_audio = True
+                    self._normalized = []
+                if self._normalized is not None:
+                    self._normalize_pending()
+
+    def _normalize_pending(self):
+        target = normalization_target(self._probes)
+        for i in range(len(self._normalized), len(self._paths)):
+            clip_target = dict(target, source_has_audio=self._probes[i]["audio"] is not None)
+            self._normalized.append(normalize_video(self._paths[i], os.path.join(self._work_dir, f"{i:05d}.mp4"),
+                                                    clip_target, self._with_audio))
+
+    def finish(self):
+        """Joins the clips once all of them were added and returns the output path."""
+        with self._lock:
+            if len(self._paths) != self.count:
+                raise RuntimeError(f"Only {len(self._paths)} of {self.count} clips are ready to concatenate")
+            try:
+                if self._normalized is None:
+                    incr("video_concatenations_total", mode="stream_copy")
+                    concat_stream_copy(self._paths, self.output_path)
+                else:
+                    concat_stream_copy(self._normalized, self.output_path)
+            finally:
+                self.close()
+        return self.output_path
+
+    def close(self):
+        """Removes the intermediate re-encoded clips."""
+        shutil.rmtree(self._work_dir, ignore_errors=True)